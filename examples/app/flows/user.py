@@ -30,8 +30,9 @@ class UserCreated(BaseModel):
     email: EmailStr
 
 
+# CPU-bound work stays a plain function; it runs on the step thread pool, off the event loop
 @step(name="hash-password")
-async def hash_password(ctx: Context, data: SignupRequest) -> UserDraft:
+def hash_password(ctx: Context, data: SignupRequest) -> UserDraft:
     return UserDraft(email=data.email, hashed_password=f"hashed:{data.password}")
 
 
@@ -1,30 +1,51 @@
+from fastapi_cloudflow import warmup as _warmup
 from fastapi_cloudflow.core import (
     Arg,
     AssignStep,
+    ConcurrencyLimit,
     Context,
     HttpStep,
+    MapStep,
+    MicroBatch,
     ModelAdapter,
+    ParallelStep,
     RetryPolicy,
     Step,
+    TransientRetry,
     Workflow,
     get_registry,
+    get_resources,
+    map_each,
+    parallel,
+    resource,
     step,
     workflow,
 )
 from fastapi_cloudflow.runtime import attach_to_fastapi, build_app
 
+_warmup.mark_imported()
+
 __all__ = [
     "step",
     "workflow",
+    "parallel",
+    "map_each",
     "Context",
     "Step",
     "Workflow",
     "RetryPolicy",
+    "TransientRetry",
+    "ConcurrencyLimit",
+    "MicroBatch",
     "AssignStep",
     "HttpStep",
     "ModelAdapter",
+    "ParallelStep",
+    "MapStep",
     "Arg",
     "get_registry",
+    "resource",
+    "get_resources",
     "attach_to_fastapi",
     "build_app",
 ]
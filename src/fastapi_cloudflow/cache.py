@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import Protocol
+
+from pydantic import BaseModel
+
+
+class ResultCache(Protocol):
+    """Backend storing serialized step outputs by key."""
+
+    async def get(self, key: str) -> bytes | None: ...
+
+    async def set(self, key: str, value: bytes) -> None: ...
+
+
+def result_key(run_id: str, step_name: str, call: str, raw_input: bytes) -> str:
+    digest = hashlib.sha256(raw_input).hexdigest()
+    return f"{run_id}:{step_name}:{call}:{digest}"
+
+
+def memo_key(step_name: str, data: BaseModel) -> str:
+    # Hash the validated model, not the body: key order, whitespace and defaults filled in don't split entries
+    canonical = json.dumps(data.model_dump(mode="json"), sort_keys=True, separators=(",", ":"))
+    return f"memo:{step_name}:{hashlib.sha256(canonical.encode()).hexdigest()}"
+
+
+class SingleFlight:
+    """Shares one in-progress computation among concurrent callers asking for the same key."""
+
+    def __init__(self) -> None:
+        self._flights: dict[str, asyncio.Future[bytes]] = {}
+
+    async def run(self, key: str, produce: Callable[[], Awaitable[bytes]]) -> tuple[bytes, bool]:
+        """Result of `produce`, and whether it came from a flight another caller started."""
+        flight = self._flights.get(key)
+        shared = flight is not None
+        if flight is None:
+            flight = asyncio.ensure_future(produce())
+            self._flights[key] = flight
+            flight.add_done_callback(lambda done: self._land(key, done))
+        # A caller that gives up (deadline, disconnect) must not cancel the flight for the others
+        return await asyncio.shield(flight), shared
+
+    def _land(self, key: str, flight: asyncio.Future[bytes]) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.cancelled():
+            flight.exception()  # retrieved here so an unawaited failure is not reported as lost
+
+
+class MemoryResultCache:
+    """Bounded LRU with a per-entry TTL, local to the process."""
+
+    def __init__(self, max_entries: int = 1024, ttl_s: float = 600.0) -> None:
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+
+    async def get(self, key: str) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_s, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class SQLiteResultCache:
+    """File-backed cache, shareable between workers on the same host."""
+
+    def __init__(self, path: str | Path, ttl_s: float = 600.0) -> None:
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS step_results (key TEXT PRIMARY KEY, value BLOB, expires_at REAL)"
+            )
+
+    def _get(self, key: str) -> bytes | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM step_results WHERE key = ? AND expires_at >= ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def _set(self, key: str, value: bytes) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM step_results WHERE expires_at < ?", (time.time(),))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO step_results (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, time.time() + self.ttl_s),
+            )
+
+    async def get(self, key: str) -> bytes | None:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: bytes) -> None:
+        await asyncio.to_thread(self._set, key, value)
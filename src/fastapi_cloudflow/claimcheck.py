@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import re
+from pathlib import Path
+from typing import Protocol
+
+from fastapi import HTTPException
+
+# Output references look like {"$claim": "<key>"}; sniffed on the raw bytes like the payload envelope
+_CLAIM_PREFIX = re.compile(rb'\s*\{\s*"\$claim"\s*:')
+
+
+class BlobStore(Protocol):
+    async def put(self, key: str, data: bytes) -> None: ...
+
+    async def get(self, key: str) -> bytes | None: ...
+
+
+class LocalBlobStore:
+    """Filesystem blob store; a stand-in for GCS when running locally or in tests."""
+
+    def __init__(self, root: str | Path) -> None:
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if not path.is_relative_to(self.root.resolve()):
+            raise ValueError(f"Invalid blob key: {key}")
+        return path
+
+    def _put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+    def _get(self, key: str) -> bytes | None:
+        path = self._path(key)
+        return path.read_bytes() if path.exists() else None
+
+    async def put(self, key: str, data: bytes) -> None:
+        await asyncio.to_thread(self._put, key, data)
+
+    async def get(self, key: str) -> bytes | None:
+        return await asyncio.to_thread(self._get, key)
+
+
+class ClaimCheck:
+    """Swap step outputs above `threshold_bytes` for a reference into `store`.
+
+    Only outputs whose caller sent X-Workflow-Claim-Check (codegen does so when the next node is a Python step)
+    are offloaded; the receiving step rehydrates the reference before validation.
+    """
+
+    def __init__(self, store: BlobStore, threshold_bytes: int = 256 * 1024) -> None:
+        self.store = store
+        self.threshold_bytes = threshold_bytes
+
+    async def offload(self, run_id: str, step_name: str, content: bytes) -> bytes:
+        if len(content) <= self.threshold_bytes:
+            return content
+        key = f"{run_id}/{step_name}/{hashlib.sha256(content).hexdigest()[:16]}.json"
+        await self.store.put(key, content)
+        return json.dumps({"$claim": key, "size": len(content)}).encode()
+
+    async def rehydrate(self, raw: bytes) -> bytes:
+        if not _CLAIM_PREFIX.match(raw):
+            return raw
+        try:
+            key = json.loads(raw)["$claim"]
+        except (ValueError, KeyError, TypeError):
+            return raw
+        data = await self.store.get(key) if isinstance(key, str) else None
+        if data is None:
+            raise HTTPException(status_code=422, detail=f"Claim-checked payload not found: {key}")
+        return data
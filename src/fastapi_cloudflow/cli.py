@@ -1,21 +1,18 @@
-import importlib
+import asyncio
+import json
+import sys
 from pathlib import Path
 
 import typer
 
-from fastapi_cloudflow.codegen.workflows import emit_workflow_yaml
-from fastapi_cloudflow.core import get_workflows
+from fastapi_cloudflow.codegen.openapi import emit_steps_openapi
+from fastapi_cloudflow.codegen.workflows import build_workflows, render_workflow_yaml
+from fastapi_cloudflow.core import MapStep, ParallelStep, Step, Workflow, get_registry, get_workflows
+from fastapi_cloudflow.discovery import import_timed, modules_for, scan_flows
 
 app = typer.Typer(help="FastAPI CloudFlow CLI")
 
 
-def _import_app(app_spec: str | None) -> None:
-    if not app_spec:
-        return
-    module_name, _, _attr = app_spec.partition(":")
-    importlib.import_module(module_name)
-
-
 def _discover_flow_modules(flows_path: Path) -> list[str]:
     modules: list[str] = []
     root = Path.cwd()
@@ -33,6 +30,77 @@ def _discover_flow_modules(flows_path: Path) -> list[str]:
     return modules
 
 
+def _load_flows(
+    module: list[str] | None,
+    app_spec: str | None,
+    flows_path: Path,
+    static: bool = False,
+    workflow_names: list[str] | None = None,
+    discovery_cache: Path | None = None,
+    import_times: bool = False,
+    with_steps: bool = False,
+) -> list[Workflow]:
+    """Import flows the way the options ask and return the registered workflows (only `workflow_names` if set)."""
+    if module:
+        modules = list(module)
+    elif app_spec:
+        # App is responsible for importing/registering flows; avoid double-imports
+        modules = [app_spec.partition(":")[0]]
+    elif static:
+        # Find definitions by parsing, then import only the modules defining the wanted workflows (or any step)
+        modules = modules_for(scan_flows(flows_path, discovery_cache), workflow_names, steps=with_steps)
+    else:
+        # No app specified; import flows from the provided path
+        modules = _discover_flow_modules(flows_path)
+    timings = import_timed(modules)
+    if import_times:
+        # stderr, so graph output on stdout stays clean
+        for name, seconds in sorted(timings, key=lambda t: t[1], reverse=True):
+            print(f"import {name}: {seconds * 1000:.1f} ms", file=sys.stderr)
+        print(f"imported {len(timings)} modules in {sum(t for _, t in timings) * 1000:.1f} ms", file=sys.stderr)
+    workflows = get_workflows()
+    if workflow_names:
+        wanted = set(workflow_names)
+        missing = wanted - {wf.name for wf in workflows}
+        if missing:
+            print(f"Unknown workflow(s): {', '.join(sorted(missing))}", file=sys.stderr)
+            raise typer.Exit(code=1)
+        workflows = [wf for wf in workflows if wf.name in wanted]
+    return workflows
+
+
+def _mermaid_chain(nodes: list[Step], decls: list[str], edges: list[str]) -> tuple[str, list[str]]:
+    """Declare `nodes` and link them in order; returns the chain's entry node and its exit nodes."""
+    entry, exits = "", []
+    for node in nodes:
+        edges.extend(f"    {e} --> {node.name}" for e in exits)
+        if isinstance(node, ParallelStep):
+            decls.append(f"    {node.name}{{{{{node.name}}}}}")
+            tails: list[str] = []
+            for chain in node.branches.values():
+                head, chain_exits = _mermaid_chain(chain, decls, edges)
+                edges.append(f"    {node.name} --> {head}")
+                tails.extend(chain_exits)
+            node_exits = tails
+        elif isinstance(node, MapStep):
+            decls.append(f"    {node.name}[[{node.name}]]")
+            head, node_exits = _mermaid_chain(node.body, decls, edges)
+            edges.append(f"    {node.name} --> {head}")
+        else:
+            decls.append(f"    {node.name}[{node.name}]")
+            node_exits = [node.name]
+        entry = entry or node.name
+        exits = node_exits
+    return entry, exits
+
+
+def _mermaid_workflow(wf: Workflow) -> list[str]:
+    decls: list[str] = []
+    edges: list[str] = []
+    _mermaid_chain(wf.nodes, decls, edges)
+    return [f"  subgraph {wf.name}", *decls, *edges, "  end"]
+
+
 @app.command()
 def build(
     module: list[str] | None = None,
@@ -40,23 +108,37 @@ def build(
     base_url: str | None = None,
     app_spec: str | None = None,
     flows_path: Path = Path("app/flows"),
+    trace: bool = False,
+    compression: bool = False,
+    shed_retry_after: int | None = None,
+    check: bool = False,
+    static: bool = False,
+    workflow: list[str] | None = None,
+    discovery_cache: Path = Path(".cloudflow/discovery.json"),
+    import_times: bool = False,
 ):
-    module = module or []
-    if module:
-        for m in module:
-            __import__(m)
-    elif app_spec:
-        # App is responsible for importing/registering flows; avoid double-imports
-        _import_app(app_spec)
-    else:
-        # No app specified; import flows from the provided path
-        for m in _discover_flow_modules(flows_path):
-            __import__(m)
-    workflows = get_workflows()
-    out.mkdir(parents=True, exist_ok=True)
-    for wf in workflows:
-        emit_workflow_yaml(wf, out, base_url_expr=f'"{base_url}"' if base_url else None)
-        print(f"wrote {out / (wf.name + '.yaml')}")
+    workflows = _load_flows(module, app_spec, flows_path, static, workflow, discovery_cache, import_times)
+    result = build_workflows(
+        workflows,
+        out,
+        base_url_expr=f'"{base_url}"' if base_url else None,
+        trace=trace,
+        compression=compression,
+        check=check,
+        partial=bool(workflow),
+        shed_retry_after=shed_retry_after,
+    )
+    if check:
+        # CI mode: fail when the committed YAML no longer matches the flow definitions
+        for path in result.drifted:
+            print(f"drift {path}")
+        if result.drifted:
+            raise typer.Exit(code=1)
+        print("No drift")
+        return
+    for path in result.written:
+        print(f"wrote {path}")
+    print(f"{len(result.written)} written, {len(result.unchanged)} unchanged")
 
 
 @app.command()
@@ -64,17 +146,12 @@ def validate(
     module: list[str] | None = None,
     app_spec: str | None = None,
     flows_path: Path = Path("app/flows"),
+    static: bool = False,
+    workflow: list[str] | None = None,
+    discovery_cache: Path = Path(".cloudflow/discovery.json"),
+    import_times: bool = False,
 ):
-    module = module or []
-    if module:
-        for m in module:
-            __import__(m)
-    elif app_spec:
-        _import_app(app_spec)
-    else:
-        for m in _discover_flow_modules(flows_path):
-            __import__(m)
-    workflows = get_workflows()
+    workflows = _load_flows(module, app_spec, flows_path, static, workflow, discovery_cache, import_times)
     for wf in workflows:
         if not wf.nodes:
             raise typer.Exit(code=1)
@@ -88,17 +165,12 @@ def graph(
     app_spec: str | None = None,
     flows_path: Path = Path("app/flows"),
     per_workflow: bool = False,
+    static: bool = False,
+    workflow: list[str] | None = None,
+    discovery_cache: Path = Path(".cloudflow/discovery.json"),
+    import_times: bool = False,
 ):
-    module = module or []
-    if module:
-        for m in module:
-            __import__(m)
-    elif app_spec:
-        _import_app(app_spec)
-    else:
-        for m in _discover_flow_modules(flows_path):
-            __import__(m)
-    workflows = get_workflows()
+    workflows = _load_flows(module, app_spec, flows_path, static, workflow, discovery_cache, import_times)
 
     if per_workflow:
         # Write one Mermaid file per workflow into the provided directory
@@ -106,14 +178,8 @@ def graph(
             out = Path("build/graphs")
         out.mkdir(parents=True, exist_ok=True)
         for wf in workflows:
-            lines: list[str] = ["graph TD"]
             # Keep subgraph for consistency/labeling even when single workflow
-            lines.append(f"  subgraph {wf.name}")
-            for node in wf.nodes:
-                lines.append(f"    {node.name}[{node.name}]")
-            for a, b in zip(wf.nodes, wf.nodes[1:], strict=False):
-                lines.append(f"    {a.name} --> {b.name}")
-            lines.append("  end")
+            lines: list[str] = ["graph TD", *_mermaid_workflow(wf)]
             content = "\n".join(lines) + "\n"
             target = out / f"{wf.name}.mmd"
             target.write_text(content, encoding="utf-8")
@@ -121,12 +187,7 @@ def graph(
     else:
         lines: list[str] = ["graph TD"]
         for wf in workflows:
-            lines.append(f"  subgraph {wf.name}")
-            for node in wf.nodes:
-                lines.append(f"    {node.name}[{node.name}]")
-            for a, b in zip(wf.nodes, wf.nodes[1:], strict=False):
-                lines.append(f"    {a.name} --> {b.name}")
-            lines.append("  end")
+            lines.extend(_mermaid_workflow(wf))
 
         content = "\n".join(lines) + "\n"
         if out is None:
@@ -135,3 +196,153 @@ def graph(
             out.parent.mkdir(parents=True, exist_ok=True)
             out.write_text(content, encoding="utf-8")
             print(f"wrote {out}")
+
+
+@app.command()
+def schema(
+    module: list[str] | None = None,
+    out: Path = Path("build/steps.openapi.json"),
+    app_spec: str | None = None,
+    flows_path: Path = Path("app/flows"),
+    static: bool = False,
+    discovery_cache: Path = Path(".cloudflow/discovery.json"),
+    import_times: bool = False,
+):
+    # Pass the file to attach_to_fastapi(step_schema=...) to document dispatch-mode steps
+    # Steps are served whether or not a workflow uses them, so step-only modules count too
+    _load_flows(module, app_spec, flows_path, static, None, discovery_cache, import_times, with_steps=True)
+    path = emit_steps_openapi(get_registry().served_steps(), out)
+    print(f"wrote {path}")
+
+
+def _serving_app(app_spec: str | None):
+    if app_spec:
+        module_name, _, attr = app_spec.partition(":")
+        return getattr(sys.modules[module_name], attr or "app")
+    from fastapi_cloudflow.runtime import build_app
+
+    return build_app()
+
+
+def _import_emulator():
+    # httpx is only needed by the emulator, so the other commands keep working without it
+    try:
+        import fastapi_cloudflow.emulator as emulator
+    except ModuleNotFoundError as err:
+        if err.name != "httpx":
+            raise
+        print('The emulator needs httpx: pip install "fastapi-cloudflow[emulator]"', file=sys.stderr)
+        raise typer.Exit(code=1) from err
+    return emulator
+
+
+@app.command()
+def emulate(
+    workflow: str,
+    payload: str = "{}",
+    module: list[str] | None = None,
+    app_spec: str | None = None,
+    flows_path: Path = Path("app/flows"),
+    yaml_file: Path | None = None,
+    env: list[str] | None = None,
+    executions: int = 1,
+    concurrency: int = 1,
+    trace: bool = False,
+    compression: bool = False,
+    shed_retry_after: int | None = None,
+):
+    """Run a workflow locally against the app in-process; with --executions > 1, report latency percentiles."""
+    emulator_api = _import_emulator()
+    workflows = _load_flows(module, app_spec, flows_path, workflow_names=[workflow])
+    if yaml_file is not None:
+        source = yaml_file.read_text(encoding="utf-8")
+    else:
+        source = render_workflow_yaml(
+            workflows[0], trace=trace, compression=compression, shed_retry_after=shed_retry_after
+        )
+    argument = json.loads(Path(payload[1:]).read_text(encoding="utf-8") if payload.startswith("@") else payload)
+    variables = dict(item.partition("=")[::2] for item in env or [])
+    served = _serving_app(app_spec)
+
+    async def run() -> int:
+        async with served.router.lifespan_context(served), emulator_api.Emulator(served, env=variables) as emulator:
+            if executions > 1:
+                report = await emulator_api.run_load(
+                    emulator, source, argument, executions, concurrency, workflow_id=workflow
+                )
+                print(report.render())
+                return 1 if report.failures else 0
+            execution = await emulator.execute(source, argument, workflow_id=workflow)
+            if not execution.succeeded:
+                print(json.dumps(execution.error, indent=2, default=str), file=sys.stderr)
+                return 1
+            print(json.dumps(execution.result, indent=2))
+            return 0
+
+    code = asyncio.run(run())
+    if code:
+        raise typer.Exit(code=code)
+
+
+@app.command()
+def resume(
+    workflow: str,
+    run_id: str | None = None,
+    journal: Path = Path("build/journal.sqlite"),
+    from_step: str | None = None,
+    module: list[str] | None = None,
+    app_spec: str | None = None,
+    flows_path: Path = Path("app/flows"),
+    env: list[str] | None = None,
+    trace: bool = False,
+    compression: bool = False,
+    shed_retry_after: int | None = None,
+):
+    """Resume a journaled run locally from --from-step (default: the furthest recorded step), skipping the rest."""
+    from fastapi_cloudflow.journal import SqliteJournal
+
+    emulator_api = _import_emulator()
+
+    workflows = _load_flows(module, app_spec, flows_path, workflow_names=[workflow])
+    if not journal.exists():
+        print(f"No journal at {journal}", file=sys.stderr)
+        raise typer.Exit(code=1)
+    store = SqliteJournal(journal)
+    variables = dict(item.partition("=")[::2] for item in env or [])
+    served = _serving_app(app_spec)
+
+    async def run() -> int:
+        target = run_id
+        if target is None:
+            runs = await store.runs(workflow)
+            if not runs:
+                print(f"No journaled runs of {workflow}", file=sys.stderr)
+                return 1
+            target = runs[0]
+        async with served.router.lifespan_context(served), emulator_api.Emulator(served, env=variables) as emulator:
+            try:
+                execution = await emulator_api.resume(
+                    emulator,
+                    workflows[0],
+                    store,
+                    target,
+                    from_step,
+                    trace=trace,
+                    compression=compression,
+                    shed_retry_after=shed_retry_after,
+                )
+            except (LookupError, ValueError) as err:
+                print(err, file=sys.stderr)
+                return 1
+        if not execution.succeeded:
+            print(json.dumps(execution.error, indent=2, default=str), file=sys.stderr)
+            return 1
+        print(json.dumps(execution.result, indent=2))
+        return 0
+
+    try:
+        code = asyncio.run(run())
+    finally:
+        store.close()
+    if code:
+        raise typer.Exit(code=code)
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any
+
+from pydantic.json_schema import models_json_schema
+
+from ..core import Step
+
+REF_TEMPLATE = "#/components/schemas/{model}"
+
+
+def steps_openapi(steps: list[Step[Any, Any]]) -> dict[str, Any]:
+    """OpenAPI paths and component schemas for the step routes, built ahead of time instead of at app startup."""
+    inputs = {s.input_model for s in steps}
+    outputs = {s.output_model for s in steps}
+    refs, defs = models_json_schema(
+        [(m, "validation") for m in sorted(inputs, key=lambda m: m.__name__)]
+        + [(m, "serialization") for m in sorted(outputs, key=lambda m: m.__name__)],
+        ref_template=REF_TEMPLATE,
+    )
+    paths: dict[str, Any] = {}
+    for s in sorted(steps, key=lambda s: s.name):
+        paths[f"/steps/{s.name}"] = {
+            "post": {
+                "summary": s.name,
+                "operationId": f"step_{s.name}",
+                "requestBody": {
+                    "required": True,
+                    "content": {"application/json": {"schema": refs[(s.input_model, "validation")]}},
+                },
+                "responses": {
+                    "200": {
+                        "description": "Successful Response",
+                        "content": {"application/json": {"schema": refs[(s.output_model, "serialization")]}},
+                    }
+                },
+            }
+        }
+    return {"paths": paths, "components": {"schemas": defs.get("$defs", {})}}
+
+
+def emit_steps_openapi(steps: list[Step[Any, Any]], path: Path) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(steps_openapi(steps), indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    return path
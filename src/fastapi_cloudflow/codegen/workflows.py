@@ -1,9 +1,13 @@
+import hashlib
+import json
+import math
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any
 
 import yaml
 
-from ..core import AssignStep, HttpStep, Workflow
+from ..core import AssignStep, HttpStep, MapStep, ParallelStep, RetryPolicy, Step, Workflow
 
 
 def _is_arg_expr(v: Any) -> bool:
@@ -22,79 +26,374 @@ def _concat_expr(left_expr: str, right_literal: str) -> str:
 
 WORKFLOW_NAME_EXPR = 'sys.get_env("GOOGLE_CLOUD_WORKFLOW_ID")'
 
+# Cloud Workflows gives up on an HTTP call after this long unless args.timeout says otherwise
+DEFAULT_HTTP_TIMEOUT_S = 300
+
+
+# libyaml's emitter is several times faster than the pure-Python one and produces the same output
+_YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+# Workflow name -> sha256 of its YAML, written next to the YAML files by build_workflows
+MANIFEST_NAME = "cloudflow-manifest.json"
+
+EXECUTION_ID_EXPR = 'sys.get_env("GOOGLE_CLOUD_WORKFLOW_EXECUTION_ID")'
+
+
+def _call_span_id(wf: Workflow, site: str, node: Step[Any, Any]) -> str:
+    # Stable per call site; the execution-scoped trace id keeps spans of different runs apart
+    return hashlib.sha256(f"{wf.name}/{site}/{node.name}".encode()).hexdigest()[:16]
+
+
+def _deadline_header(timeout_s: int) -> str:
+    return f"${{string(sys.now() + {timeout_s})}}"
+
+
+def _retry_block(policy: RetryPolicy) -> dict[str, Any]:
+    return {
+        "predicate": f"${{{policy.predicate}}}",
+        "max_retries": policy.max_retries,
+        "backoff": {
+            "initial_delay": policy.initial_delay_s,
+            "max_delay": policy.max_delay_s,
+            "multiplier": policy.multiplier,
+        },
+    }
 
-def workflow_to_yaml_dict(wf: Workflow, base_url_expr: str = 'sys.get_env("BASE_URL")') -> dict[str, Any]:
-    steps: list[dict[str, Any]] = []
-    payload_var = "payload"
-    have_run_id = False
+
+def _shedding_retry(node: Step[Any, Any], shed_retry_after: int | None) -> RetryPolicy | None:
+    # Shed requests carry Retry-After; start the backoff there. The default predicate retries 429/503.
+    delays = [d for d in (node.concurrency and node.concurrency.retry_after_s, shed_retry_after) if d is not None]
+    if not delays:
+        return None
+    return RetryPolicy(initial_delay_s=max(delays))
+
+
+def _call_step(call: dict[str, Any], retry: RetryPolicy | None) -> dict[str, Any]:
+    if retry is None:
+        return call
+    return {"try": call, "retry": _retry_block(retry)}
+
+
+class _Emitter:
+    """Turns a node chain into Workflows steps; recurses into parallel branches."""
+
+    def __init__(
+        self, wf: Workflow, base_url_expr: str, trace: bool, compression: bool, shed_retry_after: int | None
+    ) -> None:
+        self.wf = wf
+        self.base_url_expr = base_url_expr
+        self.trace = trace
+        self.compression = compression
+        # Retry-After of the app-wide limit, which can shed a call to any step
+        self.shed_retry_after = shed_retry_after
+        # Index variables of the map iterations being emitted, outermost first
+        self.iterations: list[str] = []
 
     def _with_required_headers(
-        existing: dict[str, Any] | None, include_run_id: bool, include_content_type: bool
+        self, existing: dict[str, Any] | None, include_content_type: bool, span_id: str
     ) -> dict[str, Any]:
         headers: dict[str, Any] = {}
         # Always include workflow name from env
         headers["X-Workflow-Name"] = f"${{{WORKFLOW_NAME_EXPR}}}"
-        if include_run_id:
-            headers["X-Workflow-Run-Id"] = "${run_id}"
+        headers["X-Workflow-Run-Id"] = "${run_id}"
         # Only set Content-Type when sending a body
         if include_content_type:
             headers["Content-Type"] = "application/json"
+        if self.trace:
+            headers["traceparent"] = f'${{"00-" + trace_id + "-{span_id}-01"}}'
         if existing:
             headers.update({k: _as_yaml_expr(v) for k, v in existing.items()})
         return headers
 
-    for idx, node in enumerate(wf.nodes):
-        if isinstance(node, AssignStep):
-            steps.append(
-                {f"assign_{idx}": {"assign": [{payload_var: {k: _as_yaml_expr(v) for k, v in node.expr.items()}}]}}
-            )
-            continue
-
-        if isinstance(node, HttpStep):
-            method = node.method.lower()
-            result_var = f"res_{idx}"
-            args: dict[str, Any] = {"url": _as_yaml_expr(node.url)}
-            # Only include body for non-GET methods; http.get does not accept a body argument
-            if method != "get":
-                args["body"] = f"${{{payload_var}}}"
-            args["headers"] = _with_required_headers(
-                node.headers or {}, have_run_id, include_content_type=(method != "get")
-            )
-            if node.auth:
-                args["auth"] = {k: _as_yaml_expr(v) for k, v in node.auth.items()}
-            if node.timeout:
-                args["timeout"] = int(node.timeout.total_seconds())
+    def chain(self, nodes: list[Step[Any, Any]], source: str, target: str, prefix: str = "") -> list[dict[str, Any]]:
+        """Steps for `nodes`; the first node reads `source`, every node writes its output to `target`."""
+        steps: list[dict[str, Any]] = []
+        current = source
+        for idx, node in enumerate(nodes):
+            site = f"{prefix}{idx}"
+            next_node = nodes[idx + 1] if idx + 1 < len(nodes) else None
+            if isinstance(node, AssignStep):
+                if current != "payload":
+                    # Assign expressions are written against ${payload}, which a branch cannot reassign
+                    raise ValueError(
+                        f"{node.name}: assign steps can only lead a parallel branch, not follow a node or map items"
+                    )
+                steps.append(
+                    {f"assign_{site}": {"assign": [{target: {k: _as_yaml_expr(v) for k, v in node.expr.items()}}]}}
+                )
+            elif isinstance(node, ParallelStep):
+                steps.extend(self._parallel(node, site, current, target))
+            elif isinstance(node, MapStep) and node.batch_route:
+                steps.extend(self._batch_map(node, site, current, target))
+            elif isinstance(node, MapStep):
+                steps.extend(self._map(node, site, current, target))
+            elif isinstance(node, HttpStep):
+                steps.extend(self._http_call(node, site, current, target))
+            else:
+                steps.extend(self._step_call(node, site, current, target, next_node))
+            current = target
+        return steps
+
+    def _parallel(self, node: ParallelStep[Any, Any], site: str, source: str, target: str) -> list[dict[str, Any]]:
+        # Branches can only assign shared variables, so each writes its output under its key of one shared map
+        join_var = f"join_{site}"
+        branches = [
+            {f"branch_{key}_{site}": {"steps": self.chain(chain, source, f"{join_var}.{key}", f"{site}_{key}_")}}
+            for key, chain in node.branches.items()
+        ]
+        return [
+            {f"init_join_{site}": {"assign": [{join_var: {}}]}},
+            {f"parallel_{node.name}": {"parallel": {"shared": [join_var], "branches": branches}}},
+            {f"set_payload_{site}": {"assign": [{target: f"${{{join_var}}}"}]}},
+        ]
+
+    def _map(self, node: MapStep[Any, Any], site: str, source: str, target: str) -> list[dict[str, Any]]:
+        # Iterations finish in any order: they file results by index, then a sequential loop restores input order
+        results_var, list_var, item_var, index_var = f"map_{site}", f"list_{site}", f"item_{site}", f"i_{site}"
+        items_expr = f"{source}.{node.field}"
+        block: dict[str, Any] = {"shared": [results_var]}
+        if node.concurrency_limit is not None:
+            block["concurrency_limit"] = node.concurrency_limit
+        slot = f"{results_var}[string({index_var})]"
+        self.iterations.append(index_var)
+        body = self.chain(node.body, item_var, slot, f"{site}_map_")
+        self.iterations.pop()
+        block["for"] = {"value": item_var, "index": index_var, "in": f"${{{items_expr}}}", "steps": body}
+        collect = {
+            "for": {
+                "value": index_var,
+                "range": f"${{[0, len({items_expr}) - 1]}}",
+                "steps": [{f"collect_item_{site}": {"assign": [{list_var: f"${{list.concat({list_var}, {slot})}}"}]}}],
+            }
+        }
+        return [
+            {f"init_map_{site}": {"assign": [{results_var: {}}, {list_var: []}]}},
+            {f"map_{node.name}": {"parallel": block}},
+            {f"collect_{site}": collect},
+            {f"set_payload_{site}": {"assign": [{target: {node.into: f"${{{list_var}}}"}}]}},
+        ]
+
+    def _http_call(self, node: HttpStep[Any, Any], site: str, source: str, target: str) -> list[dict[str, Any]]:
+        method = node.method.lower()
+        result_var = f"res_{site}"
+        args: dict[str, Any] = {"url": _as_yaml_expr(node.url)}
+        # Only include body for non-GET methods; http.get does not accept a body argument
+        if method != "get":
+            args["body"] = f"${{{source}}}"
+        args["headers"] = self._with_required_headers(
+            node.headers or {},
+            include_content_type=(method != "get"),
+            span_id=_call_span_id(self.wf, site, node),
+        )
+        if node.auth:
+            args["auth"] = {k: _as_yaml_expr(v) for k, v in node.auth.items()}
+        if node.timeout:
+            args["timeout"] = int(node.timeout.total_seconds())
 
-            steps.append({f"call_{node.name}": {"call": f"http.{method}", "args": args, "result": result_var}})
-            steps.append({f"set_payload_{idx}": {"assign": [{payload_var: f"${{{result_var}.body}}"}]}})
-            continue
+        call = {"call": f"http.{method}", "args": args, "result": result_var}
+        return [
+            {f"call_{node.name}": _call_step(call, node.retry)},
+            {f"set_payload_{site}": {"assign": [{target: f"${{{result_var}.body}}"}]}},
+        ]
 
+    def _step_call(
+        self, node: Step[Any, Any], site: str, source: str, target: str, next_node: Step[Any, Any] | None
+    ) -> list[dict[str, Any]]:
         # Python step via FastAPI endpoint
-        result_var = f"res_{idx}"
-        url_expr = _concat_expr(base_url_expr, f"/steps/{node.name}")
+        result_var = f"res_{site}"
+        # Only a Python step can rehydrate a claim-checked payload; assign/http nodes need the real body
+        claim_check = next_node is not None and next_node.fn is not None
+        args = self._step_args(node, site, f"/steps/{node.name}", source, claim_check)
+        call = {"call": "http.post", "args": args, "result": result_var}
+        steps = [
+            {f"call_{node.name}": _call_step(call, node.retry or _shedding_retry(node, self.shed_retry_after))},
+            {f"set_payload_{site}": {"assign": [{target: f"${{{result_var}.body}}"}]}},
+        ]
+        return steps
+
+    def _batch_map(self, node: MapStep[Any, Any], site: str, source: str, target: str) -> list[dict[str, Any]]:
+        # One call per body step carries the whole list; a single failed item fails the workflow step
+        steps: list[dict[str, Any]] = []
+        items_expr = f"{source}.{node.field}"
+        for j, body_node in enumerate(node.body):
+            sub = f"{site}_batch_{j}"
+            result_var = f"res_{sub}"
+            args = self._step_args(
+                body_node, sub, f"/steps/{body_node.name}:batch", items_expr, claim_check=False, batch=True
+            )
+            call = {"call": "http.post", "args": args, "result": result_var}
+            retry = body_node.retry or _shedding_retry(body_node, self.shed_retry_after)
+            steps.append({f"call_{body_node.name}_batch": _call_step(call, retry)})
+            failed = {"condition": f"${{len({result_var}.body.errors) > 0}}", "raise": f"${{{result_var}.body.errors}}"}
+            steps.append({f"check_{sub}": {"switch": [failed]}})
+            items_expr = f"{result_var}.body.results"
+        steps.append({f"set_payload_{site}": {"assign": [{target: {node.into: f"${{{items_expr}}}"}}]}})
+        return steps
+
+    def _step_args(
+        self, node: Step[Any, Any], site: str, path: str, source: str, claim_check: bool, batch: bool = False
+    ) -> dict[str, Any]:
+        # The step timeout bounds one item; a batch runs its items in waves and gets the default wait instead
+        timeout = None if batch else node.timeout
+        timeout_s = math.ceil(timeout.total_seconds()) if timeout else DEFAULT_HTTP_TIMEOUT_S
+        # The step stops working once the workflow stops waiting; the call site tells a retry from another call
+        extra_headers = {"X-Workflow-Deadline": _deadline_header(timeout_s), "X-Workflow-Call": site}
+        if self.iterations:
+            # Iterations of one map share the call site; equal items must still run once each
+            index = ' + "." + '.join(f"string({i})" for i in self.iterations)
+            extra_headers["X-Workflow-Iteration"] = f"${{{index}}}"
+        if claim_check:
+            extra_headers["X-Workflow-Claim-Check"] = "accept"
+        if self.compression:
+            # Steps served with compression enabled gzip large responses for callers that ask
+            extra_headers["Accept-Encoding"] = "gzip"
         args = {
-            "url": url_expr,
-            "body": f"${{{payload_var}}}",
-            "headers": _with_required_headers({}, have_run_id, include_content_type=True),
+            "url": _concat_expr(self.base_url_expr, path),
+            "body": f"${{{source}}}",
+            "headers": self._with_required_headers(
+                extra_headers, include_content_type=True, span_id=_call_span_id(self.wf, site, node)
+            ),
             # Authenticate calls to Cloud Run using the workflow's service account
-            "auth": {"type": "OIDC", "audience": f"${{{base_url_expr}}}"},
+            "auth": {"type": "OIDC", "audience": f"${{{self.base_url_expr}}}"},
         }
-        steps.append({f"call_{node.name}": {"call": "http.post", "args": args, "result": result_var}})
-        steps.append({f"set_payload_{idx}": {"assign": [{payload_var: f"${{{result_var}.body}}"}]}})
-        if not have_run_id:
-            steps.append(
-                {f"capture_run_id_{idx}": {"assign": [{"run_id": f'${{{result_var}.headers["X-Workflow-Run-Id"]}}'}]}}
-            )
-            have_run_id = True
+        if timeout:
+            args["timeout"] = timeout_s
+        return args
+
 
+def workflow_to_yaml_dict(
+    wf: Workflow,
+    base_url_expr: str = 'sys.get_env("BASE_URL")',
+    trace: bool = False,
+    compression: bool = False,
+    shed_retry_after: int | None = None,
+) -> dict[str, Any]:
+    """The workflow as Workflows YAML data.
+
+    `shed_retry_after` pairs with an app-wide `attach_to_fastapi(concurrency=...)` limit: pass its `retry_after_s`
+    so every Python step call retries a shed 503 starting from that delay, not only calls to steps with a limit.
+    """
+    steps: list[dict[str, Any]] = []
+    payload_var = "payload"
+
+    # Every step call of one execution shares its run id, including the first and those inside branches
+    steps.append({"init_run": {"assign": [{"run_id": f"${{{EXECUTION_ID_EXPR}}}"}]}})
+    if trace:
+        # The execution id is a UUID; without dashes it is a valid W3C trace id shared by every call
+        trace_id_expr = f'${{text.replace_all({EXECUTION_ID_EXPR}, "-", "")}}'
+        steps.append({"init_trace": {"assign": [{"trace_id": trace_id_expr}]}})
+
+    emitter = _Emitter(wf, base_url_expr, trace, compression, shed_retry_after)
+    steps.extend(emitter.chain(wf.fused_nodes(), payload_var, payload_var))
     steps.append({"return_final": {"return": f"${{{payload_var}}}"}})
     return {"main": {"params": [payload_var], "steps": steps}}
 
 
-def emit_workflow_yaml(wf: Workflow, out_dir: Path, base_url_expr: str | None = None) -> Path:
+def render_workflow_yaml(
+    wf: Workflow,
+    base_url_expr: str | None = None,
+    trace: bool = False,
+    compression: bool = False,
+    shed_retry_after: int | None = None,
+) -> str:
+    data = workflow_to_yaml_dict(
+        wf,
+        base_url_expr=base_url_expr or 'sys.get_env("BASE_URL")',
+        trace=trace,
+        compression=compression,
+        shed_retry_after=shed_retry_after,
+    )
+    return yaml.dump(data, Dumper=_YAML_DUMPER, sort_keys=False)
+
+
+def _write_if_changed(path: Path, content: str) -> bool:
+    # Leave identical files alone so their mtimes (and whatever deploys off them) stay put
+    data = content.encode("utf-8")
+    if path.exists() and path.read_bytes() == data:
+        return False
+    path.write_bytes(data)
+    return True
+
+
+def emit_workflow_yaml(
+    wf: Workflow,
+    out_dir: Path,
+    base_url_expr: str | None = None,
+    trace: bool = False,
+    compression: bool = False,
+    shed_retry_after: int | None = None,
+) -> Path:
     out_dir.mkdir(parents=True, exist_ok=True)
-    data = workflow_to_yaml_dict(wf, base_url_expr=base_url_expr or 'sys.get_env("BASE_URL")')
     path = out_dir / f"{wf.name}.yaml"
-    with path.open("w", encoding="utf-8") as fh:
-        yaml.safe_dump(data, fh, sort_keys=False)
+    content = render_workflow_yaml(
+        wf, base_url_expr, trace=trace, compression=compression, shed_retry_after=shed_retry_after
+    )
+    _write_if_changed(path, content)
     return path
+
+
+@dataclass
+class BuildResult:
+    written: list[Path] = field(default_factory=list)
+    unchanged: list[Path] = field(default_factory=list)
+    # Files whose content differs from (or is missing compared to) the current definitions, YAML files no
+    # workflow produces and a stale manifest; only filled by check
+    drifted: list[Path] = field(default_factory=list)
+    hashes: dict[str, str] = field(default_factory=dict)
+
+
+def build_workflows(
+    workflows: list[Workflow],
+    out_dir: Path,
+    base_url_expr: str | None = None,
+    trace: bool = False,
+    compression: bool = False,
+    check: bool = False,
+    partial: bool = False,
+    shed_retry_after: int | None = None,
+) -> BuildResult:
+    """Render every workflow, write only the files that changed and record their hashes.
+
+    With `check`, nothing is written; files that would change, YAML files no workflow produces and a manifest
+    out of date are reported as drifted. With `partial` (a build filtered to some workflows), the hashes are
+    merged into the existing manifest instead of replacing it, and other workflows' files are left alone.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    result = BuildResult()
+    # Rendering is pure Python under the GIL, and steps hold functions a process pool cannot pickle: stay serial
+    for wf in workflows:
+        path = out_dir / f"{wf.name}.yaml"
+        content = render_workflow_yaml(
+            wf, base_url_expr, trace=trace, compression=compression, shed_retry_after=shed_retry_after
+        )
+        result.hashes[wf.name] = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        if check:
+            current = path.read_bytes() if path.exists() else None
+            if current != content.encode("utf-8"):
+                result.drifted.append(path)
+        elif _write_if_changed(path, content):
+            result.written.append(path)
+        else:
+            result.unchanged.append(path)
+
+    manifest_path = out_dir / MANIFEST_NAME
+    hashes = {**_read_manifest(manifest_path), **result.hashes} if partial else result.hashes
+    manifest = json.dumps(dict(sorted(hashes.items())), indent=2) + "\n"
+    if not check:
+        _write_if_changed(manifest_path, manifest)
+        return result
+    if not partial:
+        produced = {f"{wf.name}.yaml" for wf in workflows}
+        result.drifted.extend(sorted(p for p in out_dir.glob("*.yaml") if p.name not in produced))
+    current = manifest_path.read_bytes() if manifest_path.exists() else None
+    if current != manifest.encode("utf-8"):
+        result.drifted.append(manifest_path)
+    return result
+
+
+def _read_manifest(path: Path) -> dict[str, str]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import importlib
+import zlib
+from typing import Any
+
+from fastapi import HTTPException
+
+
+def _optional_module(name: str) -> Any:
+    try:
+        return importlib.import_module(name)
+    except ImportError:  # pragma: no cover - depends on the environment
+        return None
+
+
+# Optional codecs: used when the packages are installed, otherwise only gzip is offered
+brotli: Any = _optional_module("brotli")
+zstandard: Any = _optional_module("zstandard")
+
+# Bodies are decoded this much at a time so a bomb stops at the size cap instead of filling memory
+_CHUNK = 64 * 1024
+_DECODE_ERRORS: tuple[type[Exception], ...] = (zlib.error, ValueError)
+if brotli is not None:
+    _DECODE_ERRORS += (brotli.error,)
+if zstandard is not None:
+    _DECODE_ERRORS += (zstandard.ZstdError,)
+
+
+def available_encodings() -> tuple[str, ...]:
+    """Supported encodings, most preferred first."""
+    encodings: list[str] = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return tuple(encodings)
+
+
+def _parse_accept_encoding(value: str) -> dict[str, float]:
+    accepted: dict[str, float] = {}
+    for part in value.split(","):
+        token, _, params = part.strip().partition(";")
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[token.strip().lower()] = q
+    return accepted
+
+
+class Compression:
+    """Negotiated response compression and decoding of compressed request bodies for step routes."""
+
+    def __init__(
+        self,
+        threshold_bytes: int = 1024,
+        encodings: tuple[str, ...] | None = None,
+        level: int = 5,
+        max_decompressed_bytes: int = 64 * 1024 * 1024,
+    ) -> None:
+        self.threshold_bytes = threshold_bytes
+        self.encodings = encodings or available_encodings()
+        self.level = level
+        self.max_decompressed_bytes = max_decompressed_bytes
+
+    def negotiate(self, accept_encoding: str | None) -> str | None:
+        if not accept_encoding:
+            return None
+        accepted = _parse_accept_encoding(accept_encoding)
+        wildcard = accepted.get("*", 0.0)
+        for encoding in self.encodings:
+            if accepted.get(encoding, wildcard) > 0:
+                return encoding
+        return None
+
+    def encode_response(self, content: bytes, headers: dict[str, str], accept_encoding: str | None) -> bytes:
+        """Compress `content` when it is large enough and the caller accepts a supported encoding."""
+        headers["Vary"] = "Accept-Encoding"
+        if len(content) < self.threshold_bytes:
+            return content
+        encoding = self.negotiate(accept_encoding)
+        if encoding is None:
+            return content
+        headers["Content-Encoding"] = encoding
+        return self.compress(content, encoding)
+
+    def compress(self, data: bytes, encoding: str) -> bytes:
+        if encoding == "gzip":
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            return compressor.compress(data) + compressor.flush()
+        if encoding == "br":
+            return brotli.compress(data, quality=self.level)
+        if encoding == "zstd":
+            return zstandard.ZstdCompressor(level=self.level).compress(data)
+        raise ValueError(f"Unsupported encoding: {encoding}")
+
+    def decompress(self, data: bytes, encoding: str) -> bytes:
+        encoding = encoding.strip().lower()
+        if encoding in ("", "identity"):
+            return data
+        if encoding not in self.encodings:
+            raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {encoding}")
+        try:
+            if encoding == "gzip":
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                out = decompressor.decompress(data, self.max_decompressed_bytes)
+                if decompressor.unconsumed_tail:
+                    raise HTTPException(status_code=413, detail="Decompressed body too large")
+            elif encoding == "br":
+                out = self._unbrotli(data)
+            else:
+                out = self._unzstd(data)
+        except _DECODE_ERRORS as err:
+            raise HTTPException(status_code=400, detail=f"Malformed {encoding} body") from err
+        return out
+
+    def _check_size(self, out: bytearray) -> None:
+        if len(out) > self.max_decompressed_bytes:
+            raise HTTPException(status_code=413, detail="Decompressed body too large")
+
+    def _unbrotli(self, data: bytes) -> bytes:
+        decompressor = brotli.Decompressor()
+        out = bytearray()
+        if hasattr(decompressor, "can_accept_more_data"):
+            # brotli >= 1.2 bounds each call's output; the rest of the input waits inside the decompressor
+            out += decompressor.process(data, output_buffer_limit=_CHUNK)
+            while not decompressor.is_finished() and not decompressor.can_accept_more_data():
+                self._check_size(out)
+                out += decompressor.process(b"", output_buffer_limit=_CHUNK)
+        else:
+            # Older releases cannot bound the output: feed small slices of input and check after each
+            for start in range(0, len(data), 1024):
+                out += decompressor.process(data[start : start + 1024])
+                self._check_size(out)
+        self._check_size(out)
+        if not decompressor.is_finished():
+            raise ValueError("truncated brotli stream")
+        return bytes(out)
+
+    def _unzstd(self, data: bytes) -> bytes:
+        # A frame may declare its content size; read it through a stream so that claim cannot size the buffer
+        out = bytearray()
+        with zstandard.ZstdDecompressor().stream_reader(data) as reader:
+            while chunk := reader.read(_CHUNK):
+                out += chunk
+                self._check_size(out)
+        return bytes(out)
@@ -1,12 +1,35 @@
 from fastapi_cloudflow.core.arg import Arg, ArgExpr
-from fastapi_cloudflow.core.step import AssignStep, HttpStep, ModelAdapter, Step
-from fastapi_cloudflow.core.types import Context, RetryPolicy, WorkflowMeta
+from fastapi_cloudflow.core.executors import configure_executors
+from fastapi_cloudflow.core.step import (
+    AssignStep,
+    FusedStep,
+    HttpStep,
+    MapStep,
+    ModelAdapter,
+    ParallelStep,
+    RunIn,
+    Step,
+)
+from fastapi_cloudflow.core.types import (
+    ConcurrencyLimit,
+    Context,
+    MicroBatch,
+    RetryPolicy,
+    TransientRetry,
+    WorkflowMeta,
+)
 from fastapi_cloudflow.core.workflow import (
     Registry,
+    Resources,
+    ResourceSpec,
     Workflow,
     WorkflowBuilder,
     get_registry,
+    get_resources,
     get_workflows,
+    map_each,
+    parallel,
+    resource,
     step,
     workflow,
 )
@@ -15,17 +38,31 @@ __all__ = [
     "Context",
     "WorkflowMeta",
     "RetryPolicy",
+    "TransientRetry",
+    "ConcurrencyLimit",
+    "MicroBatch",
     "ArgExpr",
     "Arg",
     "Step",
+    "RunIn",
     "AssignStep",
     "HttpStep",
+    "FusedStep",
+    "ParallelStep",
+    "MapStep",
     "ModelAdapter",
     "Workflow",
     "Registry",
+    "Resources",
+    "ResourceSpec",
     "WorkflowBuilder",
     "workflow",
+    "parallel",
+    "map_each",
     "get_registry",
+    "get_resources",
     "get_workflows",
     "step",
+    "resource",
+    "configure_executors",
 ]
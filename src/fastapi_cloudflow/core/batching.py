@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from fastapi_cloudflow.core.types import MicroBatch
+
+
+class MicroBatcher:
+    """Fans single-item calls into one call of a batch function and the results back out to the callers."""
+
+    def __init__(self, policy: MicroBatch, run: Callable[[list[Any]], Awaitable[list[Any]]]) -> None:
+        self.policy = policy
+        self.run = run
+        self._pending: list[tuple[Any, asyncio.Future[Any]]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        # Dispatches run detached from any caller; keep them referenced until done
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    async def submit(self, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        fut: asyncio.Future[Any] = loop.create_future()
+        self._pending.append((item, fut))
+        if len(self._pending) >= self.policy.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.policy.max_wait_s, self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._dispatch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, batch: list[tuple[Any, asyncio.Future[Any]]]) -> None:
+        # Callers that gave up (deadline, disconnect) before the flush are left out
+        live = [(item, fut) for item, fut in batch if not fut.done()]
+        if not live:
+            return
+        try:
+            results = await self.run([item for item, _ in live])
+            if len(results) != len(live):
+                raise RuntimeError(f"Batch function returned {len(results)} outputs for {len(live)} inputs")
+        except Exception as err:
+            for _, fut in live:
+                if not fut.done():
+                    fut.set_exception(err)
+            return
+        for (_, fut), result in zip(live, results, strict=True):
+            if not fut.done():
+                fut.set_result(result)
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import importlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any
+
+from fastapi_cloudflow.core.types import Context, WorkflowMeta
+
+if TYPE_CHECKING:
+    from fastapi_cloudflow.core.step import Step
+
+_max_threads: int | None = None
+_max_processes: int | None = None
+_thread_pool: ThreadPoolExecutor | None = None
+_process_pool: ProcessPoolExecutor | None = None
+
+
+def configure_executors(max_threads: int | None = None, max_processes: int | None = None) -> None:
+    """Size the pools used by thread/process steps; running pools are replaced on next use."""
+    global _max_threads, _max_processes
+    shutdown_executors()
+    _max_threads = max_threads
+    _max_processes = max_processes
+
+
+def shutdown_executors() -> None:
+    global _thread_pool, _process_pool
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=False, cancel_futures=True)
+        _thread_pool = None
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+def _get_thread_pool() -> ThreadPoolExecutor:
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(max_workers=_max_threads, thread_name_prefix="cloudflow-step")
+    return _thread_pool
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        # Forking a server that runs threads and an event loop can hand workers held locks; start clean workers
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _process_pool = ProcessPoolExecutor(max_workers=_max_processes, mp_context=multiprocessing.get_context(method))
+    return _process_pool
+
+
+async def warm_executors(threads: bool = False, process_modules: list[str] | None = None) -> None:
+    """Start the pools before the first step call; every process worker imports the modules its steps live in."""
+    if threads:
+        _get_thread_pool()
+    if process_modules:
+        loop = asyncio.get_running_loop()
+        pool = _get_process_pool()
+        workers = _max_processes or os.process_cpu_count() or 1
+        await asyncio.gather(*(loop.run_in_executor(pool, _import_modules, process_modules) for _ in range(workers)))
+
+
+def _import_modules(modules: list[str]) -> None:
+    for module in modules:
+        importlib.import_module(module)
+
+
+async def run_in_thread(step: Step[Any, Any], ctx: Context, data: Any, kwargs: dict[str, Any] | None = None) -> Any:
+    loop = asyncio.get_running_loop()
+    call = functools.partial(step.fn, ctx, data, **(kwargs or {}))  # type: ignore[arg-type]
+    return await loop.run_in_executor(_get_thread_pool(), call)
+
+
+async def run_in_process(step: Step[Any, Any], ctx: Context, data: Any) -> Any:
+    # The decorated name is bound to the Step, so the worker resolves the function through the registry.
+    # Models travel pickled; the request does not travel at all.
+    loop = asyncio.get_running_loop()
+    module = getattr(step.fn, "__module__", "")
+    meta = WorkflowMeta(name=ctx.workflow.name, step=ctx.workflow.step, run_id=ctx.workflow.run_id)
+    return await loop.run_in_executor(_get_process_pool(), _call_in_process, module, step.name, meta, data)
+
+
+def _call_in_process(module: str, step_name: str, meta: WorkflowMeta, data: Any) -> Any:
+    from fastapi_cloudflow.core.workflow import get_registry
+
+    importlib.import_module(module)
+    fn = get_registry().steps[step_name].fn
+    return fn(Context(request=None, workflow=meta), data)  # type: ignore[misc]
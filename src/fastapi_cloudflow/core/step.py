@@ -1,15 +1,28 @@
+import asyncio
+import inspect
 from collections.abc import Awaitable, Callable, Iterable
 from datetime import timedelta
-from typing import Any, TypeVar
+from typing import Any, Literal, TypeVar
 
 from pydantic import BaseModel
 
 from fastapi_cloudflow.core.arg import ArgExpr
-from fastapi_cloudflow.core.types import Context, RetryPolicy
+from fastapi_cloudflow.core.batching import MicroBatcher
+from fastapi_cloudflow.core.executors import run_in_process, run_in_thread
+from fastapi_cloudflow.core.types import (
+    ConcurrencyLimit,
+    Context,
+    MicroBatch,
+    RetryPolicy,
+    TransientRetry,
+    WorkflowMeta,
+)
 
 InT = TypeVar("InT", bound=BaseModel)
 OutT = TypeVar("OutT", bound=BaseModel)
 
+RunIn = Literal["loop", "thread", "process"]
+
 
 class Step[InT: BaseModel, OutT: BaseModel]:
     name: str
@@ -18,16 +31,25 @@ class Step[InT: BaseModel, OutT: BaseModel]:
     retry: RetryPolicy | None
     timeout: timedelta | None
     tags: set[str]
+    concurrency: ConcurrencyLimit | None
+    run_in: RunIn
+    batch: MicroBatch | None
+    transient: TransientRetry | None
 
     def __init__(
         self,
         name: str,
         input_model: type[InT],
         output_model: type[OutT],
-        fn: Callable[[Context, InT], Awaitable[OutT]] | None = None,
+        fn: Callable[[Context, InT], Awaitable[OutT] | OutT] | None = None,
         retry: RetryPolicy | None = None,
         timeout: timedelta | None = None,
         tags: Iterable[str] = (),
+        concurrency: ConcurrencyLimit | None = None,
+        run_in: RunIn | None = None,
+        batch: MicroBatch | None = None,
+        transient: TransientRetry | None = None,
+        resources: dict[str, Any] | None = None,
     ) -> None:
         self.name = name
         self.input_model = input_model
@@ -36,11 +58,115 @@ class Step[InT: BaseModel, OutT: BaseModel]:
         self.retry = retry
         self.timeout = timeout
         self.tags = set(tags)
+        self.concurrency = concurrency
+        is_async = inspect.iscoroutinefunction(fn)
+        # Plain functions default to the thread pool so they never block the event loop
+        self.run_in = run_in or ("loop" if is_async or fn is None else "thread")
+        if is_async and self.run_in != "loop":
+            raise TypeError(f"Step {name}: only plain def functions can run in a {self.run_in} pool")
+        # With `batch`, fn takes a list of inputs and returns the outputs in the same order
+        self.batch = batch
+        self._batcher = MicroBatcher(batch, self._run_batch) if batch is not None else None
+        self.transient = transient
+        # Extra fn parameter name -> annotation, filled from the shared resources on every call
+        self.resources = resources or {}
+        self._resource_names: dict[str, str] | None = None
 
     async def __call__(self, ctx: Context, data: InT) -> OutT:
         if self.fn is None:
             raise RuntimeError("Step is not callable. Is it a native step?")
-        return await self.fn(ctx, data)
+        if self.transient is None:
+            return await self._once(ctx, data)
+        retry = 0
+        while True:
+            try:
+                return await self._once(ctx, data)
+            except self.transient.on:
+                if retry + 1 >= self.transient.max_attempts:
+                    raise
+                delay = self.transient.delay(retry)
+                remaining = ctx.time_remaining()
+                if remaining is not None and delay >= remaining:
+                    # Out of time: let Workflows' retry (or the failure) take over
+                    raise
+                retry += 1
+                await asyncio.sleep(delay)
+
+    async def _once(self, ctx: Context, data: Any) -> Any:
+        if self._batcher is not None:
+            return await self._batcher.submit(data)
+        return await self._invoke(ctx, data)
+
+    async def _run_batch(self, items: list[Any]) -> list[Any]:
+        # A batch mixes requests from different runs, so the function sees no request or run id
+        return await self._invoke(Context(request=None, workflow=WorkflowMeta(step=self.name)), items)
+
+    async def _invoke(self, ctx: Context, data: Any) -> Any:
+        kwargs = await self._resource_kwargs() if self.resources else {}
+        if self.run_in == "thread":
+            return await run_in_thread(self, ctx, data, kwargs)
+        if self.run_in == "process":
+            return await run_in_process(self, ctx, data)
+        result = self.fn(ctx, data, **kwargs)  # type: ignore[misc]
+        if inspect.isawaitable(result):
+            return await result
+        return result
+
+    async def _resource_kwargs(self) -> dict[str, Any]:
+        from fastapi_cloudflow.core.workflow import get_resources
+
+        resources = get_resources()
+        if self._resource_names is None:
+            try:
+                self._resource_names = {p: resources.resolve(t, p) for p, t in self.resources.items()}
+            except LookupError as err:
+                raise TypeError(f"Step {self.name}: {err}") from err
+        return {p: await resources.acquire(name) for p, name in self._resource_names.items()}
+
+
+class FusedStep(Step[InT, OutT]):
+    """Run of adjacent Python steps served as one endpoint, chaining models in-process."""
+
+    def __init__(self, steps: list[Step[Any, Any]]) -> None:
+        super().__init__(
+            name=fused_step_name(steps),
+            input_model=steps[0].input_model,
+            output_model=steps[-1].output_model,
+            fn=self._run_chain,
+            retry=_common_retry(steps),
+            timeout=_total_timeout(steps),
+            concurrency=_tightest_limit(steps),
+        )
+        self.steps = steps
+
+    async def _run_chain(self, ctx: Context, data: Any) -> Any:
+        for s in self.steps:
+            ctx.workflow.step = s.name
+            data = await s(ctx, data)
+        return data
+
+
+def fused_step_name(steps: list[Step[Any, Any]]) -> str:
+    return "__".join(s.name for s in steps)
+
+
+def _total_timeout(steps: list[Step[Any, Any]]) -> timedelta | None:
+    # A member without a timeout leaves the whole run unbounded
+    if any(s.timeout is None for s in steps):
+        return None
+    return sum((s.timeout for s in steps if s.timeout is not None), timedelta())
+
+
+def _common_retry(steps: list[Step[Any, Any]]) -> RetryPolicy | None:
+    # Retrying the fused call reruns every member, so only do it when every member asked to be retried
+    if any(s.retry is None for s in steps):
+        return None
+    return min((s.retry for s in steps if s.retry is not None), key=lambda r: r.max_retries)
+
+
+def _tightest_limit(steps: list[Step[Any, Any]]) -> ConcurrencyLimit | None:
+    limits = [s.concurrency for s in steps if s.concurrency is not None]
+    return min(limits, key=lambda lim: lim.max_in_flight, default=None)
 
 
 class AssignStep(Step[InT, OutT]):
@@ -76,6 +202,43 @@ class HttpStep(Step[InT, OutT]):
         self.auth = auth
 
 
+class ParallelStep(Step[InT, OutT]):
+    """Branches fed the same input concurrently; each branch output fills the join model field of the same name."""
+
+    def __init__(
+        self,
+        name: str,
+        input_model: type[InT],
+        output_model: type[OutT],
+        branches: dict[str, list[Step[Any, Any]]],
+    ) -> None:
+        super().__init__(name=name, input_model=input_model, output_model=output_model, fn=None)
+        self.branches = branches
+
+
+class MapStep(Step[InT, OutT]):
+    """Runs `body` for every element of the input's list `field` and collects the outputs, in order, into `into`."""
+
+    def __init__(
+        self,
+        name: str,
+        input_model: type[InT],
+        output_model: type[OutT],
+        field: str,
+        body: list[Step[Any, Any]],
+        into: str,
+        concurrency_limit: int | None = None,
+        batch_route: bool = False,
+    ) -> None:
+        super().__init__(name=name, input_model=input_model, output_model=output_model, fn=None)
+        self.field = field
+        self.body = body
+        self.into = into
+        self.concurrency_limit = concurrency_limit
+        # Call the body steps' /steps/<name>:batch routes with the whole list; `batch` is the step's MicroBatch
+        self.batch_route = batch_route
+
+
 class ModelAdapter(Step[InT, OutT]):
     def __init__(self, name: str, input_model: type[InT], output_model: type[OutT], mapping: dict[str, Any]) -> None:
         super().__init__(name=name, input_model=input_model, output_model=output_model, fn=None)
@@ -1,21 +1,40 @@
 from __future__ import annotations
 
+import random
+import time
 from dataclasses import dataclass
+from typing import Any
 
 from fastapi import Request
 
 
-@dataclass
+@dataclass(slots=True)
 class WorkflowMeta:
     name: str | None = None
     step: str | None = None
     run_id: str | None = None
 
 
-@dataclass
+@dataclass(slots=True)
 class Context:
-    request: Request
+    # None inside process-pool workers, where the request cannot follow
+    request: Request | None
     workflow: WorkflowMeta
+    # Epoch seconds after which the caller stops waiting for this step
+    deadline: float | None = None
+    # W3C trace context of this step's span, for forwarding to downstream calls
+    traceparent: str | None = None
+
+    def time_remaining(self) -> float | None:
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.time(), 0.0)
+
+    def resource(self, key: str | type) -> Any:
+        """An open shared resource, by @resource name or by the type its factory produces."""
+        from fastapi_cloudflow.core.workflow import get_resources
+
+        return get_resources().get(key)
 
 
 @dataclass
@@ -35,3 +54,37 @@ class RetryPolicy:
             multiplier=2.0,
             predicate="http.default_retry_predicate",
         )
+
+
+@dataclass
+class TransientRetry:
+    """Retry a step in-process when it raises one of `on`, with full-jitter backoff, before Workflows sees a failure.
+
+    Delays are drawn from [0, min(max_delay_s, initial_delay_s * multiplier ** n)]; no retry starts past the
+    step's deadline.
+    """
+
+    on: tuple[type[BaseException], ...]
+    max_attempts: int = 3
+    initial_delay_s: float = 0.05
+    max_delay_s: float = 1.0
+    multiplier: float = 2.0
+
+    def delay(self, retry: int) -> float:
+        return random.uniform(0, min(self.max_delay_s, self.initial_delay_s * self.multiplier**retry))
+
+
+@dataclass
+class ConcurrencyLimit:
+    max_in_flight: int
+    max_queued: int = 0
+    max_wait_s: float | None = None
+    retry_after_s: int = 1
+
+
+@dataclass
+class MicroBatch:
+    """Collect concurrent calls of a step for up to `max_wait_s`, or until `max_size` arrive, into one call."""
+
+    max_size: int = 32
+    max_wait_s: float = 0.005
@@ -1,19 +1,46 @@
 from __future__ import annotations
 
+import asyncio
 import inspect
-from collections.abc import Awaitable, Callable, Iterable
-from typing import Any, TypeVar, get_type_hints
+from collections.abc import AsyncGenerator, AsyncIterator, Awaitable, Callable, Generator, Iterable, Iterator, Sequence
+from contextlib import AsyncExitStack, asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from typing import Any, TypeVar, get_args, get_origin, get_type_hints
 
 from pydantic import BaseModel
 
-from fastapi_cloudflow.core.step import Step
-from fastapi_cloudflow.core.types import Context
+from fastapi_cloudflow.core.step import FusedStep, MapStep, ParallelStep, RunIn, Step
+from fastapi_cloudflow.core.types import ConcurrencyLimit, Context, MicroBatch, TransientRetry
 
 
 class Workflow:
-    def __init__(self, name: str, nodes: list[Step[Any, Any]]) -> None:
+    def __init__(self, name: str, nodes: list[Step[Any, Any]], fuse: bool = False) -> None:
         self.name = name
         self.nodes = nodes
+        self.fuse = fuse
+
+    def fused_nodes(self) -> list[Step[Any, Any]]:
+        """Nodes as deployed: with `fuse`, runs of adjacent Python steps collapse into one FusedStep."""
+        if not self.fuse:
+            return list(self.nodes)
+        out: list[Step[Any, Any]] = []
+        run: list[Step[Any, Any]] = []
+
+        def flush() -> None:
+            if len(run) > 1:
+                out.append(FusedStep(list(run)))
+            else:
+                out.extend(run)
+            run.clear()
+
+        for node in self.nodes:
+            if node.fn is not None:
+                run.append(node)
+                continue
+            flush()
+            out.append(node)
+        flush()
+        return out
 
 
 class Registry:
@@ -39,73 +66,340 @@ class Registry:
     def get_workflows(self) -> list[Workflow]:
         return list(self.workflows.values())
 
+    def served_steps(self) -> list[Step[Any, Any]]:
+        """Python steps exposed under /steps: registered steps plus the fused runs of workflows that opted in."""
+        steps: dict[str, Step[Any, Any]] = {name: s for name, s in self.steps.items() if s.fn is not None}
+        for wf in self.workflows.values():
+            for node in wf.fused_nodes():
+                if isinstance(node, FusedStep):
+                    steps.setdefault(node.name, node)
+        return list(steps.values())
+
+
+@dataclass
+class ResourceSpec:
+    name: str
+    factory: Callable[[], Any]
+    # What the factory produces (the yielded type for generator factories); matched against step parameter types
+    type: Any = None
+
+
+class Resources:
+    """Objects steps share across calls (HTTP clients, DB pools, model handles), declared once with @resource.
+
+    attach_to_fastapi opens them in the app lifespan and closes them, in reverse order, on shutdown. A resource
+    a step parameter asks for before then is opened on first use.
+    """
+
+    def __init__(self) -> None:
+        self.specs: dict[str, ResourceSpec] = {}
+        self.instances: dict[str, Any] = {}
+        self._stack: AsyncExitStack | None = None
+        self._lock: asyncio.Lock | None = None
+        self._users = 0
+
+    def register(self, spec: ResourceSpec) -> None:
+        if spec.name in self.specs:
+            raise ValueError(f"Resource name collision: {spec.name}")
+        self.specs[spec.name] = spec
+
+    def resolve(self, annotation: Any, param: str | None = None) -> str:
+        """Name of the resource a step parameter refers to: by type when one resource matches, else by name."""
+        if isinstance(annotation, type):
+            matches = [
+                s.name for s in self.specs.values() if isinstance(s.type, type) and issubclass(s.type, annotation)
+            ]
+            if len(matches) == 1:
+                return matches[0]
+        if param is not None and param in self.specs:
+            return param
+        raise LookupError(f"No resource for parameter {param}: {getattr(annotation, '__name__', annotation)}")
+
+    async def open(self) -> None:
+        self._users += 1
+        for name in self.specs:
+            await self.acquire(name)
+
+    async def close(self) -> None:
+        # Apps sharing the registry (one per test client, say) keep resources open until the last one stops
+        self._users = max(self._users - 1, 0)
+        if self._users:
+            return
+        stack, self._stack = self._stack, None
+        self.instances.clear()
+        self._lock = None
+        if stack is not None:
+            await stack.aclose()
+
+    async def acquire(self, name: str) -> Any:
+        if name in self.instances:
+            return self.instances[name]
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if name not in self.instances:
+                if self._stack is None:
+                    self._stack = AsyncExitStack()
+                self.instances[name] = await _enter(self._stack, self.specs[name].factory)
+        return self.instances[name]
+
+    def get(self, key: str | type) -> Any:
+        name = key if isinstance(key, str) else self.resolve(key)
+        if name not in self.instances:
+            if name not in self.specs:
+                raise LookupError(f"Unknown resource: {name}")
+            raise RuntimeError(f"Resource {name} is not open; attach_to_fastapi opens resources in the app lifespan")
+        return self.instances[name]
+
+
+async def _enter(stack: AsyncExitStack, factory: Callable[[], Any]) -> Any:
+    # Generator factories tear down after their yield; anything else is closed through aclose()/close()
+    if inspect.isasyncgenfunction(factory):
+        return await stack.enter_async_context(asynccontextmanager(factory)())
+    if inspect.isgeneratorfunction(factory):
+        return stack.enter_context(contextmanager(factory)())
+    value = factory()
+    if inspect.isawaitable(value):
+        value = await value
+    if hasattr(value, "aclose"):
+        stack.push_async_callback(value.aclose)
+    elif hasattr(value, "close"):
+
+        async def close() -> None:
+            result = value.close()
+            if inspect.isawaitable(result):
+                await result
+
+        stack.push_async_callback(close)
+    return value
+
+
+def _resource_type(factory: Callable[[], Any]) -> Any:
+    produced = get_type_hints(factory).get("return")
+    if get_origin(produced) in (AsyncIterator, AsyncGenerator, Iterator, Generator):
+        return get_args(produced)[0]
+    if get_origin(produced) is Awaitable:
+        return get_args(produced)[0]
+    return produced
+
+
+def _check_link(prev: Step[Any, Any], other: Step[Any, Any]) -> None:
+    if prev.output_model is not other.input_model:
+        raise TypeError(
+            f"Type mismatch: {prev.name} outputs {prev.output_model.__name__} "
+            f"but {other.name} expects {other.input_model.__name__}"
+        )
+
 
 class WorkflowBuilder:
-    def __init__(self, name: str, nodes: list[Step[Any, Any]] | None = None) -> None:
+    def __init__(self, name: str, nodes: list[Step[Any, Any]] | None = None, fuse: bool = False) -> None:
         self.name = name
         self.nodes = nodes or []
+        self.fuse = fuse
 
     def __rshift__(self, other: Step[Any, Any]) -> WorkflowBuilder:
         if self.nodes:
-            prev = self.nodes[-1]
-            if prev.output_model is not other.input_model:
-                raise TypeError(
-                    f"Type mismatch: {prev.name} outputs {prev.output_model.__name__} "
-                    f"but {other.name} expects {other.input_model.__name__}"
-                )
-        return WorkflowBuilder(self.name, self.nodes + [other])
+            _check_link(self.nodes[-1], other)
+        return WorkflowBuilder(self.name, self.nodes + [other], fuse=self.fuse)
 
     def build(self) -> Workflow:
         if not self.nodes:
             raise ValueError("Workflow has no steps")
-        wf = Workflow(self.name, self.nodes)
+        wf = Workflow(self.name, self.nodes, fuse=self.fuse)
         _REGISTRY.register_workflow(wf)
         return wf
 
 
 _REGISTRY = Registry()
+_RESOURCES = Resources()
 
 
-def workflow(name: str) -> WorkflowBuilder:
-    return WorkflowBuilder(name)
+def workflow(name: str, *, fuse: bool = False) -> WorkflowBuilder:
+    return WorkflowBuilder(name, fuse=fuse)
 
 
 InT = TypeVar("InT", bound=BaseModel)
 OutT = TypeVar("OutT", bound=BaseModel)
 
 
+def parallel[JoinT: BaseModel](
+    join: type[JoinT], /, *, name: str | None = None, **branches: Step[Any, Any] | Sequence[Step[Any, Any]]
+) -> ParallelStep[Any, JoinT]:
+    """Fan the same input out to each branch (a step or a chain of steps) and join the outputs into `join`.
+
+    Branch names are the join model's field names: `parallel(Checks, identity=check_id, fraud=[score, review])`.
+    """
+    if len(branches) < 2:
+        raise ValueError("parallel() needs at least two branches")
+    chains: dict[str, list[Step[Any, Any]]] = {}
+    for key, branch in branches.items():
+        chain = list(branch) if isinstance(branch, Sequence) else [branch]
+        if not chain:
+            raise ValueError(f"Branch {key} has no steps")
+        for prev, other in zip(chain, chain[1:], strict=False):
+            _check_link(prev, other)
+        chains[key] = chain
+
+    first_key, first_chain = next(iter(chains.items()))
+    input_model = first_chain[0].input_model
+    for key, chain in chains.items():
+        head, tail = chain[0], chain[-1]
+        if head.input_model is not input_model:
+            raise TypeError(
+                f"Type mismatch: branch {key} expects {head.input_model.__name__} "
+                f"but branch {first_key} expects {input_model.__name__}"
+            )
+        field = join.model_fields.get(key)
+        if field is None:
+            raise TypeError(f"Type mismatch: {join.__name__} has no field for branch {key}")
+        if field.annotation is not tail.output_model:
+            raise TypeError(
+                f"Type mismatch: branch {key} outputs {tail.output_model.__name__} "
+                f"but {join.__name__}.{key} expects {getattr(field.annotation, '__name__', field.annotation)}"
+            )
+    missing = [k for k, f in join.model_fields.items() if f.is_required() and k not in chains]
+    if missing:
+        fields = ", ".join(f"{join.__name__}.{k}" for k in missing)
+        raise TypeError(f"Type mismatch: no branch produces {fields}")
+    return ParallelStep(name or f"parallel-{'-'.join(chains)}", input_model, join, chains)
+
+
+def _list_item(model: type[BaseModel], field: str) -> Any:
+    info = model.model_fields.get(field)
+    if info is None:
+        raise TypeError(f"Type mismatch: {model.__name__} has no field {field}")
+    if get_origin(info.annotation) is not list:
+        raise TypeError(f"Type mismatch: {model.__name__}.{field} is not a list")
+    return get_args(info.annotation)[0]
+
+
+def map_each[OutT: BaseModel](
+    input_model: type[BaseModel],
+    field: str,
+    body: Step[Any, Any] | Sequence[Step[Any, Any]],
+    /,
+    *,
+    output: type[OutT],
+    into: str | None = None,
+    concurrency_limit: int | None = None,
+    batch_route: bool = False,
+    name: str | None = None,
+) -> MapStep[Any, OutT]:
+    """Run `body` (a step or a chain of steps) on every element of `input_model.<field>` concurrently.
+
+    Outputs are collected in input order into the `into` list field of `output` (its only field by default).
+    With `batch_route`, the whole list goes to each body step's /steps/<name>:batch route in a single call instead of
+    one call per item; meant for many small items.
+    """
+    chain = list(body) if isinstance(body, Sequence) else [body]
+    if not chain:
+        raise ValueError(f"Map over {field} has no steps")
+    for prev, other in zip(chain, chain[1:], strict=False):
+        _check_link(prev, other)
+    if into is None:
+        if len(output.model_fields) != 1:
+            raise ValueError(f"{output.__name__} has several fields; pass into= to pick the result list")
+        into = next(iter(output.model_fields))
+
+    head, tail = chain[0], chain[-1]
+    item = _list_item(input_model, field)
+    if item is not head.input_model:
+        raise TypeError(
+            f"Type mismatch: {input_model.__name__}.{field} holds {getattr(item, '__name__', item)} "
+            f"but {head.name} expects {head.input_model.__name__}"
+        )
+    result = _list_item(output, into)
+    if result is not tail.output_model:
+        raise TypeError(
+            f"Type mismatch: {tail.name} outputs {tail.output_model.__name__} "
+            f"but {output.__name__}.{into} holds {getattr(result, '__name__', result)}"
+        )
+    extra = [k for k, f in output.model_fields.items() if f.is_required() and k != into]
+    if extra:
+        fields = ", ".join(f"{output.__name__}.{k}" for k in extra)
+        raise TypeError(f"Type mismatch: map over {field} does not produce {fields}")
+    if concurrency_limit is not None and concurrency_limit < 1:
+        raise ValueError("concurrency_limit must be at least 1")
+    if batch_route and any(s.fn is None for s in chain):
+        raise ValueError(f"Map over {field}: batch_route=True needs a body of Python steps only")
+    return MapStep(
+        name or f"map-{field}", input_model, output, field, chain, into, concurrency_limit, batch_route=batch_route
+    )
+
+
 def step(
     *,
     name: str | None = None,
     retry: Any | None = None,
     timeout: Any | None = None,
     tags: Iterable[str] = (),
+    concurrency: ConcurrencyLimit | None = None,
+    run_in: RunIn | None = None,
+    batch: MicroBatch | None = None,
+    transient: TransientRetry | None = None,
 ):
-    def decorator(fn: Callable[[Context, InT], Awaitable[OutT]]) -> Step[InT, OutT]:
+    def decorator(fn: Callable[[Context, InT], Awaitable[OutT] | OutT]) -> Step[InT, OutT]:
         hints = get_type_hints(fn)
         sig = inspect.signature(fn)
         params = list(sig.parameters.values())
-        if len(params) != 2:
-            raise TypeError("@step function must accept exactly two positional parameters: (Context, InModel)")
+        if len(params) < 2:
+            raise TypeError("@step function must accept two positional parameters: (Context, InModel)")
+        # Anything after (Context, InModel) is a shared resource, looked up by type or parameter name per call
+        resource_params = {p.name: hints.get(p.name) for p in params[2:]}
+        if resource_params and run_in == "process":
+            raise TypeError("@step(run_in='process') functions cannot take resources; they live in the app process")
         in_param = params[1].name
         in_model = hints.get(in_param)
         out_model = hints.get("return")
+        if batch is not None:
+            # Batch functions take list[InModel] and return list[OutModel]; the step still serves one item per call
+            if get_origin(in_model) is not list or get_origin(out_model) is not list:
+                raise TypeError("@step(batch=...) function must take and return lists of Pydantic models")
+            in_model, out_model = get_args(in_model)[0], get_args(out_model)[0]
         if not (isinstance(in_model, type) and issubclass(in_model, BaseModel)):
             raise TypeError("@step function must type its second parameter as a Pydantic BaseModel subclass")
         if not (isinstance(out_model, type) and issubclass(out_model, BaseModel)):
             raise TypeError("@step function must return a Pydantic BaseModel subclass")
         base_name = getattr(fn, "__name__", "step")
         nm = name or base_name.replace("_", "-")
-        s: Step[Any, Any] = Step(nm, in_model, out_model, fn=fn, retry=retry, timeout=timeout, tags=tags)
+        s: Step[Any, Any] = Step(
+            nm,
+            in_model,
+            out_model,
+            fn=fn,
+            retry=retry,
+            timeout=timeout,
+            tags=tags,
+            concurrency=concurrency,
+            run_in=run_in,
+            batch=batch,
+            transient=transient,
+            resources=resource_params,
+        )
         _REGISTRY.register_step(s)
         return s
 
     return decorator
 
 
+def resource(*, name: str | None = None):
+    """Declare a shared resource; the factory may return it (sync or async) or yield it and clean up after."""
+
+    def decorator(factory: Callable[[], Any]) -> Callable[[], Any]:
+        resource_name = name or getattr(factory, "__name__", repr(factory))
+        _RESOURCES.register(ResourceSpec(resource_name, factory, _resource_type(factory)))
+        return factory
+
+    return decorator
+
+
 def get_registry() -> Registry:
     return _REGISTRY
 
 
+def get_resources() -> Resources:
+    return _RESOURCES
+
+
 def get_workflows() -> list[Workflow]:
     return _REGISTRY.get_workflows()
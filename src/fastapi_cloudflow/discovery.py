@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import ast
+import hashlib
+import importlib
+import json
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+CACHE_VERSION = 1
+
+
+@dataclass
+class ModuleIndex:
+    """What a flows module defines, found without importing it."""
+
+    module: str
+    sha256: str
+    steps: list[str] = field(default_factory=list)
+    workflows: list[str] = field(default_factory=list)
+    # A workflow(...) call whose name is not a string literal; the module must be imported to know it
+    dynamic: bool = False
+
+
+def _callee_name(node: ast.expr) -> str | None:
+    if isinstance(node, ast.Call):
+        node = node.func
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    return None
+
+
+def _literal_kwarg(call: ast.Call, name: str) -> str | None:
+    for kw in call.keywords:
+        if kw.arg == name and isinstance(kw.value, ast.Constant) and isinstance(kw.value.value, str):
+            return kw.value.value
+    return None
+
+
+def scan_source(module: str, source: bytes) -> ModuleIndex:
+    index = ModuleIndex(module=module, sha256=hashlib.sha256(source).hexdigest())
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        # Let the real import report it
+        index.dynamic = True
+        return index
+    # ast.walk goes breadth-first; visit in source order so names come out as written
+    nodes = sorted(ast.walk(tree), key=lambda n: (getattr(n, "lineno", 0), getattr(n, "col_offset", 0)))
+    for node in nodes:
+        if isinstance(node, ast.FunctionDef | ast.AsyncFunctionDef):
+            for deco in node.decorator_list:
+                if _callee_name(deco) == "step":
+                    named = _literal_kwarg(deco, "name") if isinstance(deco, ast.Call) else None
+                    # Mirrors the @step default: function name with dashes
+                    index.steps.append(named or node.name.replace("_", "-"))
+        elif isinstance(node, ast.Call) and _callee_name(node) == "workflow":
+            first = node.args[0] if node.args else None
+            if isinstance(first, ast.Constant) and isinstance(first.value, str):
+                index.workflows.append(first.value)
+            else:
+                index.dynamic = True
+    return index
+
+
+def _module_name(py: Path, root: Path) -> str:
+    try:
+        rel = py.relative_to(root)
+    except ValueError:
+        rel = py
+    return ".".join(rel.with_suffix("").parts)
+
+
+def scan_flows(flows_path: Path, cache_path: Path | None = None) -> list[ModuleIndex]:
+    """Index every module under `flows_path`; files whose hash is in the cache are not parsed again."""
+    cached: dict[str, dict] = {}
+    if cache_path is not None and cache_path.exists():
+        try:
+            data = json.loads(cache_path.read_text(encoding="utf-8"))
+            if data.get("version") == CACHE_VERSION:
+                cached = data.get("files", {})
+        except (OSError, ValueError):
+            cached = {}
+
+    root = Path.cwd()
+    indexes: list[ModuleIndex] = []
+    files: dict[str, dict] = {}
+    for py in _flow_files(flows_path):
+        source = py.read_bytes()
+        entry = cached.get(str(py))
+        if entry is not None and entry.get("sha256") == hashlib.sha256(source).hexdigest():
+            index = ModuleIndex(
+                module=entry["module"],
+                sha256=entry["sha256"],
+                steps=list(entry.get("steps", [])),
+                workflows=list(entry.get("workflows", [])),
+                dynamic=bool(entry.get("dynamic", False)),
+            )
+        else:
+            index = scan_source(_module_name(py, root), source)
+        indexes.append(index)
+        files[str(py)] = asdict(index)
+
+    if cache_path is not None:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        cache_path.write_text(json.dumps({"version": CACHE_VERSION, "files": files}, indent=2), encoding="utf-8")
+    return indexes
+
+
+def _flow_files(flows_path: Path) -> list[Path]:
+    if not flows_path.exists():
+        return []
+    return [py for py in sorted(flows_path.rglob("*.py")) if py.name != "__init__.py"]
+
+
+def modules_for(indexes: list[ModuleIndex], workflows: list[str] | None = None, steps: bool = False) -> list[str]:
+    """Modules to import for `workflows` (every module defining a workflow when None).
+
+    With `steps`, every module defining a step is imported too, for what serves steps rather than workflows.
+    """
+    wanted = set(workflows or ())
+    modules: list[str] = []
+    for index in indexes:
+        if (
+            index.dynamic
+            or (steps and index.steps)
+            or (index.workflows and (not wanted or wanted & set(index.workflows)))
+        ):
+            modules.append(index.module)
+    return modules
+
+
+def import_timed(modules: list[str]) -> list[tuple[str, float]]:
+    """Import `modules` in order; returns each module's import time in seconds, including what it pulls in."""
+    timings: list[tuple[str, float]] = []
+    for module in modules:
+        started = time.perf_counter()
+        importlib.import_module(module)
+        timings.append((module, time.perf_counter() - started))
+    return timings
@@ -0,0 +1,17 @@
+from fastapi_cloudflow.emulator.engine import Emulator, Execution, load_definition
+from fastapi_cloudflow.emulator.expressions import EmulatorError, WorkflowError
+from fastapi_cloudflow.emulator.load import LatencySummary, LoadReport, run_load
+from fastapi_cloudflow.emulator.resume import resume, resume_point
+
+__all__ = [
+    "Emulator",
+    "Execution",
+    "load_definition",
+    "EmulatorError",
+    "WorkflowError",
+    "LatencySummary",
+    "LoadReport",
+    "run_load",
+    "resume",
+    "resume_point",
+]
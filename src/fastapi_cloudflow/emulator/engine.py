@@ -0,0 +1,405 @@
+from __future__ import annotations
+
+import asyncio
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+import httpx
+import yaml
+
+from fastapi_cloudflow.emulator.expressions import (
+    BUILTINS,
+    EmulatorError,
+    Function,
+    WorkflowError,
+    compile_target,
+    evaluate,
+    get_item,
+)
+
+DEFAULT_BASE_URL = "http://cloudflow.local"
+HTTP_METHODS = {"get", "post", "put", "patch", "delete"}
+# Cloud Workflows gives up on an HTTP call after this long unless args.timeout says otherwise
+DEFAULT_HTTP_TIMEOUT_S = 300
+
+
+class _Return(Exception):
+    def __init__(self, value: Any) -> None:
+        self.value = value
+
+
+class _Headers(dict[str, Any]):
+    """Response headers; lookups ignore case like HTTP does, so `headers["X-Workflow-Run-Id"]` works."""
+
+    def __init__(self, headers: httpx.Headers) -> None:
+        super().__init__((k.lower(), v) for k, v in headers.items())
+
+    def __getitem__(self, key: str) -> Any:
+        return super().__getitem__(key.lower())
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and super().__contains__(key.lower())
+
+    def get(self, key: str, default: Any = None) -> Any:  # type: ignore[override]
+        return super().get(key.lower(), default)
+
+
+@dataclass
+class _Run:
+    env: dict[str, str]
+    # (step name, seconds) for every call step, retries included
+    calls: list[tuple[str, float]] = field(default_factory=list)
+
+
+class Frame:
+    """Variable scope. Loops write through to variables that exist outside them; parallel branches only to
+    their `shared` variables, like Cloud Workflows."""
+
+    __slots__ = ("run", "vars", "parent", "isolated", "shared")
+
+    def __init__(
+        self, run: _Run, parent: Frame | None = None, isolated: bool = False, shared: frozenset[str] = frozenset()
+    ) -> None:
+        self.run = run
+        self.vars: dict[str, Any] = {}
+        self.parent = parent
+        self.isolated = isolated
+        self.shared = shared
+
+    def _owner(self, name: str) -> Frame | None:
+        frame: Frame | None = self
+        while frame is not None:
+            if name in frame.vars:
+                return frame
+            frame = frame.parent
+        return None
+
+    def lookup(self, name: str) -> Any:
+        owner = self._owner(name)
+        if owner is not None:
+            return owner.vars[name]
+        if name in BUILTINS:
+            return BUILTINS[name]
+        raise WorkflowError.tagged("KeyError", f"Variable not defined: {name}")
+
+    def assign(self, name: str, value: Any) -> None:
+        frame: Frame = self
+        while name not in frame.vars and frame.parent is not None and frame.parent._owner(name) is not None:
+            if frame.isolated and name not in frame.shared:
+                raise EmulatorError(f"Parallel branch assigns {name!r}, which is not declared in `shared`")
+            frame = frame.parent
+        frame.vars[name] = value
+
+    def assign_path(self, target: str, value: Any) -> None:
+        name, keys = compile_target(target)
+        if not keys:
+            self.assign(name, value)
+            return
+        container = self.lookup(name)
+        for key in keys[:-1]:
+            container = get_item(container, key(self))
+        last = keys[-1](self)
+        if isinstance(container, dict):
+            container[last] = value
+        elif isinstance(container, list):
+            get_item(container, last)
+            container[last] = value
+        else:
+            raise WorkflowError.tagged("TypeError", f"Cannot assign into {target}")
+        # Writing into a variable from a branch needs the same permission as replacing it
+        self.assign(name, self.lookup(name))
+
+
+@dataclass
+class Execution:
+    """Outcome of one emulated execution."""
+
+    result: Any = None
+    # What the workflow raised (the `e` of an except block) when it failed
+    error: Any = None
+    duration_s: float = 0.0
+    calls: list[tuple[str, float]] = field(default_factory=list)
+
+    @property
+    def succeeded(self) -> bool:
+        return self.error is None
+
+
+def load_definition(source: str | dict[str, Any]) -> dict[str, Any]:
+    """Parse workflow YAML (or pass a dict through); only the `main` workflow is executed."""
+    definition = yaml.safe_load(source) if isinstance(source, str) else source
+    if not isinstance(definition, dict) or "main" not in definition:
+        raise EmulatorError("Workflow definition must have a `main` workflow")
+    return definition
+
+
+Sleep = Callable[[float], Awaitable[None]]
+
+
+class Emulator:
+    """Runs generated workflow definitions locally, sending `http.*` calls to an ASGI app.
+
+    Calls to `base_url` (what `BASE_URL` resolves to) go to `app` in-process; any other host goes to `external`,
+    the network by default. `sleep` is awaited for retry backoff, so tests can skip the waiting.
+    """
+
+    def __init__(
+        self,
+        app: Any = None,
+        *,
+        base_url: str = DEFAULT_BASE_URL,
+        env: dict[str, str] | None = None,
+        external: httpx.AsyncBaseTransport | None = None,
+        sleep: Sleep = asyncio.sleep,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.env = {"BASE_URL": self.base_url, **(env or {})}
+        mounts: dict[str, httpx.AsyncBaseTransport | None] = {}
+        if app is not None:
+            # An unhandled step error reaches the workflow as a 500, as it would from Cloud Run
+            transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+            mounts[f"all://{httpx.URL(self.base_url).host}"] = transport
+        self.client = httpx.AsyncClient(mounts=mounts, transport=external)
+        self.sleep = sleep
+
+    async def __aenter__(self) -> Emulator:
+        return self
+
+    async def __aexit__(self, *exc: object) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    async def execute(
+        self, source: str | dict[str, Any], argument: Any = None, workflow_id: str = "emulated"
+    ) -> Execution:
+        """Run `main` with `argument` bound to its parameter, as `gcloud workflows run --data` would."""
+        main = load_definition(source)["main"]
+        run = _Run(
+            env={
+                "GOOGLE_CLOUD_WORKFLOW_ID": workflow_id,
+                "GOOGLE_CLOUD_WORKFLOW_EXECUTION_ID": str(uuid.uuid4()),
+                **self.env,
+            }
+        )
+        frame = Frame(run)
+        params = main.get("params") or []
+        if params:
+            frame.vars[params[0]] = argument
+        execution = Execution(calls=run.calls)
+        started = time.perf_counter()
+        try:
+            await self._steps(main.get("steps") or [], frame)
+        except _Return as ret:
+            execution.result = ret.value
+        except WorkflowError as err:
+            execution.error = err.value
+        execution.duration_s = time.perf_counter() - started
+        return execution
+
+    async def _steps(self, steps: list[dict[str, Any]], frame: Frame) -> None:
+        for entry in steps:
+            if not isinstance(entry, dict) or len(entry) != 1:
+                raise EmulatorError(f"Each step must be a single-key map, got {entry!r}")
+            ((name, body),) = entry.items()
+            await self._step(name, body, frame)
+
+    async def _step(self, name: str, body: dict[str, Any], frame: Frame) -> None:
+        if "next" in body:
+            raise EmulatorError(f"{name}: `next` jumps are not supported")
+        if "try" in body:
+            await self._try(name, body, frame)
+        elif "call" in body:
+            await self._call(name, body, frame)
+        elif "assign" in body:
+            for item in body["assign"]:
+                ((target, value),) = item.items()
+                frame.assign_path(target, evaluate(value, frame))
+        elif "switch" in body:
+            await self._switch(name, body["switch"], frame)
+        elif "parallel" in body:
+            await self._parallel(name, body["parallel"], frame)
+        elif "for" in body:
+            await self._for(body["for"], frame, isolated=False, shared=frozenset())
+        elif "steps" in body:
+            await self._steps(body["steps"], frame)
+        elif "raise" in body:
+            raise WorkflowError(evaluate(body["raise"], frame))
+        elif "return" in body:
+            raise _Return(evaluate(body["return"], frame))
+        else:
+            raise EmulatorError(f"{name}: unsupported step {sorted(body)}")
+
+    async def _call(self, name: str, body: dict[str, Any], frame: Frame) -> None:
+        target = body["call"]
+        args = evaluate(body.get("args") or {}, frame)
+        started = time.perf_counter()
+        try:
+            if target.startswith("http.") and target[5:] in HTTP_METHODS | {"request"}:
+                method = args.get("method", "get") if target == "http.request" else target[5:]
+                result: Any = await self._http(method, args)
+            elif target == "sys.log":
+                result = None
+            elif target == "sys.sleep":
+                await self.sleep(float(args.get("seconds", 0)))
+                result = None
+            else:
+                raise EmulatorError(f"{name}: unsupported call {target!r}")
+        finally:
+            frame.run.calls.append((name, time.perf_counter() - started))
+        if "result" in body:
+            frame.assign(body["result"], result)
+
+    async def _http(self, method: str, args: dict[str, Any]) -> dict[str, Any]:
+        url = args.get("url")
+        if not isinstance(url, str):
+            raise WorkflowError.tagged("TypeError", f"http.{method} needs a string url, got {url!r}")
+        headers = {k: str(v) for k, v in (args.get("headers") or {}).items()}
+        body = args.get("body")
+        try:
+            response = await self.client.request(
+                method.upper(),
+                url,
+                headers=headers,
+                json=body if body is not None and method != "get" else None,
+                params=args.get("query"),
+                timeout=float(args.get("timeout", DEFAULT_HTTP_TIMEOUT_S)),
+            )
+        except httpx.TimeoutException as err:
+            raise WorkflowError.tagged("TimeoutError", f"HTTP request timed out: {err}") from err
+        except httpx.TransportError as err:
+            raise WorkflowError.tagged("ConnectionError", f"HTTP request failed: {err}") from err
+        content: Any = response.text
+        if "json" in response.headers.get("content-type", "") and response.content:
+            content = response.json()
+        result = {"code": response.status_code, "headers": _Headers(response.headers), "body": content}
+        if response.status_code >= 400:
+            raise WorkflowError(
+                {
+                    "message": f"HTTP server responded with error code {response.status_code}",
+                    "tags": ["HttpError"],
+                    **result,
+                }
+            )
+        return result
+
+    async def _try(self, name: str, body: dict[str, Any], frame: Frame) -> None:
+        attempt_body = body["try"]
+        policy = body.get("retry")
+        if isinstance(policy, str):
+            policy = evaluate(policy, frame)
+        retries = 0
+        delay = 0.0
+        while True:
+            try:
+                if "steps" in attempt_body:
+                    await self._steps(attempt_body["steps"], frame)
+                else:
+                    await self._step(name, attempt_body, frame)
+                return
+            except WorkflowError as err:
+                if policy is not None and retries < int(policy.get("max_retries", 0)):
+                    predicate = evaluate(policy["predicate"], frame)
+                    if not isinstance(predicate, Function):
+                        raise EmulatorError(f"{name}: retry predicate is not a function") from err
+                    if predicate(frame, err.value):
+                        backoff = policy.get("backoff") or {}
+                        delay = (
+                            float(backoff.get("initial_delay", 1.0))
+                            if retries == 0
+                            else min(delay * float(backoff.get("multiplier", 2.0)), float(backoff.get("max_delay", 60)))
+                        )
+                        retries += 1
+                        await self.sleep(delay)
+                        continue
+                handler = body.get("except")
+                if handler is None:
+                    raise
+                frame.assign(handler.get("as", "e"), err.value)
+                await self._steps(handler.get("steps") or [], frame)
+                return
+
+    async def _switch(self, name: str, cases: list[dict[str, Any]], frame: Frame) -> None:
+        for case in cases:
+            if not evaluate(case["condition"], frame):
+                continue
+            branch = {k: v for k, v in case.items() if k != "condition"}
+            await self._step(name, branch, frame)
+            return
+
+    async def _parallel(self, name: str, block: dict[str, Any], frame: Frame) -> None:
+        shared = frozenset(block.get("shared") or ())
+        missing = [v for v in shared if frame._owner(v) is None]
+        if missing:
+            raise EmulatorError(f"{name}: shared variables must exist before the parallel step: {missing}")
+        limit = block.get("concurrency_limit")
+        if "for" in block:
+            await self._for(block["for"], frame, isolated=True, shared=shared, limit=limit)
+            return
+        runs = []
+        for branch in block.get("branches") or []:
+            ((_, branch_body),) = branch.items()
+            runs.append(self._isolated(branch_body.get("steps") or [], frame, shared))
+        await _gather(runs, limit)
+
+    def _isolated(
+        self, steps: list[dict[str, Any]], frame: Frame, shared: frozenset[str], local: dict[str, Any] | None = None
+    ) -> Awaitable[None]:
+        branch = Frame(frame.run, frame, isolated=True, shared=shared)
+        branch.vars.update(local or {})
+        return self._steps(steps, branch)
+
+    async def _for(
+        self, loop: dict[str, Any], frame: Frame, isolated: bool, shared: frozenset[str], limit: int | None = None
+    ) -> None:
+        value_var, index_var = loop.get("value"), loop.get("index")
+        if "range" in loop:
+            start, end = evaluate(loop["range"], frame)
+            items: list[Any] = list(range(int(start), int(end) + 1))
+        else:
+            collection = evaluate(loop["in"], frame)
+            items = list(collection) if isinstance(collection, dict | list) else []
+        steps = loop.get("steps") or []
+
+        def local(i: int, item: Any) -> dict[str, Any]:
+            scope: dict[str, Any] = {}
+            if value_var:
+                scope[value_var] = item
+            if index_var:
+                scope[index_var] = i
+            return scope
+
+        if isolated:
+            await _gather([self._isolated(steps, frame, shared, local(i, item)) for i, item in enumerate(items)], limit)
+            return
+        for i, item in enumerate(items):
+            body = Frame(frame.run, frame)
+            body.vars.update(local(i, item))
+            await self._steps(steps, body)
+
+
+async def _gather(runs: list[Awaitable[None]], limit: int | None) -> None:
+    # Like an unhandled parallel step: the first error stops the remaining branches and fails the step
+    gate = asyncio.Semaphore(limit) if limit else None
+
+    async def gated(run: Awaitable[None]) -> None:
+        if gate is None:
+            await run
+            return
+        async with gate:
+            await run
+
+    tasks = [asyncio.ensure_future(gated(run)) for run in runs]
+    if not tasks:
+        return
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
@@ -0,0 +1,490 @@
+from __future__ import annotations
+
+import json
+import re
+import time
+from collections.abc import Callable
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from fastapi_cloudflow.emulator.engine import Frame
+
+
+class EmulatorError(Exception):
+    """The definition uses syntax the emulator does not implement; never caught by the workflow."""
+
+
+class WorkflowError(Exception):
+    """An error raised inside an execution; `value` is the map `except: as: e` would bind."""
+
+    def __init__(self, value: Any) -> None:
+        super().__init__(value.get("message", value) if isinstance(value, dict) else value)
+        self.value = value
+
+    @classmethod
+    def tagged(cls, tag: str, message: str) -> WorkflowError:
+        return cls({"message": message, "tags": [tag]})
+
+
+class Function:
+    """A builtin callable from expressions; gets the calling frame before its arguments."""
+
+    __slots__ = ("name", "fn")
+
+    def __init__(self, name: str, fn: Callable[..., Any]) -> None:
+        self.name = name
+        self.fn = fn
+
+    def __call__(self, frame: Frame, *args: Any) -> Any:
+        return self.fn(frame, *args)
+
+
+_TOKEN = re.compile(
+    r"""\s*(?:
+      (?P<num>\d+\.\d*(?:[eE][-+]?\d+)?|\d+(?:[eE][-+]?\d+)?)
+    | (?P<str>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+    | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+    | (?P<op>==|!=|<=|>=|//|[-+*/%<>()\[\]{},.:])
+    )""",
+    re.VERBOSE,
+)
+
+_KEYWORDS = {"true": True, "false": False, "True": True, "False": False, "null": None}
+
+Evaluator = Callable[["Frame"], Any]
+
+
+def _tokenize(source: str) -> list[tuple[str, str]]:
+    tokens: list[tuple[str, str]] = []
+    pos = 0
+    source = source.rstrip()
+    while pos < len(source):
+        match = _TOKEN.match(source, pos)
+        if match is None or match.end() == pos:
+            raise EmulatorError(f"Cannot parse expression {source!r} at offset {pos}")
+        kind = match.lastgroup or ""
+        tokens.append((kind, match.group(kind)))
+        pos = match.end()
+    return tokens
+
+
+def _number(text: str) -> int | float:
+    return float(text) if any(c in text for c in ".eE") else int(text)
+
+
+def _string(text: str) -> str:
+    if text[0] == "'":
+        text = '"' + text[1:-1].replace('"', '\\"').replace("\\'", "'") + '"'
+    return json.loads(text)
+
+
+def _is_number(v: Any) -> bool:
+    return isinstance(v, int | float) and not isinstance(v, bool)
+
+
+def _type_error(message: str) -> WorkflowError:
+    return WorkflowError.tagged("TypeError", message)
+
+
+def _add(a: Any, b: Any) -> Any:
+    if isinstance(a, str) and isinstance(b, str):
+        return a + b
+    if _is_number(a) and _is_number(b):
+        return a + b
+    raise _type_error(f"Unsupported operand types for +: {_type_name(a)} and {_type_name(b)}")
+
+
+def _arith(op: str) -> Callable[[Any, Any], Any]:
+    def apply(a: Any, b: Any) -> Any:
+        if not (_is_number(a) and _is_number(b)):
+            raise _type_error(f"Unsupported operand types for {op}: {_type_name(a)} and {_type_name(b)}")
+        try:
+            if op == "-":
+                return a - b
+            if op == "*":
+                return a * b
+            if op == "/":
+                return a / b
+            if op == "//":
+                return a // b
+            return a % b
+        except ZeroDivisionError as err:
+            raise WorkflowError.tagged("ZeroDivisionError", "Division by zero") from err
+
+    return apply
+
+
+_COMPARE: dict[str, Callable[[Any, Any], bool]] = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "in": lambda a, b: a in b,
+}
+
+
+def _type_name(v: Any) -> str:
+    if v is None:
+        return "null"
+    if isinstance(v, bool):
+        return "boolean"
+    if isinstance(v, int):
+        return "integer"
+    if isinstance(v, float):
+        return "double"
+    if isinstance(v, str):
+        return "string"
+    if isinstance(v, list):
+        return "list"
+    if isinstance(v, dict):
+        return "map"
+    return "function"
+
+
+def get_item(container: Any, key: Any) -> Any:
+    if isinstance(container, dict):
+        if not isinstance(key, str):
+            raise _type_error(f"Map keys must be strings, got {_type_name(key)}")
+        if key not in container:
+            raise WorkflowError.tagged("KeyError", f"Key not found: {key}")
+        return container[key]
+    if isinstance(container, list):
+        if not isinstance(key, int) or isinstance(key, bool):
+            raise _type_error(f"List indexes must be integers, got {_type_name(key)}")
+        if not -len(container) <= key < len(container):
+            raise WorkflowError.tagged("IndexError", f"List index out of range: {key}")
+        return container[key]
+    raise _type_error(f"Cannot index {_type_name(container)}")
+
+
+class _Parser:
+    """Recursive descent over the token list, producing closures that evaluate against a frame."""
+
+    def __init__(self, source: str) -> None:
+        self.source = source
+        self.tokens = _tokenize(source)
+        self.pos = 0
+
+    def peek(self) -> tuple[str, str] | None:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def accept(self, *values: str) -> str | None:
+        token = self.peek()
+        if token is not None and token[0] in ("op", "name") and token[1] in values:
+            self.pos += 1
+            return token[1]
+        return None
+
+    def expect(self, value: str) -> None:
+        if self.accept(value) is None:
+            raise EmulatorError(f"Expected {value!r} in expression {self.source!r}")
+
+    def parse(self) -> Evaluator:
+        node = self.or_()
+        if self.peek() is not None:
+            raise EmulatorError(f"Unexpected {self.peek()[1]!r} in expression {self.source!r}")  # type: ignore[index]
+        return node
+
+    def or_(self) -> Evaluator:
+        left = self.and_()
+        while self.accept("or"):
+            a, b = left, self.and_()
+            left = lambda f, a=a, b=b: bool(a(f)) or bool(b(f))  # noqa: E731
+        return left
+
+    def and_(self) -> Evaluator:
+        left = self.not_()
+        while self.accept("and"):
+            a, b = left, self.not_()
+            left = lambda f, a=a, b=b: bool(a(f)) and bool(b(f))  # noqa: E731
+        return left
+
+    def not_(self) -> Evaluator:
+        if self.accept("not"):
+            inner = self.not_()
+            return lambda f: not inner(f)
+        return self.compare()
+
+    def compare(self) -> Evaluator:
+        left = self.additive()
+        while op := self.accept("==", "!=", "<", "<=", ">", ">=", "in"):
+            a, b, test = left, self.additive(), _COMPARE[op]
+            left = lambda f, a=a, b=b, test=test: test(a(f), b(f))  # noqa: E731
+        return left
+
+    def additive(self) -> Evaluator:
+        left = self.term()
+        while op := self.accept("+", "-"):
+            a, b = left, self.term()
+            apply = _add if op == "+" else _arith(op)
+            left = lambda f, a=a, b=b, apply=apply: apply(a(f), b(f))  # noqa: E731
+        return left
+
+    def term(self) -> Evaluator:
+        left = self.unary()
+        while op := self.accept("*", "/", "//", "%"):
+            a, b, apply = left, self.unary(), _arith(op)
+            left = lambda f, a=a, b=b, apply=apply: apply(a(f), b(f))  # noqa: E731
+        return left
+
+    def unary(self) -> Evaluator:
+        if self.accept("-"):
+            inner = self.unary()
+            negate = _arith("-")
+            return lambda f: negate(0, inner(f))
+        return self.postfix()
+
+    def postfix(self) -> Evaluator:
+        node = self.primary()
+        while True:
+            if self.accept("."):
+                token = self.peek()
+                if token is None or token[0] != "name":
+                    raise EmulatorError(f"Expected a name after '.' in expression {self.source!r}")
+                self.pos += 1
+                node = lambda f, obj=node, key=token[1]: get_item(obj(f), key)  # noqa: E731
+            elif self.accept("["):
+                key_node = self.or_()
+                self.expect("]")
+                node = lambda f, obj=node, key=key_node: get_item(obj(f), key(f))  # noqa: E731
+            elif self.accept("("):
+                args = self.items(")")
+                node = self._call(node, args)
+            else:
+                return node
+
+    def _call(self, callee: Evaluator, args: list[Evaluator]) -> Evaluator:
+        def call(f: Frame) -> Any:
+            fn = callee(f)
+            if not isinstance(fn, Function):
+                raise _type_error(f"{_type_name(fn)} is not callable")
+            return fn(f, *(arg(f) for arg in args))
+
+        return call
+
+    def items(self, closing: str) -> list[Evaluator]:
+        items: list[Evaluator] = []
+        if self.accept(closing):
+            return items
+        while True:
+            items.append(self.or_())
+            if self.accept(closing):
+                return items
+            self.expect(",")
+
+    def primary(self) -> Evaluator:
+        token = self.peek()
+        if token is None:
+            raise EmulatorError(f"Unexpected end of expression {self.source!r}")
+        kind, text = token
+        self.pos += 1
+        if kind == "num":
+            value: Any = _number(text)
+            return lambda f: value
+        if kind == "str":
+            literal = _string(text)
+            return lambda f: literal
+        if kind == "name":
+            if text in _KEYWORDS:
+                keyword = _KEYWORDS[text]
+                return lambda f: keyword
+            return lambda f: f.lookup(text)
+        if text == "(":
+            inner = self.or_()
+            self.expect(")")
+            return inner
+        if text == "[":
+            elements = self.items("]")
+            return lambda f: [e(f) for e in elements]
+        if text == "{":
+            return self.mapping()
+        raise EmulatorError(f"Unexpected {text!r} in expression {self.source!r}")
+
+    def mapping(self) -> Evaluator:
+        pairs: list[tuple[Evaluator, Evaluator]] = []
+        if not self.accept("}"):
+            while True:
+                key = self.or_()
+                self.expect(":")
+                pairs.append((key, self.or_()))
+                if self.accept("}"):
+                    break
+                self.expect(",")
+        return lambda f: {k(f): v(f) for k, v in pairs}
+
+
+@lru_cache(maxsize=4096)
+def compile_expression(source: str) -> Evaluator:
+    """Compile the inside of a `${...}`; compiled forms are cached, so repeated executions only evaluate."""
+    return _Parser(source).parse()
+
+
+@lru_cache(maxsize=4096)
+def compile_target(source: str) -> tuple[str, tuple[Evaluator, ...]]:
+    """Split an assignment target like `join_0.a` or `map_0[string(i)]` into its variable and key expressions."""
+    parser = _Parser(source)
+    token = parser.peek()
+    if token is None or token[0] != "name":
+        raise EmulatorError(f"Invalid assignment target {source!r}")
+    parser.pos += 1
+    keys: list[Evaluator] = []
+    while parser.peek() is not None:
+        if parser.accept("."):
+            name = parser.peek()
+            if name is None or name[0] != "name":
+                raise EmulatorError(f"Invalid assignment target {source!r}")
+            parser.pos += 1
+            keys.append(lambda f, key=name[1]: key)
+        elif parser.accept("["):
+            keys.append(parser.or_())
+            parser.expect("]")
+        else:
+            raise EmulatorError(f"Invalid assignment target {source!r}")
+    return token[1], tuple(keys)
+
+
+def is_expression(value: Any) -> bool:
+    return isinstance(value, str) and value.startswith("${") and value.endswith("}")
+
+
+def evaluate(value: Any, frame: Frame) -> Any:
+    """Resolve a YAML value: whole-string `${...}` expressions are evaluated, maps and lists recursively."""
+    if isinstance(value, str):
+        if is_expression(value):
+            return compile_expression(value[2:-1])(frame)
+        return value
+    if isinstance(value, dict):
+        return {k: evaluate(v, frame) for k, v in value.items()}
+    if isinstance(value, list):
+        return [evaluate(v, frame) for v in value]
+    return value
+
+
+# Builtins ---------------------------------------------------------------------------------------------------------
+
+
+def _to_string(frame: Frame, value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if _is_number(value):
+        return str(value)
+    raise _type_error(f"Cannot convert {_type_name(value)} to string")
+
+
+def _to_int(frame: Frame, value: Any) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError) as err:
+        raise WorkflowError.tagged("ValueError", f"Cannot convert {value!r} to integer") from err
+
+
+def _to_double(frame: Frame, value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError) as err:
+        raise WorkflowError.tagged("ValueError", f"Cannot convert {value!r} to double") from err
+
+
+def _len(frame: Frame, value: Any) -> int:
+    if isinstance(value, str | list | dict):
+        return len(value)
+    raise _type_error(f"len() does not accept {_type_name(value)}")
+
+
+def _keys(frame: Frame, value: Any) -> list[str]:
+    if not isinstance(value, dict):
+        raise _type_error(f"keys() expects a map, got {_type_name(value)}")
+    return list(value)
+
+
+def _default(frame: Frame, value: Any, fallback: Any) -> Any:
+    return fallback if value is None else value
+
+
+def _get_env(frame: Frame, name: str, default: Any = None) -> Any:
+    return frame.run.env.get(name, default)
+
+
+def _concat(frame: Frame, items: Any, value: Any) -> list[Any]:
+    if not isinstance(items, list):
+        raise _type_error(f"list.concat expects a list, got {_type_name(items)}")
+    return [*items, value]
+
+
+def _map_get(frame: Frame, mapping: Any, key: Any) -> Any:
+    if not isinstance(mapping, dict):
+        return None
+    if isinstance(key, list):
+        for part in key:
+            if not isinstance(mapping, dict) or part not in mapping:
+                return None
+            mapping = mapping[part]
+        return mapping
+    return mapping.get(key)
+
+
+def _tags(error: Any) -> list[str]:
+    return list(error.get("tags", [])) if isinstance(error, dict) else []
+
+
+def _retry_on(codes: set[int], tags: set[str]) -> Callable[[Frame, Any], bool]:
+    def predicate(frame: Frame, error: Any) -> bool:
+        if tags & set(_tags(error)):
+            return True
+        return "HttpError" in _tags(error) and error.get("code") in codes
+
+    return predicate
+
+
+_DEFAULT_PREDICATE = Function(
+    "http.default_retry_predicate", _retry_on({429, 502, 503, 504}, {"ConnectionError", "TimeoutError"})
+)
+_NON_IDEMPOTENT_PREDICATE = Function(
+    "http.default_retry_predicate_non_idempotent", _retry_on({429, 503}, {"ConnectionFailedError"})
+)
+_DEFAULT_BACKOFF = {"initial_delay": 1.0, "max_delay": 60.0, "multiplier": 1.25}
+
+BUILTINS: dict[str, Any] = {
+    "string": Function("string", _to_string),
+    "int": Function("int", _to_int),
+    "double": Function("double", _to_double),
+    "len": Function("len", _len),
+    "keys": Function("keys", _keys),
+    "default": Function("default", _default),
+    "sys": {
+        "get_env": Function("sys.get_env", _get_env),
+        "now": Function("sys.now", lambda frame: time.time()),
+    },
+    "text": {
+        "replace_all": Function("text.replace_all", lambda frame, s, old, new: s.replace(old, new)),
+        "split": Function("text.split", lambda frame, s, sep: s.split(sep)),
+        "to_lower": Function("text.to_lower", lambda frame, s: s.lower()),
+        "to_upper": Function("text.to_upper", lambda frame, s: s.upper()),
+        "substring": Function("text.substring", lambda frame, s, start, end: s[start:end]),
+    },
+    "list": {"concat": Function("list.concat", _concat)},
+    "map": {"get": Function("map.get", _map_get)},
+    "json": {
+        "encode_to_string": Function("json.encode_to_string", lambda frame, v: json.dumps(v, separators=(",", ":"))),
+        "decode": Function("json.decode", lambda frame, s: json.loads(s)),
+    },
+    "http": {
+        "default_retry_predicate": _DEFAULT_PREDICATE,
+        "default_retry_predicate_non_idempotent": _NON_IDEMPOTENT_PREDICATE,
+        "default_retry": {"predicate": _DEFAULT_PREDICATE, "max_retries": 5, "backoff": _DEFAULT_BACKOFF},
+        "default_retry_non_idempotent": {
+            "predicate": _NON_IDEMPOTENT_PREDICATE,
+            "max_retries": 5,
+            "backoff": _DEFAULT_BACKOFF,
+        },
+    },
+    "retry": {
+        "always": Function("retry.always", lambda frame, error: True),
+        "never": Function("retry.never", lambda frame, error: False),
+    },
+}
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from collections import defaultdict
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+from fastapi_cloudflow.emulator.engine import Emulator, Execution, load_definition
+
+
+@dataclass
+class LatencySummary:
+    count: int
+    p50: float
+    p95: float
+    p99: float
+    max: float
+
+    @classmethod
+    def of(cls, samples: list[float]) -> LatencySummary:
+        ordered = sorted(samples)
+        if not ordered:
+            return cls(0, 0.0, 0.0, 0.0, 0.0)
+
+        def rank(q: float) -> float:
+            # Nearest-rank percentile: the smallest sample at or above q of the distribution
+            return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+        return cls(len(ordered), rank(0.50), rank(0.95), rank(0.99), ordered[-1])
+
+
+@dataclass
+class LoadReport:
+    executions: int
+    failures: int
+    wall_s: float
+    end_to_end: LatencySummary
+    steps: dict[str, LatencySummary] = field(default_factory=dict)
+    # One failed execution's error, to tell what went wrong without rerunning
+    sample_error: Any = None
+
+    @property
+    def throughput(self) -> float:
+        """Executions finished per second of wall time."""
+        return self.executions / self.wall_s if self.wall_s else 0.0
+
+    def render(self) -> str:
+        lines = [
+            f"executions: {self.executions}  failures: {self.failures}  wall: {self.wall_s:.3f}s  "
+            f"throughput: {self.throughput:.1f}/s",
+            f"{'step':<40} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}",
+        ]
+        rows = [("end-to-end", self.end_to_end), *sorted(self.steps.items())]
+        for name, s in rows:
+            lines.append(
+                f"{name:<40} {s.count:>7} {s.p50 * 1000:>9.2f} {s.p95 * 1000:>9.2f} {s.p99 * 1000:>9.2f} "
+                f"{s.max * 1000:>9.2f}"
+            )
+        if self.sample_error is not None:
+            lines.append(f"sample error: {self.sample_error}")
+        return "\n".join(lines)
+
+
+async def run_load(
+    emulator: Emulator,
+    source: str | dict[str, Any],
+    argument: Any | Callable[[int], Any] = None,
+    executions: int = 100,
+    concurrency: int = 10,
+    workflow_id: str = "emulated",
+) -> LoadReport:
+    """Run `executions` executions, at most `concurrency` at a time, and summarize their latencies.
+
+    `argument` is passed to every execution, or called with the execution number to build one per execution.
+    """
+    definition = load_definition(source)
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(n: int) -> Execution:
+        arg = argument(n) if callable(argument) else argument
+        async with gate:
+            return await emulator.execute(definition, arg, workflow_id=workflow_id)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(one(n) for n in range(executions)))
+    wall_s = time.perf_counter() - started
+
+    per_step: defaultdict[str, list[float]] = defaultdict(list)
+    for execution in results:
+        for name, seconds in execution.calls:
+            per_step[name].append(seconds)
+    failed = [e for e in results if not e.succeeded]
+    return LoadReport(
+        executions=executions,
+        failures=len(failed),
+        wall_s=wall_s,
+        end_to_end=LatencySummary.of([e.duration_s for e in results]),
+        steps={name: LatencySummary.of(samples) for name, samples in per_step.items()},
+        sample_error=failed[0].error if failed else None,
+    )
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from typing import Any
+
+from fastapi_cloudflow.codegen.workflows import render_workflow_yaml
+from fastapi_cloudflow.core import FusedStep, Step, Workflow
+from fastapi_cloudflow.emulator.engine import Emulator, Execution
+from fastapi_cloudflow.journal import Journal, JournalEntry
+
+
+def resume_point(
+    wf: Workflow, entries: list[JournalEntry], from_step: str | None = None
+) -> tuple[list[Step[Any, Any]], Any]:
+    """The nodes left to run from `from_step` and the journaled payload to feed the first of them.
+
+    A node's payload is its own journaled input, or else the journaled output of the node before it. Without
+    `from_step`, the run resumes from the furthest node that can be fed, skipping everything before it.
+    """
+    nodes = wf.fused_nodes()
+    latest = {e.step: e for e in entries}
+
+    def payload_of(index: int) -> tuple[bool, Any]:
+        entry = latest.get(nodes[index].name)
+        if entry is not None:
+            return True, entry.payload
+        if index > 0:
+            prev = latest.get(nodes[index - 1].name)
+            if prev is not None and prev.error is None:
+                return True, prev.result
+        return False, None
+
+    if from_step is None:
+        for index in reversed(range(len(nodes))):
+            found, payload = payload_of(index)
+            if found:
+                return nodes[index:], payload
+        raise LookupError(f"No journaled step of {wf.name} to resume from")
+
+    names = [n.name for n in nodes]
+    if from_step not in names:
+        fused = next((n for n in nodes if isinstance(n, FusedStep) and from_step in [s.name for s in n.steps]), None)
+        if fused is not None:
+            raise ValueError(f"Step {from_step} is fused into {fused.name}; resume from {fused.name}")
+        raise ValueError(f"Workflow {wf.name} has no step {from_step}")
+    index = names.index(from_step)
+    found, payload = payload_of(index)
+    if not found:
+        raise LookupError(f"Nothing journaled feeds {from_step}: neither its input nor the output before it")
+    return nodes[index:], payload
+
+
+async def resume(
+    emulator: Emulator,
+    wf: Workflow,
+    journal: Journal,
+    run_id: str,
+    from_step: str | None = None,
+    trace: bool = False,
+    compression: bool = False,
+    shed_retry_after: int | None = None,
+) -> Execution:
+    """Run the rest of a journaled run of `wf` in the emulator, starting at `from_step` (see `resume_point`).
+
+    Steps before it are not called again; the resumed execution gets a run id of its own.
+    """
+    entries = await journal.entries(run_id)
+    if not entries:
+        raise LookupError(f"No journaled steps for run {run_id}")
+    remaining, payload = resume_point(wf, entries, from_step)
+    # Already fused: rendering these nodes again must not fuse across the cut
+    rest = Workflow(wf.name, remaining)
+    source = render_workflow_yaml(rest, trace=trace, compression=compression, shed_retry_after=shed_retry_after)
+    return await emulator.execute(source, payload, workflow_id=wf.name)
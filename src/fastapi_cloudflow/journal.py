@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Protocol
+
+
+@dataclass
+class JournalEntry:
+    run_id: str
+    step: str
+    # Validated step input and encoded output, decoded from JSON; `result` is None when the step failed
+    payload: Any
+    result: Any = None
+    error: str | None = None
+    workflow: str | None = None
+    recorded_at: float = 0.0
+
+
+class Journal(Protocol):
+    async def record(
+        self,
+        run_id: str,
+        step: str,
+        payload: bytes | str,
+        result: bytes | None,
+        error: str | None = None,
+        workflow: str | None = None,
+    ) -> None: ...
+
+    async def entries(self, run_id: str) -> list[JournalEntry]: ...
+
+    async def runs(self, workflow: str | None = None) -> list[str]: ...
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS journal (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    workflow TEXT,
+    step TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    recorded_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS journal_run ON journal (run_id, id);
+"""
+
+
+class SqliteJournal:
+    """Step inputs and outputs per run in a local SQLite file, for replaying and resuming runs while debugging."""
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = str(path)
+        self._conn: sqlite3.Connection | None = None
+        # One connection shared by the worker threads; sqlite3 calls on it are serialized here
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.path != ":memory:":
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _record(
+        self, run_id: str, step: str, payload: str, result: str | None, error: str | None, workflow: str | None
+    ) -> None:
+        with self._lock:
+            self._connect().execute(
+                "INSERT INTO journal (run_id, workflow, step, payload, result, error, recorded_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (run_id, workflow, step, payload, result, error, time.time()),
+            )
+
+    def _entries(self, run_id: str) -> list[JournalEntry]:
+        with self._lock:
+            rows = (
+                self._connect()
+                .execute(
+                    "SELECT run_id, step, payload, result, error, workflow, recorded_at FROM journal "
+                    "WHERE run_id = ? ORDER BY id",
+                    (run_id,),
+                )
+                .fetchall()
+            )
+        return [
+            JournalEntry(
+                run_id=run,
+                step=step,
+                payload=json.loads(payload),
+                result=json.loads(result) if result is not None else None,
+                error=error,
+                workflow=workflow,
+                recorded_at=recorded_at,
+            )
+            for run, step, payload, result, error, workflow, recorded_at in rows
+        ]
+
+    def _runs(self, workflow: str | None) -> list[str]:
+        query = "SELECT run_id FROM journal"
+        params: tuple[Any, ...] = ()
+        if workflow is not None:
+            query += " WHERE workflow = ?"
+            params = (workflow,)
+        query += " GROUP BY run_id ORDER BY MAX(id) DESC"
+        with self._lock:
+            return [run for (run,) in self._connect().execute(query, params).fetchall()]
+
+    async def record(
+        self,
+        run_id: str,
+        step: str,
+        payload: bytes | str,
+        result: bytes | None,
+        error: str | None = None,
+        workflow: str | None = None,
+    ) -> None:
+        text = payload.decode("utf-8") if isinstance(payload, bytes) else payload
+        out = result.decode("utf-8") if result is not None else None
+        await asyncio.to_thread(self._record, run_id, step, text, out, error, workflow)
+
+    async def entries(self, run_id: str) -> list[JournalEntry]:
+        """Everything recorded for `run_id`, oldest first."""
+        return await asyncio.to_thread(self._entries, run_id)
+
+    async def runs(self, workflow: str | None = None) -> list[str]:
+        """Journaled run ids, most recently active first."""
+        return await asyncio.to_thread(self._runs, workflow)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from collections.abc import AsyncIterator, Sequence
+from contextlib import AsyncExitStack, asynccontextmanager
+
+from fastapi import HTTPException
+
+from fastapi_cloudflow.core import ConcurrencyLimit
+
+
+class ConcurrencyLimiter:
+    """In-flight cap with a bounded FIFO wait queue.
+
+    Built on bare futures rather than asyncio.Semaphore so one limiter can serve whichever loop is running.
+    """
+
+    def __init__(self, limit: ConcurrencyLimit) -> None:
+        self.limit = limit
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future[None]] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> bool:
+        """Take a slot, waiting in the queue if there is room; False means the request should be shed."""
+        if self.in_flight < self.limit.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            return True
+        if len(self._waiters) >= self.limit.max_queued:
+            return False
+        fut: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await asyncio.wait_for(fut, self.limit.max_wait_s)
+        except TimeoutError:
+            self._abandon(fut)
+            return False
+        except asyncio.CancelledError:
+            self._abandon(fut)
+            raise
+        return True
+
+    def _abandon(self, fut: asyncio.Future[None]) -> None:
+        if fut.done() and not fut.cancelled():
+            # The slot was handed over just as we gave up
+            self.release()
+        elif fut in self._waiters:
+            self._waiters.remove(fut)
+
+    def release(self) -> None:
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                # Hand the slot straight to the next waiter; in_flight stays the same
+                fut.set_result(None)
+                return
+        self.in_flight -= 1
+
+
+@asynccontextmanager
+async def admit(limiter: ConcurrencyLimiter | None, status_code: int) -> AsyncIterator[None]:
+    """Hold a limiter slot for the block, shedding with `status_code` and Retry-After when none is available."""
+    if limiter is None:
+        yield
+        return
+    if not await limiter.acquire():
+        raise HTTPException(
+            status_code=status_code,
+            detail="Too many in-flight requests",
+            headers={"Retry-After": str(limiter.limit.retry_after_s)},
+        )
+    try:
+        yield
+    finally:
+        limiter.release()
+
+
+@asynccontextmanager
+async def admit_all(limiters: Sequence[ConcurrencyLimiter], status_code: int) -> AsyncIterator[None]:
+    """Hold a slot of every limiter for the block; the first one that is full sheds the request."""
+    async with AsyncExitStack() as stack:
+        for limiter in limiters:
+            await stack.enter_async_context(admit(limiter, status_code))
+        yield
@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import math
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from collections.abc import Mapping
+
+LATENCY_BUCKETS_S = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class StepMetrics:
+    """Per-step counters, gauges and histograms rendered in the Prometheus text format."""
+
+    def __init__(
+        self,
+        latency_buckets: tuple[float, ...] = LATENCY_BUCKETS_S,
+        size_buckets: tuple[float, ...] = SIZE_BUCKETS_BYTES,
+    ) -> None:
+        self.latency_buckets = latency_buckets
+        self.size_buckets = size_buckets
+        self.requests: defaultdict[Labels, int] = defaultdict(int)
+        self.errors: defaultdict[Labels, int] = defaultdict(int)
+        self.in_flight: defaultdict[Labels, int] = defaultdict(int)
+        self.durations: dict[Labels, _Histogram] = {}
+        self.request_bytes: dict[Labels, _Histogram] = {}
+        self.response_bytes: dict[Labels, _Histogram] = {}
+        self.startup: dict[Labels, float] = {}
+
+    def start(self, step: str) -> StepRecording:
+        self.in_flight[(("step", step),)] += 1
+        return StepRecording(self, step)
+
+    def record_startup(self, phase: str, seconds: float) -> None:
+        self.startup[(("phase", phase),)] = seconds
+
+    def _observe(
+        self, series: dict[Labels, _Histogram], labels: Labels, value: float, buckets: tuple[float, ...]
+    ) -> None:
+        hist = series.get(labels)
+        if hist is None:
+            hist = series[labels] = _Histogram(buckets)
+        hist.observe(value)
+
+    def _finish(self, rec: StepRecording, error: str | None) -> None:
+        self.in_flight[(("step", rec.step),)] -= 1
+        base = (("step", rec.step), ("workflow", rec.workflow or ""))
+        self.requests[base] += 1
+        if error is not None:
+            self.errors[(*base, ("error", error))] += 1
+        for phase, seconds in rec.phases:
+            self._observe(self.durations, (*base, ("phase", phase)), seconds, self.latency_buckets)
+        self._observe(self.durations, (*base, ("phase", "total")), rec.elapsed(), self.latency_buckets)
+        if rec.request_size is not None:
+            self._observe(self.request_bytes, base, rec.request_size, self.size_buckets)
+        if rec.response_size is not None:
+            self._observe(self.response_bytes, base, rec.response_size, self.size_buckets)
+
+    def render(self) -> str:
+        lines: list[str] = []
+        _render_scalar(lines, "cloudflow_step_requests_total", "counter", "Step requests handled", self.requests)
+        _render_scalar(lines, "cloudflow_step_errors_total", "counter", "Step requests failed, by error", self.errors)
+        _render_scalar(lines, "cloudflow_step_in_flight", "gauge", "Step requests in progress", self.in_flight)
+        _render_histograms(
+            lines, "cloudflow_step_duration_seconds", "Step latency by phase", self.durations, self.latency_buckets
+        )
+        _render_histograms(
+            lines, "cloudflow_step_request_bytes", "Step request body size", self.request_bytes, self.size_buckets
+        )
+        _render_histograms(
+            lines, "cloudflow_step_response_bytes", "Step response body size", self.response_bytes, self.size_buckets
+        )
+        if self.startup:
+            _render_scalar(lines, "cloudflow_startup_seconds", "gauge", "Import and warmup time", self.startup)
+        return "\n".join(lines) + "\n"
+
+
+class StepRecording:
+    """Timeline of one step request; each mark closes the phase started by the previous one."""
+
+    __slots__ = ("metrics", "step", "workflow", "phases", "started", "last", "request_size", "response_size")
+
+    def __init__(self, metrics: StepMetrics | None, step: str) -> None:
+        self.metrics = metrics
+        self.step = step
+        self.workflow: str | None = None
+        self.phases: list[tuple[str, float]] = []
+        self.started = self.last = time.perf_counter()
+        self.request_size: int | None = None
+        self.response_size: int | None = None
+
+    def mark(self, phase: str) -> None:
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def finish(self) -> None:
+        if self.metrics is not None:
+            self.metrics._finish(self, None)
+
+    def fail(self, error: str) -> None:
+        if self.metrics is not None:
+            self.metrics._finish(self, error)
+
+
+def _ignored() -> property:
+    return property(lambda self: None, lambda self, value: None)
+
+
+class _NullRecording(StepRecording):
+    """Stand-in shared by every request when metrics are off, so it drops whatever requests write to it."""
+
+    __slots__ = ()
+
+    workflow = _ignored()  # type: ignore[assignment]
+    request_size = _ignored()  # type: ignore[assignment]
+    response_size = _ignored()  # type: ignore[assignment]
+
+    def __init__(self) -> None:
+        super().__init__(None, "")
+
+    def mark(self, phase: str) -> None:
+        pass
+
+
+NULL_RECORDING: StepRecording = _NullRecording()
+
+
+def _format_labels(labels: Labels, extra: tuple[tuple[str, str], ...] = ()) -> str:
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    inner = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + inner + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    # Exact, like prometheus_client's floatToGoString; :g keeps six digits and turned 16777216 into 1.67772e+07
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer() and abs(value) < 2**53:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _render_scalar(lines: list[str], name: str, kind: str, help_text: str, series: Mapping[Labels, float]) -> None:
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+    for labels, value in series.items():
+        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+
+def _render_histograms(
+    lines: list[str], name: str, help_text: str, series: dict[Labels, _Histogram], buckets: tuple[float, ...]
+) -> None:
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for labels, hist in series.items():
+        cumulative = 0
+        for bound, count in zip(buckets, hist.counts, strict=False):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labels, (('le', _format_value(bound)),))} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {hist.count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(hist.sum)}")
+        lines.append(f"{name}_count{_format_labels(labels)} {hist.count}")
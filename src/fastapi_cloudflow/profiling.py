@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import cProfile
+import hashlib
+import hmac
+import json
+import random
+import re
+import time
+import tracemalloc
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+from fastapi_cloudflow.core import WorkflowMeta
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def sign_profile_request(secret: str, ttl_s: float = 300.0) -> str:
+    """Token for the X-Workflow-Profile header, valid for `ttl_s` seconds."""
+    expires = f"{time.time() + ttl_s:.0f}"
+    return f"{expires}.{_signature(secret, expires)}"
+
+
+def _signature(secret: str, expires: str) -> str:
+    return hmac.new(secret.encode(), expires.encode(), hashlib.sha256).hexdigest()
+
+
+class StepProfiler:
+    """Opt-in CPU (cProfile) and memory (tracemalloc) profiling of individual step executions.
+
+    A request is profiled when it carries a valid signed X-Workflow-Profile token or wins the `sample_rate` draw.
+    Output lands in `output_dir` as <id>.prof / <id>.mem.txt plus an <id>.json sidecar naming the run and step.
+    """
+
+    def __init__(
+        self,
+        output_dir: str | Path,
+        *,
+        secret: str | None = None,
+        sample_rate: float = 0.0,
+        cpu: bool = True,
+        memory: bool = False,
+        top_allocations: int = 25,
+    ) -> None:
+        self.output_dir = Path(output_dir)
+        self.secret = secret
+        self.sample_rate = sample_rate
+        self.cpu = cpu
+        self.memory = memory
+        self.top_allocations = top_allocations
+        # The interpreter allows a single active profiler, so overlapping requests run unprofiled
+        self._active = False
+
+    def wanted(self, token: str | None) -> bool:
+        if token is not None and self.secret is not None and self._valid(token):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _valid(self, token: str) -> bool:
+        expires, _, signature = token.partition(".")
+        try:
+            if float(expires) < time.time():
+                return False
+        except ValueError:
+            return False
+        return hmac.compare_digest(signature, _signature(self.secret or "", expires))
+
+    @contextmanager
+    def capture(self, meta: WorkflowMeta) -> Iterator[str | None]:
+        """Profile the enclosed block; yields the profile id, or None if another capture is running."""
+        if self._active:
+            yield None
+            return
+        self._active = True
+        profile_id = _UNSAFE.sub("_", f"{meta.step}-{meta.run_id}-{time.time_ns()}")
+        cpu = cProfile.Profile() if self.cpu else None
+        memory = self.memory and not tracemalloc.is_tracing()
+        if memory:
+            tracemalloc.start()
+        if cpu is not None:
+            cpu.enable()
+        try:
+            yield profile_id
+        finally:
+            if cpu is not None:
+                cpu.disable()
+            try:
+                self._write(profile_id, meta, cpu, tracemalloc.take_snapshot() if memory else None)
+            finally:
+                if memory:
+                    tracemalloc.stop()
+                self._active = False
+
+    def _write(
+        self, profile_id: str, meta: WorkflowMeta, cpu: cProfile.Profile | None, snapshot: tracemalloc.Snapshot | None
+    ) -> None:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        files: list[str] = []
+        if cpu is not None:
+            cpu.dump_stats(self.output_dir / f"{profile_id}.prof")
+            files.append(f"{profile_id}.prof")
+        if snapshot is not None:
+            stats = snapshot.statistics("lineno")[: self.top_allocations]
+            text = "\n".join(str(stat) for stat in stats) + "\n"
+            (self.output_dir / f"{profile_id}.mem.txt").write_text(text, encoding="utf-8")
+            files.append(f"{profile_id}.mem.txt")
+        sidecar = {"workflow": meta.name, "step": meta.step, "run_id": meta.run_id, "files": files}
+        (self.output_dir / f"{profile_id}.json").write_text(json.dumps(sidecar), encoding="utf-8")
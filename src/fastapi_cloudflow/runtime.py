@@ -1,67 +1,709 @@
+import asyncio
 import json
+import re
+import time
 import uuid
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from functools import cached_property
+from pathlib import Path
+from types import MappingProxyType
 from typing import Any
 
 from fastapi import APIRouter, FastAPI, HTTPException, Request, Response
-from pydantic import ValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel, ConfigDict, TypeAdapter, ValidationError, create_model
 
-from fastapi_cloudflow.core import Context, Step, WorkflowMeta, get_registry
+from fastapi_cloudflow.cache import MemoryResultCache, ResultCache, SingleFlight, memo_key, result_key
+from fastapi_cloudflow.claimcheck import ClaimCheck
+from fastapi_cloudflow.compression import Compression
+from fastapi_cloudflow.core import (
+    ConcurrencyLimit,
+    Context,
+    FusedStep,
+    MapStep,
+    ParallelStep,
+    Step,
+    WorkflowMeta,
+    get_registry,
+    get_resources,
+)
+from fastapi_cloudflow.core.executors import configure_executors, shutdown_executors, warm_executors
+from fastapi_cloudflow.journal import Journal
+from fastapi_cloudflow.limits import ConcurrencyLimiter, admit, admit_all
+from fastapi_cloudflow.metrics import NULL_RECORDING, StepMetrics, StepRecording
+from fastapi_cloudflow.profiling import StepProfiler
+from fastapi_cloudflow.tracing import Span, Tracer
+from fastapi_cloudflow.warmup import Warmup
 
 
-def _build_step_router() -> APIRouter:
+def _batched_step_names() -> set[str]:
+    """Steps whose batch route generated workflows call: the bodies of `map_each(..., batch_route=True)` nodes."""
+    names: set[str] = set()
+
+    def walk(nodes: list[Step[Any, Any]]) -> None:
+        for node in nodes:
+            if isinstance(node, MapStep):
+                if node.batch_route:
+                    names.update(s.name for s in node.body)
+                walk(node.body)
+            elif isinstance(node, ParallelStep):
+                for chain in node.branches.values():
+                    walk(chain)
+
+    for wf in get_registry().get_workflows():
+        walk(wf.nodes)
+    return names
+
+
+# Steps tagged pure are deterministic functions of their input
+PURE_TAG = "pure"
+
+
+class BatchItemError(BaseModel):
+    index: int
+    status: int
+    detail: Any
+
+
+def _batch_result_model(step: Step[Any, Any]) -> type[BaseModel]:
+    return create_model(
+        f"{step.output_model.__name__}BatchResult",
+        results=(list[step.output_model | None], ...),  # type: ignore[name-defined]
+        errors=(list[BatchItemError], ...),
+    )
+
+
+# Cheap sniff for the {"payload": {...}} wrapper so plain bodies never pay for a second validation
+_ENVELOPE_PREFIX = re.compile(rb'\s*\{\s*"payload"\s*:')
+
+
+class _StepCodec:
+    """Prebuilt validators/serializers that go straight from body bytes to models and back."""
+
+    def __init__(self, step: Step[Any, Any]) -> None:
+        self.input_model = step.input_model
+        self.output_model = step.output_model
+        self.output = TypeAdapter(step.output_model)
+
+    # Rarely used shapes are built on first use (or by warmup) rather than for every step at import
+    @cached_property
+    def envelope(self) -> type[BaseModel]:
+        # Accept either raw model or a wrapped {"payload": {...}} for compatibility with clients
+        return create_model(
+            f"{self.input_model.__name__}Envelope",
+            __config__=ConfigDict(extra="forbid"),
+            payload=(self.input_model, ...),
+        )
+
+    @cached_property
+    def inputs(self) -> TypeAdapter[list[Any]]:
+        return TypeAdapter(list[self.input_model])  # type: ignore[name-defined]
+
+    @cached_property
+    def outputs(self) -> TypeAdapter[list[Any]]:
+        return TypeAdapter(list[self.output_model | None])  # type: ignore[name-defined]
+
+    def warm(self, batch: bool) -> None:
+        for model in (self.input_model, self.output_model):
+            if not model.__pydantic_complete__:
+                model.model_rebuild()
+        _ = self.envelope
+        if batch:
+            _ = self.inputs, self.outputs
+
+    def decode(self, raw: bytes) -> BaseModel:
+        stripped = raw.strip()
+        if not stripped or stripped == b"null":
+            raise HTTPException(status_code=422, detail="Request body required")
+        envelope_errors = None
+        if _ENVELOPE_PREFIX.match(stripped):
+            try:
+                return self.envelope.model_validate_json(stripped).payload  # type: ignore[attr-defined]
+            except ValidationError as err:
+                envelope_errors = err.errors()
+        try:
+            return self.input_model.model_validate_json(stripped)
+        except ValidationError as err:
+            if any(e["type"] == "json_invalid" for e in err.errors()):
+                raise HTTPException(status_code=422, detail="Malformed JSON body") from err
+            # A lone {"payload": {...}} whose object is invalid: report what is wrong inside it, not the
+            # outer model's missing fields
+            if envelope_errors and all(e["loc"][0] == "payload" and len(e["loc"]) > 1 for e in envelope_errors):
+                detail = [{**e, "loc": e["loc"][1:]} for e in envelope_errors]
+                raise HTTPException(status_code=422, detail=detail) from err
+            raise HTTPException(status_code=422, detail=err.errors()) from err
+
+    def encode(self, result: Any) -> bytes:
+        # Match FastAPI's response_model serialization (aliases on) without re-validating
+        return self.output.dump_json(result, by_alias=True)
+
+    def decode_batch(self, raw: bytes) -> list[BaseModel | HTTPException]:
+        """Validate a JSON array of inputs; items that fail validation come back as 422 errors."""
+        stripped = raw.strip()
+        if not stripped or stripped == b"null":
+            raise HTTPException(status_code=422, detail="Request body required")
+        try:
+            return self.inputs.validate_json(stripped)
+        except ValidationError as err:
+            errors = err.errors()
+            if any(e["type"] == "json_invalid" for e in errors):
+                raise HTTPException(status_code=422, detail="Malformed JSON body") from err
+            if any(not e["loc"] for e in errors):
+                raise HTTPException(status_code=422, detail="Batch body must be a JSON array") from err
+        # Only a batch with bad items pays for validating item by item
+        items: list[BaseModel | HTTPException] = []
+        for item in json.loads(stripped):
+            try:
+                items.append(self.input_model.model_validate(item))
+            except ValidationError as err:
+                items.append(
+                    HTTPException(status_code=422, detail=err.errors(include_url=False, include_context=False))
+                )
+        return items
+
+    def encode_batch(self, outcomes: list[Any]) -> tuple[bytes, bool]:
+        """Serialize per-item outcomes as {"results": [...], "errors": [...]}; also says whether any item failed."""
+        results: list[Any] = []
+        errors: list[dict[str, Any]] = []
+        for index, outcome in enumerate(outcomes):
+            if isinstance(outcome, HTTPException):
+                results.append(None)
+                errors.append({"index": index, "status": outcome.status_code, "detail": outcome.detail})
+            else:
+                results.append(outcome)
+        content = b'{"results":' + self.outputs.dump_json(results, by_alias=True)
+        content += b',"errors":' + json.dumps(errors, default=str).encode() + b"}"
+        return content, bool(errors)
+
+
+@dataclass(slots=True)
+class _WorkflowHeaders:
+    name: str | None = None
+    run_id: str | None = None
+    # Call site in the generated workflow, to tell a retried call from another call with the same body
+    call: str | None = None
+    # Map iteration index (dotted when maps nest) of that call site
+    iteration: str | None = None
+    deadline: float | None = None
+    traceparent: str | None = None
+    profile: str | None = None
+    claim_check: bool = False
+    accept_encoding: str | None = None
+    content_encoding: str | None = None
+
+
+def _workflow_headers(request: Request) -> _WorkflowHeaders:
+    # One pass over the raw ASGI headers instead of building a Headers mapping per request
+    found = _WorkflowHeaders()
+    for key, value in request.scope["headers"]:
+        if key == b"x-workflow-run-id":
+            found.run_id = value.decode("latin-1")
+        elif key == b"x-workflow-name":
+            found.name = value.decode("latin-1")
+        elif key == b"x-workflow-call":
+            found.call = value.decode("latin-1")
+        elif key == b"x-workflow-iteration":
+            found.iteration = value.decode("latin-1")
+        elif key == b"x-workflow-deadline":
+            try:
+                found.deadline = float(value)
+            except ValueError:
+                found.deadline = None
+        elif key == b"traceparent":
+            found.traceparent = value.decode("latin-1")
+        elif key == b"x-workflow-profile":
+            found.profile = value.decode("latin-1")
+        elif key == b"x-workflow-claim-check":
+            found.claim_check = value == b"accept"
+        elif key == b"accept-encoding":
+            found.accept_encoding = value.decode("latin-1")
+        elif key == b"content-encoding":
+            found.content_encoding = value.decode("latin-1")
+    return found
+
+
+def _call_id(given: _WorkflowHeaders) -> str | None:
+    if given.call is None or given.iteration is None:
+        return given.call
+    return f"{given.call}#{given.iteration}"
+
+
+def _step_deadline(step: Step[Any, Any], given: float | None) -> float | None:
+    if step.timeout is None:
+        return given
+    own = time.time() + step.timeout.total_seconds()
+    return own if given is None else min(given, own)
+
+
+async def _run_until_deadline(step: Step[Any, Any], ctx: Context, body: BaseModel) -> Any:
+    if ctx.deadline is None:
+        return await step(ctx, body)
+    # Cancel the step once nobody is waiting for it; pool-bound steps are abandoned, not interrupted
+    scope = asyncio.timeout(ctx.deadline - time.time())
+    try:
+        async with scope:
+            return await step(ctx, body)
+    except TimeoutError as err:
+        if not scope.expired():
+            raise
+        raise HTTPException(status_code=504, detail="Step deadline exceeded") from err
+
+
+def _build_step_router(
+    result_cache: ResultCache | None = None,
+    concurrency: ConcurrencyLimit | None = None,
+    metrics: StepMetrics | None = None,
+    tracer: Tracer | None = None,
+    profiler: StepProfiler | None = None,
+    claim_check: ClaimCheck | None = None,
+    compression: Compression | None = None,
+    batch_routes: bool = False,
+    batch_concurrency: int = 16,
+    memo_cache: ResultCache | None = None,
+    dispatch: bool = False,
+    codecs: list[tuple[_StepCodec, bool]] | None = None,
+    journal: Journal | None = None,
+) -> APIRouter:
     router = APIRouter(prefix="/steps")
-    registry = get_registry()
-    for step in registry.steps.values():
-        if step.fn is None:
-            continue
+    global_limiter = ConcurrencyLimiter(concurrency) if concurrency else None
+    step_limiters: dict[str, ConcurrencyLimiter] = {}
+
+    def limiters_for(s: Step[Any, Any]) -> list[ConcurrencyLimiter]:
+        # One limiter per step name: a fused run takes a slot from each member's own limiter, so calling /steps/a
+        # and /steps/a__b together still respects a's limit. Name order keeps two fused runs from deadlocking.
+        members = s.steps if isinstance(s, FusedStep) else [s]
+        found: list[ConcurrencyLimiter] = []
+        for member in sorted(members, key=lambda m: m.name):
+            if member.concurrency is None:
+                continue
+            if member.name not in step_limiters:
+                step_limiters[member.name] = ConcurrencyLimiter(member.concurrency)
+            found.append(step_limiters[member.name])
+        return found
+
+    flights = SingleFlight()
+    batched = _batched_step_names()
+    table: dict[str, Callable[[Request], Awaitable[Response]]] = {}
+    for step in get_registry().served_steps():
+
+        def make_handlers(s: Step[Any, Any]):
+            codec = _StepCodec(s)
+            if codecs is not None:
+                codecs.append((codec, batch_routes or s.name in batched))
+            limiters = limiters_for(s)
+            pure = PURE_TAG in s.tags
+
+            async def read_body(request: Request, given: _WorkflowHeaders, rec: StepRecording) -> bytes:
+                raw = await request.body()
+                rec.request_size = len(raw)
+                if compression is not None and given.content_encoding:
+                    raw = compression.decompress(raw, given.content_encoding)
+                return raw
+
+            def response_headers(ctx: Context) -> dict[str, str]:
+                headers = {"X-Workflow-Run-Id": ctx.workflow.run_id or ""}
+                if ctx.traceparent is not None:
+                    headers["traceparent"] = ctx.traceparent
+                return headers
+
+            def respond(content: bytes, headers: dict[str, str], given: _WorkflowHeaders) -> Response:
+                if compression is not None:
+                    content = compression.encode_response(content, headers, given.accept_encoding)
+                # Returning a Response skips FastAPI's response_model re-validation; the model stays for OpenAPI
+                return Response(content=content, media_type="application/json", headers=headers)
+
+            async def execute(request: Request, ctx: Context, given: _WorkflowHeaders, rec: StepRecording) -> Response:
+                run_id = ctx.workflow.run_id or ""
+                raw = await read_body(request, given, rec)
+                if claim_check is not None:
+                    raw = await claim_check.rehydrate(raw)
+                rec.mark("parse")
+                body = codec.decode(raw)
+                rec.mark("validate")
+                headers = response_headers(ctx)
+
+                # Only a call Workflows names (run id and call site) can come back as a retry; a generated run id
+                # never does, and without a call site a retry looks like any other call with the same body
+                key = None
+                call = _call_id(given)
+                if result_cache is not None and given.run_id is not None and call is not None:
+                    key = result_key(run_id, s.name, call, raw)
+                    cached = await result_cache.get(key)
+                    if cached is not None:
+                        headers["X-Workflow-Cache"] = "hit"
+                        rec.response_size = len(cached)
+                        return respond(cached, headers, given)
+
+                async def produce() -> bytes:
+                    if profiler is not None and profiler.wanted(given.profile):
+                        with profiler.capture(ctx.workflow) as profile_id:
+                            result = await _run_until_deadline(s, ctx, body)
+                        if profile_id is not None:
+                            headers["X-Workflow-Profile-Id"] = profile_id
+                    else:
+                        result = await _run_until_deadline(s, ctx, body)
+                    rec.mark("execute")
+                    content = codec.encode(result)
+                    rec.mark("serialize")
+                    return content
 
-        def make_handler(s: Step[Any, Any]):
-            async def handler(request: Request, response: Response) -> Any:
-                ctx: Context = request.state.context
-                ctx.workflow.step = s.name
-                try:
-                    payload_dict = await request.json()
-                except json.JSONDecodeError as err:
-                    raise HTTPException(status_code=422, detail="Malformed JSON body") from err
-                if payload_dict is None:
-                    raise HTTPException(status_code=422, detail="Request body required")
-                # Accept either raw model or a wrapped {"payload": {...}} for compatibility with clients
-                if (
-                    isinstance(payload_dict, dict)
-                    and "payload" in payload_dict
-                    and isinstance(payload_dict.get("payload"), dict)
-                    and len(payload_dict.keys()) == 1
-                ):
-                    payload_dict = payload_dict["payload"]
                 try:
-                    body = s.input_model.model_validate(payload_dict)
-                except ValidationError as err:
-                    raise HTTPException(status_code=422, detail=err.errors()) from err
-                result = await s.fn(ctx, body)  # type: ignore[call-arg]
-                response.headers["X-Workflow-Run-Id"] = ctx.workflow.run_id or ""
-                return result
+                    if pure:
+                        content = await memoized(body, headers, produce)
+                    else:
+                        content = await produce()
+                except Exception as err:
+                    await record(ctx, body, None, _error_label(err))
+                    raise
+                await record(ctx, body, content, None)
+                if claim_check is not None and given.claim_check:
+                    content = await claim_check.offload(run_id, s.name, content)
+                rec.response_size = len(content)
+                if key is not None and result_cache is not None:
+                    await result_cache.set(key, content)
+                return respond(content, headers, given)
+
+            async def record(ctx: Context, body: BaseModel, content: bytes | None, error: str | None) -> None:
+                if journal is None:
+                    return
+                # The validated input, so a replay feeds the step exactly what it ran on
+                payload = body.model_dump_json(by_alias=True)
+                await journal.record(ctx.workflow.run_id or "", s.name, payload, content, error, ctx.workflow.name)
+
+            async def memoized(
+                body: BaseModel, headers: dict[str, str], produce: Callable[[], Awaitable[bytes]]
+            ) -> bytes:
+                # Pure outputs depend on the input alone: reuse them across runs and share in-progress work
+                mkey = memo_key(s.name, body)
+                if memo_cache is not None:
+                    content = await memo_cache.get(mkey)
+                    if content is not None:
+                        headers["X-Workflow-Cache"] = "memo"
+                        return content
+
+                async def produce_and_store() -> bytes:
+                    content = await produce()
+                    if memo_cache is not None:
+                        await memo_cache.set(mkey, content)
+                    return content
+
+                content, shared = await flights.run(mkey, produce_and_store)
+                if shared:
+                    headers["X-Workflow-Cache"] = "coalesced"
+                return content
+
+            async def execute_batch(
+                request: Request, ctx: Context, given: _WorkflowHeaders, rec: StepRecording
+            ) -> Response:
+                run_id = ctx.workflow.run_id or ""
+                raw = await read_body(request, given, rec)
+                rec.mark("parse")
+                items = codec.decode_batch(raw)
+                rec.mark("validate")
+                headers = response_headers(ctx)
+
+                key = None
+                call = _call_id(given)
+                if result_cache is not None and given.run_id is not None and call is not None:
+                    key = result_key(run_id, f"{s.name}:batch", call, raw)
+                    cached = await result_cache.get(key)
+                    if cached is not None:
+                        headers["X-Workflow-Cache"] = "hit"
+                        rec.response_size = len(cached)
+                        return respond(cached, headers, given)
+                # Never fan out wider than the step's own limits, or the batch would shed its own items
+                gate = asyncio.Semaphore(
+                    min([batch_concurrency, *(limiter.limit.max_in_flight for limiter in limiters)])
+                )
+
+                async def run_item(item: BaseModel | HTTPException) -> Any:
+                    if isinstance(item, HTTPException):
+                        return item
+                    async with gate:
+                        # Each item gets its own context, and its own step timeout from when it starts
+                        item_ctx = Context(
+                            request=request,
+                            workflow=WorkflowMeta(name=ctx.workflow.name, step=s.name, run_id=run_id),
+                            deadline=_step_deadline(s, given.deadline),
+                            traceparent=ctx.traceparent,
+                        )
+                        try:
+                            # Items count against the step's limits like single calls; a shed item fails with 429
+                            async with admit_all(limiters, 429):
+                                return await _run_until_deadline(s, item_ctx, item)
+                        except HTTPException as err:
+                            return err
+                        except Exception as err:
+                            return HTTPException(status_code=500, detail=type(err).__name__)
+
+                outcomes: list[Any] = list(await asyncio.gather(*(run_item(item) for item in items)))
+                rec.mark("execute")
+                content, failed = codec.encode_batch(outcomes)
+                rec.mark("serialize")
+                rec.response_size = len(content)
+                # Failed items may be transient; a retried batch must run them again
+                if key is not None and result_cache is not None and not failed:
+                    await result_cache.set(key, content)
+                return respond(content, headers, given)
+
+            def endpoint(run: Callable[..., Awaitable[Response]], label: str, limited_by: list[ConcurrencyLimiter]):
+                async def handler(request: Request) -> Response:
+                    given = _workflow_headers(request)
+                    run_id = given.run_id or str(uuid.uuid4())
+                    ctx = Context(
+                        request=request,
+                        workflow=WorkflowMeta(name=given.name, step=s.name, run_id=run_id),
+                        deadline=_step_deadline(s, given.deadline),
+                    )
+                    request.state.context = ctx
+                    rec = metrics.start(label) if metrics is not None else NULL_RECORDING
+                    rec.workflow = given.name
+                    span: Span | None = None
+                    if tracer is not None:
+                        attributes = {"workflow.run_id": run_id, "workflow.name": given.name, "workflow.step": s.name}
+                        span = tracer.start(f"step {label}", run_id, given.traceparent, attributes)
+                        ctx.traceparent = span.traceparent
+                    error: str | None = None
+                    try:
+                        # A saturated step answers 429; a saturated instance answers 503
+                        async with admit_all(limited_by, 429), admit(global_limiter, 503):
+                            response = await run(request, ctx, given, rec)
+                    except BaseException as err:
+                        error = _error_label(err)
+                        raise
+                    finally:
+                        if error is None:
+                            rec.finish()
+                        else:
+                            rec.fail(error)
+                        if tracer is not None and span is not None:
+                            tracer.end(span, error)
+                    return response
+
+                return handler
 
-            return handler
+            # A batch request admits its items one by one instead of holding a single step slot
+            return endpoint(execute, s.name, limiters), endpoint(execute_batch, f"{s.name}:batch", [])
 
+        single_endpoint, batch_endpoint = make_handlers(step)
+        with_batch = batch_routes or step.name in batched
+        if dispatch:
+            table[step.name] = single_endpoint
+            if with_batch:
+                table[f"{step.name}:batch"] = batch_endpoint
+            continue
         router.add_api_route(
             f"/{step.name}",
-            endpoint=make_handler(step),
+            endpoint=single_endpoint,
             methods=["POST"],
             response_model=step.output_model,
         )
+        if with_batch:
+            router.add_api_route(
+                f"/{step.name}:batch",
+                endpoint=batch_endpoint,
+                methods=["POST"],
+                response_model=_batch_result_model(step),
+            )
+
+    if dispatch:
+        # One route and a frozen lookup instead of a FastAPI route (and response field) per step
+        handlers = MappingProxyType(dict(table))
+
+        async def dispatch_step(request: Request) -> Response:
+            handler = handlers.get(request.path_params["name"])
+            if handler is None:
+                raise HTTPException(status_code=404, detail="Unknown step")
+            return await handler(request)
+
+        router.add_api_route("/{name}", endpoint=dispatch_step, methods=["POST"], include_in_schema=False)
     return router
 
 
-def attach_to_fastapi(app: FastAPI) -> None:
-    @app.middleware("http")
-    async def inject_context(request: Request, call_next):
-        run_id = request.headers.get("X-Workflow-Run-Id") or str(uuid.uuid4())
-        name = request.headers.get("X-Workflow-Name")
-        ctx = Context(request=request, workflow=WorkflowMeta(name=name, step=None, run_id=run_id))
-        request.state.context = ctx
-        return await call_next(request)
+def _error_label(err: BaseException) -> str:
+    return f"http_{err.status_code}" if isinstance(err, HTTPException) else type(err).__name__
+
+
+def _chain_lifespan(
+    app: FastAPI,
+    startup: Callable[[], Awaitable[None]] | None = None,
+    shutdown: Callable[[], Awaitable[None]] | None = None,
+) -> None:
+    # Wrap whatever lifespan the host app already has instead of replacing it
+    inner = app.router.lifespan_context
+
+    @asynccontextmanager
+    async def lifespan(app_: Any) -> AsyncIterator[Any]:
+        if startup is not None:
+            await startup()
+        try:
+            async with inner(app_) as state:
+                yield state
+        finally:
+            if shutdown is not None:
+                await shutdown()
+
+    app.router.lifespan_context = lifespan
+
+
+def attach_to_fastapi(
+    app: FastAPI,
+    *,
+    idempotency: bool = False,
+    result_cache: ResultCache | None = None,
+    concurrency: ConcurrencyLimit | None = None,
+    max_threads: int | None = None,
+    max_processes: int | None = None,
+    metrics: StepMetrics | bool = False,
+    metrics_path: str = "/metrics",
+    tracer: Tracer | None = None,
+    profiler: StepProfiler | None = None,
+    claim_check: ClaimCheck | None = None,
+    compression: Compression | bool = False,
+    batch_routes: bool = False,
+    batch_concurrency: int = 16,
+    memo_cache: ResultCache | None = None,
+    dispatch: bool = False,
+    step_schema: str | Path | None = None,
+    warmup: bool = False,
+    warmup_path: str = "/warmup",
+    journal: Journal | None = None,
+) -> None:
+    """Expose registered steps under /steps.
+
+    With `idempotency` on, a step call retried by Workflows (same run, same call site in the generated YAML, same
+    map iteration and body) returns the stored output instead of running again; calls without the run id and
+    call-site headers codegen sends always run. `result_cache` defaults to a bounded in-memory LRU.
+    `concurrency` caps in-flight step requests across all steps, on top of each step's own limit.
+    `max_threads`/`max_processes` size the pools that run thread/process steps; they close on shutdown.
+    Resources declared with @resource open at startup and close on shutdown.
+    `metrics` (True or a StepMetrics) records per-step counts, errors, phase latencies and body sizes and serves
+    them in the Prometheus text format on `metrics_path`.
+    `tracer` opens a span per step call; spans of one run share a trace id taken from `traceparent` or derived
+    from the run id.
+    `profiler` profiles step executions on a signed X-Workflow-Profile header or by sampling.
+    `claim_check` stores large outputs bound for another Python step in a blob store and passes a reference.
+    `compression` (True or a Compression) negotiates compressed responses via Accept-Encoding and accepts
+    compressed request bodies.
+    `batch_routes` adds a /steps/<name>:batch route to every step that takes a JSON array of inputs and returns
+    per-item results and errors, running at most `batch_concurrency` items at once. Steps used by
+    `map_each(..., batch_route=True)` get the route regardless.
+    Steps tagged "pure" run once for concurrent identical inputs, and their outputs are memoized across runs in
+    `memo_cache` (a bounded in-memory LRU by default; pass a shared backend to memoize across instances).
+    `dispatch` serves every step through a single /steps/{name} route backed by a prebuilt handler table, which
+    keeps startup cheap with many steps; that route stays out of OpenAPI unless `step_schema` points at the file
+    written by `fastapi-cloudflow schema`, whose paths are then merged into the app's schema.
+    `warmup` moves first-request costs into lifespan startup: it finishes every step's validators and serializers,
+    generates the OpenAPI schema (from the `step_schema` snapshot when given) and starts the step pools, with
+    process workers importing their step modules. `warmup_path` serves the import/startup timings and runs the
+    warmup if lifespan did not, so it doubles as a Cloud Run startup probe.
+    `journal` (e.g. a SqliteJournal) records every step call's validated input and output, or its error, by run
+    id; `fastapi_cloudflow.emulator.resume` replays a journaled run from any step. Meant for local debugging and
+    load tests: every call pays a write.
+    """
+
+    configure_executors(max_threads=max_threads, max_processes=max_processes)
+
+    warm = Warmup() if warmup else None
+    resources = get_resources()
+
+    async def startup() -> None:
+        await resources.open()
+        if warm is not None:
+            await warm.run()
+
+    async def shutdown() -> None:
+        await resources.close()
+        shutdown_executors()
+
+    _chain_lifespan(app, startup=startup, shutdown=shutdown)
+
+    if idempotency and result_cache is None:
+        result_cache = MemoryResultCache()
+    codecs: list[tuple[_StepCodec, bool]] = []
+    step_metrics = StepMetrics() if metrics is True else metrics or None
+    if step_metrics is not None:
+
+        def render_metrics() -> PlainTextResponse:
+            return PlainTextResponse(step_metrics.render(), media_type="text/plain; version=0.0.4")
+
+        app.add_api_route(metrics_path, render_metrics, methods=["GET"], include_in_schema=False)
+
+    app.include_router(
+        _build_step_router(
+            result_cache=result_cache if idempotency else None,
+            concurrency=concurrency,
+            metrics=step_metrics,
+            tracer=tracer,
+            profiler=profiler,
+            claim_check=claim_check,
+            compression=Compression() if compression is True else compression or None,
+            batch_routes=batch_routes,
+            batch_concurrency=batch_concurrency,
+            memo_cache=memo_cache or MemoryResultCache(),
+            dispatch=dispatch,
+            codecs=codecs,
+            journal=journal,
+        )
+    )
+    if step_schema is not None:
+        _merge_step_schema(app, Path(step_schema))
+    if warm is not None:
+        _add_warmup(app, warm, codecs, step_metrics, warmup_path)
+
+
+def _add_warmup(
+    app: FastAPI,
+    warm: Warmup,
+    codecs: list[tuple[_StepCodec, bool]],
+    metrics: StepMetrics | None,
+    path: str,
+) -> None:
+    steps = get_registry().served_steps()
+
+    def build_models() -> None:
+        for codec, batch in codecs:
+            codec.warm(batch)
+
+    def build_openapi() -> None:
+        if app.openapi_url:
+            app.openapi()
+
+    async def start_executors() -> None:
+        modules = {getattr(s.fn, "__module__", "") for s in steps if s.run_in == "process"}
+        await warm_executors(
+            threads=any(s.run_in == "thread" for s in steps), process_modules=sorted(m for m in modules if m)
+        )
+
+    warm.add("models", build_models)
+    warm.add("openapi", build_openapi)
+    warm.add("executors", start_executors)
+    if metrics is not None:
+        warm.on_done = metrics.record_startup
+
+    async def warmup_status() -> JSONResponse:
+        await warm.run()
+        return JSONResponse(warm.report())
+
+    app.add_api_route(path, warmup_status, methods=["GET"], include_in_schema=False)
+
+
+def _merge_step_schema(app: FastAPI, path: Path) -> None:
+    base_openapi = app.openapi
+
+    def openapi() -> dict[str, Any]:
+        # FastAPI caches the generated schema on the app, so the snapshot is read and merged once
+        if app.openapi_schema is None:
+            schema = base_openapi()
+            snapshot = json.loads(path.read_text(encoding="utf-8"))
+            schema.setdefault("paths", {}).update(snapshot.get("paths", {}))
+            components = schema.setdefault("components", {}).setdefault("schemas", {})
+            components.update(snapshot.get("components", {}).get("schemas", {}))
+        return app.openapi_schema or base_openapi()
 
-    app.include_router(_build_step_router())
+    app.openapi = openapi  # type: ignore[method-assign]
 
 
 def build_app() -> FastAPI:
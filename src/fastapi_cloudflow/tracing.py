@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import secrets
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Protocol
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+@dataclass(slots=True)
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+    start_ns: int = 0
+    end_ns: int = 0
+    error: str | None = None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+
+class SpanExporter(Protocol):
+    def export(self, span: Span) -> None: ...
+
+
+class InMemorySpanExporter:
+    def __init__(self) -> None:
+        self.spans: list[Span] = []
+
+    def export(self, span: Span) -> None:
+        self.spans.append(span)
+
+
+class JsonlSpanExporter:
+    """Appends one JSON object per finished span to a local file."""
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(asdict(span), default=str)
+        with self._lock, self.path.open("a", encoding="utf-8") as fh:
+            fh.write(line + "\n")
+
+
+def parse_traceparent(value: str | None) -> tuple[str, str] | None:
+    if not value:
+        return None
+    match = _TRACEPARENT.match(value.strip().lower())
+    if match is None:
+        return None
+    return match.group(1), match.group(2)
+
+
+def trace_id_for_run(run_id: str) -> str:
+    # Every step of a run derives the same trace id, so spans join up even without a traceparent header
+    return hashlib.sha256(run_id.encode()).hexdigest()[:32]
+
+
+class Tracer:
+    """Opens one span per step invocation and hands finished spans to the exporter."""
+
+    def __init__(self, exporter: SpanExporter) -> None:
+        self.exporter = exporter
+
+    def start(self, name: str, run_id: str, traceparent: str | None, attributes: dict[str, Any]) -> Span:
+        parent = parse_traceparent(traceparent)
+        trace_id, parent_id = parent if parent else (trace_id_for_run(run_id), None)
+        return Span(
+            name=name,
+            trace_id=trace_id,
+            span_id=secrets.token_hex(8),
+            parent_id=parent_id,
+            attributes=attributes,
+            start_ns=time.time_ns(),
+        )
+
+    def end(self, span: Span, error: str | None = None) -> None:
+        span.end_ns = time.time_ns()
+        span.error = error
+        self.exporter.export(span)
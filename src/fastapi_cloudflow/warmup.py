@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import asyncio
+import inspect
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+# The package imports this module first, so this marks the start of `import fastapi_cloudflow`
+_IMPORT_STARTED = time.perf_counter()
+_import_seconds: float | None = None
+
+
+def mark_imported() -> None:
+    global _import_seconds
+    if _import_seconds is None:
+        _import_seconds = time.perf_counter() - _IMPORT_STARTED
+
+
+def import_seconds() -> float | None:
+    """Time spent importing fastapi_cloudflow itself (not the app's flows)."""
+    return _import_seconds
+
+
+Phase = Callable[[], Awaitable[None] | None]
+
+
+class Warmup:
+    """Startup work run once before the first step call, each phase timed for the startup report."""
+
+    def __init__(self) -> None:
+        self.phases: list[tuple[str, Phase]] = []
+        self.timings: dict[str, float] = {}
+        self.done = False
+        # Called with each phase's timing (and the import time) once the warmup finished
+        self.on_done: Callable[[str, float], None] | None = None
+        self._lock: asyncio.Lock | None = None
+
+    def add(self, name: str, phase: Phase) -> None:
+        self.phases.append((name, phase))
+
+    async def run(self) -> None:
+        if self.done:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.done:
+                return
+            for name, phase in self.phases:
+                started = time.perf_counter()
+                result = phase()
+                if inspect.isawaitable(result):
+                    await result
+                self.timings[name] = time.perf_counter() - started
+            self.done = True
+        if self.on_done is not None:
+            if _import_seconds is not None:
+                self.on_done("import", _import_seconds)
+            for name, seconds in self.timings.items():
+                self.on_done(name, seconds)
+
+    def report(self) -> dict[str, Any]:
+        return {
+            "warm": self.done,
+            "import_seconds": import_seconds(),
+            "startup_seconds": sum(self.timings.values()),
+            "phases": dict(self.timings),
+        }
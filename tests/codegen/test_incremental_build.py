@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+from fastapi_cloudflow.codegen.workflows import MANIFEST_NAME, build_workflows, render_workflow_yaml
+
+
+def _example_workflows():
+    from flows.order import ORDER_FLOW
+    from flows.payments import PAYMENT_FLOW
+    from flows.user import USER_SIGNUP
+
+    return [ORDER_FLOW, PAYMENT_FLOW, USER_SIGNUP]
+
+
+def test_build_writes_only_changed_files_and_manifest(tmp_path: Path) -> None:
+    workflows = _example_workflows()
+    first = build_workflows(workflows, tmp_path)
+    assert sorted(p.name for p in first.written) == sorted(f"{wf.name}.yaml" for wf in workflows)
+
+    manifest = json.loads((tmp_path / MANIFEST_NAME).read_text())
+    assert set(manifest) == {wf.name for wf in workflows}
+    assert all(len(h) == 64 for h in manifest.values())
+
+    order_path = tmp_path / "order-flow.yaml"
+    mtime = order_path.stat().st_mtime_ns
+    second = build_workflows(workflows, tmp_path)
+    assert second.written == []
+    assert len(second.unchanged) == len(workflows)
+    assert order_path.stat().st_mtime_ns == mtime
+
+
+def test_filtered_build_keeps_other_manifest_entries(tmp_path: Path) -> None:
+    workflows = _example_workflows()
+    build_workflows(workflows, tmp_path)
+    full = json.loads((tmp_path / MANIFEST_NAME).read_text())
+
+    (tmp_path / "order-flow.yaml").write_text("stale\n")
+    (tmp_path / MANIFEST_NAME).write_text(json.dumps({**full, "order-flow": "0" * 64}))
+    partial = build_workflows(workflows[:1], tmp_path, partial=True)
+    assert [p.name for p in partial.written] == ["order-flow.yaml"]
+    assert json.loads((tmp_path / MANIFEST_NAME).read_text()) == full
+
+
+def test_check_reports_drift_without_writing(tmp_path: Path) -> None:
+    workflows = _example_workflows()
+    build_workflows(workflows, tmp_path)
+    assert build_workflows(workflows, tmp_path, check=True).drifted == []
+
+    payment_path = tmp_path / "payment-flow.yaml"
+    payment_path.write_text("stale\n")
+    (tmp_path / "order-flow.yaml").unlink()
+    drifted = build_workflows(workflows, tmp_path, check=True).drifted
+    assert sorted(p.name for p in drifted) == ["order-flow.yaml", "payment-flow.yaml"]
+    assert payment_path.read_text() == "stale\n"
+    assert not (tmp_path / "order-flow.yaml").exists()
+
+
+def test_check_reports_orphans_and_a_stale_manifest(tmp_path: Path) -> None:
+    workflows = _example_workflows()
+    build_workflows(workflows, tmp_path)
+    (tmp_path / "retired-flow.yaml").write_text("main: {}\n")
+    drifted = build_workflows(workflows, tmp_path, check=True).drifted
+    assert [p.name for p in drifted] == ["retired-flow.yaml"]
+    # A filtered check only speaks for the workflows it renders
+    assert build_workflows(workflows[:1], tmp_path, check=True, partial=True).drifted == []
+
+    (tmp_path / "retired-flow.yaml").unlink()
+    (tmp_path / MANIFEST_NAME).write_text("{}\n")
+    drifted = build_workflows(workflows, tmp_path, check=True).drifted
+    assert [p.name for p in drifted] == [MANIFEST_NAME]
+
+
+def test_render_matches_committed_snapshot() -> None:
+    wf = _example_workflows()[0]
+    expected = Path("tests/codegen/fixtures/yaml/order-flow.yaml").read_text(encoding="utf-8")
+    assert render_workflow_yaml(wf) == expected
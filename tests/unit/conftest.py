@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from collections.abc import Callable
+from typing import Any
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from fastapi_cloudflow import attach_to_fastapi
+
+
+@pytest.fixture
+def step_app() -> Callable[..., FastAPI]:
+    """Build a fresh app serving every registered step; keyword arguments go to `attach_to_fastapi`."""
+
+    def make(**kwargs: Any) -> FastAPI:
+        app = FastAPI()
+        attach_to_fastapi(app, **kwargs)
+        return app
+
+    return make
+
+
+@pytest.fixture
+def step_client(step_app: Callable[..., FastAPI]) -> Callable[..., TestClient]:
+    """Like `step_app`, wrapped in a TestClient."""
+
+    def make(raise_server_exceptions: bool = True, **kwargs: Any) -> TestClient:
+        return TestClient(step_app(**kwargs), raise_server_exceptions=raise_server_exceptions)
+
+    return make
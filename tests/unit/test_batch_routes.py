@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections.abc import Callable
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from fastapi_cloudflow import ConcurrencyLimit, Context, HttpStep, map_each, step, workflow
+from fastapi_cloudflow.codegen.workflows import workflow_to_yaml_dict
+
+
+class Reading(BaseModel):
+    sensor: str
+    value: float
+
+
+class Scaled(BaseModel):
+    sensor: str
+    value: float
+
+
+class Readings(BaseModel):
+    readings: list[Reading]
+
+
+class ScaledReadings(BaseModel):
+    scaled: list[Scaled]
+
+
+ACTIVE = {"now": 0, "peak": 0}
+LIMITED = {"now": 0, "peak": 0}
+
+
+@step(name="batch-scale")
+async def batch_scale(ctx: Context, data: Reading) -> Scaled:
+    if data.sensor == "broken":
+        raise HTTPException(status_code=409, detail="sensor offline")
+    ACTIVE["now"] += 1
+    ACTIVE["peak"] = max(ACTIVE["peak"], ACTIVE["now"])
+    await asyncio.sleep(0.01)
+    ACTIVE["now"] -= 1
+    return Scaled(sensor=data.sensor, value=data.value * 10)
+
+
+@step(name="batch-clamp")
+async def batch_clamp(ctx: Context, data: Scaled) -> Scaled:
+    return Scaled(sensor=data.sensor, value=min(data.value, 100))
+
+
+@step(name="batch-timed", timeout=timedelta(seconds=0.2))
+async def batch_timed(ctx: Context, data: Reading) -> Reading:
+    await asyncio.sleep(0.08)
+    return data
+
+
+@step(name="batch-limited", concurrency=ConcurrencyLimit(max_in_flight=2))
+async def batch_limited(ctx: Context, data: Reading) -> Reading:
+    LIMITED["now"] += 1
+    LIMITED["peak"] = max(LIMITED["peak"], LIMITED["now"])
+    await asyncio.sleep(0.01)
+    LIMITED["now"] -= 1
+    return data
+
+
+@step(name="batch-unused")
+async def batch_unused(ctx: Context, data: Reading) -> Reading:
+    return data
+
+
+SCALE_ALL = map_each(Readings, "readings", [batch_scale, batch_clamp], output=ScaledReadings, batch_route=True)
+BATCH_FLOW = (workflow("batch-map-flow") >> SCALE_ALL).build()
+TIME_ALL = map_each(Readings, "readings", batch_timed, output=Readings, batch_route=True)
+TIMED_FLOW = (workflow("batch-timed-flow") >> TIME_ALL).build()
+
+
+def test_batch_route_returns_per_item_results_and_errors(step_client: Callable[..., TestClient]) -> None:
+    c = step_client()
+    items = [
+        {"sensor": "a", "value": 1},
+        {"sensor": "b"},
+        {"sensor": "broken", "value": 2},
+        {"sensor": "c", "value": 3},
+    ]
+    r = c.post("/steps/batch-scale:batch", headers={"X-Workflow-Name": "unit"}, json=items)
+    assert r.status_code == 200
+    body = r.json()
+    assert body["results"] == [{"sensor": "a", "value": 10.0}, None, None, {"sensor": "c", "value": 30.0}]
+    assert [(e["index"], e["status"]) for e in body["errors"]] == [(1, 422), (2, 409)]
+    assert body["errors"][1]["detail"] == "sensor offline"
+
+
+def test_batch_route_bounds_concurrency(step_client: Callable[..., TestClient]) -> None:
+    c = step_client(batch_concurrency=3)
+    ACTIVE["peak"] = 0
+    items = [{"sensor": f"s{i}", "value": i} for i in range(12)]
+    r = c.post("/steps/batch-scale:batch", json=items)
+    assert r.status_code == 200
+    assert len(r.json()["results"]) == 12
+    assert ACTIVE["peak"] == 3
+
+
+def test_batch_items_each_get_the_step_timeout(step_client: Callable[..., TestClient]) -> None:
+    # Run one at a time, five items take twice the step's timeout; each item still fits in its own
+    c = step_client(batch_routes=True, batch_concurrency=1)
+    items = [{"sensor": f"s{i}", "value": i} for i in range(5)]
+    r = c.post("/steps/batch-timed:batch", json=items)
+    assert r.json() == {"results": items, "errors": []}
+    # The workflow-wide deadline still applies to every item
+    deadline = str(time.time() + 0.1)
+    r = c.post("/steps/batch-timed:batch", headers={"X-Workflow-Deadline": deadline}, json=items)
+    errors = r.json()["errors"]
+    assert len(errors) >= 4 and {e["status"] for e in errors} == {504}
+    # The call waits for all the waves, not one item's timeout
+    args = workflow_to_yaml_dict(TIMED_FLOW)["main"]["steps"][1]["call_batch-timed_batch"]["args"]
+    assert "timeout" not in args
+
+
+def test_batch_items_go_through_the_step_limiter(step_client: Callable[..., TestClient]) -> None:
+    c = step_client(batch_routes=True, batch_concurrency=8)
+    items = [{"sensor": f"s{i}", "value": i} for i in range(6)]
+    r = c.post("/steps/batch-limited:batch", json=items)
+    assert r.json() == {"results": items, "errors": []}
+    assert LIMITED["peak"] == 2
+
+
+def test_batch_route_rejects_non_array_bodies(step_client: Callable[..., TestClient]) -> None:
+    c = step_client()
+    assert c.post("/steps/batch-scale:batch", json={"sensor": "a", "value": 1}).status_code == 422
+    r = c.post("/steps/batch-scale:batch", headers={"Content-Type": "application/json"}, content=b"[{oops")
+    assert r.status_code == 422
+    assert "Malformed JSON" in r.text
+
+
+def test_batch_routes_only_for_batched_map_steps_unless_enabled(step_client: Callable[..., TestClient]) -> None:
+    assert step_client().post("/steps/batch-unused:batch", json=[]).status_code == 404
+    r = step_client(batch_routes=True).post("/steps/batch-unused:batch", json=[{"sensor": "x", "value": 1}])
+    assert r.json() == {"results": [{"sensor": "x", "value": 1.0}], "errors": []}
+
+
+def test_batch_map_codegen_calls_batch_routes_in_sequence() -> None:
+    steps = workflow_to_yaml_dict(BATCH_FLOW)["main"]["steps"]
+    names = [next(iter(s)) for s in steps]
+    assert names == [
+        "init_run",
+        "call_batch-scale_batch",
+        "check_0_batch_0",
+        "call_batch-clamp_batch",
+        "check_0_batch_1",
+        "set_payload_0",
+        "return_final",
+    ]
+    first = steps[1]["call_batch-scale_batch"]["args"]
+    assert first["url"].endswith('"/steps/batch-scale:batch"}')
+    assert first["body"] == "${payload.readings}"
+    assert steps[2]["check_0_batch_0"] == {
+        "switch": [{"condition": "${len(res_0_batch_0.body.errors) > 0}", "raise": "${res_0_batch_0.body.errors}"}]
+    }
+    assert steps[3]["call_batch-clamp_batch"]["args"]["body"] == "${res_0_batch_0.body.results}"
+    assert steps[5]["set_payload_0"] == {"assign": [{"payload": {"scaled": "${res_0_batch_1.body.results}"}}]}
+
+
+def test_batch_route_map_needs_python_steps_and_leaves_step_batch_alone() -> None:
+    # `batch` on any step, a map included, is its MicroBatch setting
+    assert SCALE_ALL.batch_route and SCALE_ALL.batch is None
+    echo = HttpStep("batch-echo", Reading, Reading, method="POST", url="https://echo.test")
+    with pytest.raises(ValueError, match="batch_route=True needs a body of Python steps only"):
+        map_each(Readings, "readings", echo, output=Readings, batch_route=True)
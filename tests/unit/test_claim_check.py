@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from flows.payments import PAYMENT_FLOW
+from pydantic import BaseModel
+
+from fastapi_cloudflow import Context, step, workflow
+from fastapi_cloudflow.claimcheck import ClaimCheck, LocalBlobStore
+from fastapi_cloudflow.codegen.workflows import workflow_to_yaml_dict
+
+
+class DocIn(BaseModel):
+    size: int
+
+
+class Doc(BaseModel):
+    text: str
+
+
+class DocStats(BaseModel):
+    length: int
+
+
+@step(name="claim-make-doc")
+async def claim_make_doc(ctx: Context, data: DocIn) -> Doc:
+    return Doc(text="x" * data.size)
+
+
+@step(name="claim-measure")
+async def claim_measure(ctx: Context, data: Doc) -> DocStats:
+    return DocStats(length=len(data.text))
+
+
+CLAIM_FLOW = (workflow("claim-flow") >> claim_make_doc >> claim_measure).build()
+
+
+@pytest.fixture
+def client(step_client: Callable[..., TestClient], tmp_path: Path) -> TestClient:
+    return step_client(claim_check=ClaimCheck(LocalBlobStore(tmp_path), threshold_bytes=100))
+
+
+def test_large_output_is_offloaded_and_rehydrated(client: TestClient) -> None:
+    headers = {"X-Workflow-Run-Id": "run-1", "X-Workflow-Claim-Check": "accept"}
+    ref = client.post("/steps/claim-make-doc", headers=headers, json={"size": 500})
+    assert ref.status_code == 200
+    assert ref.json()["$claim"].startswith("run-1/claim-make-doc/")
+    assert ref.json()["size"] > 500
+    # The reference is posted as-is to the next Python step
+    stats = client.post("/steps/claim-measure", headers={"X-Workflow-Run-Id": "run-1"}, content=ref.content)
+    assert stats.json() == {"length": 500}
+
+
+def test_small_or_unaccepted_outputs_stay_inline(client: TestClient) -> None:
+    small = client.post("/steps/claim-make-doc", headers={"X-Workflow-Claim-Check": "accept"}, json={"size": 5})
+    assert small.json() == {"text": "xxxxx"}
+    big = client.post("/steps/claim-make-doc", json={"size": 500})
+    assert big.json() == {"text": "x" * 500}
+
+
+def test_missing_blob_returns_422(client: TestClient) -> None:
+    r = client.post("/steps/claim-measure", json={"$claim": "run-1/nope.json"})
+    assert r.status_code == 422
+    assert "not found" in r.text
+
+
+def test_local_store_rejects_keys_outside_root(tmp_path: Path) -> None:
+    store = LocalBlobStore(tmp_path / "blobs")
+    with pytest.raises(ValueError, match="Invalid blob key"):
+        asyncio.run(store.put("../escape.json", b"{}"))
+
+
+def test_codegen_only_accepts_references_before_python_steps() -> None:
+    steps = workflow_to_yaml_dict(CLAIM_FLOW)["main"]["steps"]
+    first = steps[1]["call_claim-make-doc"]["args"]["headers"]
+    last = steps[3]["call_claim-measure"]["args"]["headers"]
+    assert first["X-Workflow-Claim-Check"] == "accept"
+    assert "X-Workflow-Claim-Check" not in last
+    # validate-cart feeds an AssignStep, which reads fields of the real payload
+    payment = workflow_to_yaml_dict(PAYMENT_FLOW)["main"]["steps"][1]["call_validate-cart"]["args"]["headers"]
+    assert "X-Workflow-Claim-Check" not in payment
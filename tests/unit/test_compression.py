@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import gzip
+import json
+import tracemalloc
+from collections.abc import Callable
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from flows.order import ORDER_FLOW
+from pydantic import BaseModel
+
+from fastapi_cloudflow import Context, step
+from fastapi_cloudflow.codegen.workflows import workflow_to_yaml_dict
+from fastapi_cloudflow.compression import Compression
+
+
+class BlobIn(BaseModel):
+    size: int
+
+
+class BlobOut(BaseModel):
+    data: str
+
+
+@step(name="compress-blob")
+async def compress_blob(ctx: Context, data: BlobIn) -> BlobOut:
+    return BlobOut(data="a" * data.size)
+
+
+def test_large_response_is_gzipped_when_accepted(step_client: Callable[..., TestClient]) -> None:
+    c = step_client(compression=Compression(threshold_bytes=100, encodings=("gzip",)))
+    r = c.post("/steps/compress-blob", headers={"Accept-Encoding": "gzip"}, json={"size": 5000})
+    assert r.headers["Content-Encoding"] == "gzip"
+    assert int(r.headers["Content-Length"]) < 5000
+    assert r.json() == {"data": "a" * 5000}  # httpx transparently decodes
+
+
+def test_small_or_unaccepted_responses_stay_plain(step_client: Callable[..., TestClient]) -> None:
+    c = step_client(compression=Compression(threshold_bytes=100, encodings=("gzip",)))
+    small = c.post("/steps/compress-blob", headers={"Accept-Encoding": "gzip"}, json={"size": 10})
+    assert "Content-Encoding" not in small.headers
+    refused = c.post("/steps/compress-blob", headers={"Accept-Encoding": "gzip;q=0, identity"}, json={"size": 5000})
+    assert "Content-Encoding" not in refused.headers
+    assert refused.headers["Vary"] == "Accept-Encoding"
+
+
+def test_compressed_request_body_is_decoded(step_client: Callable[..., TestClient]) -> None:
+    c = step_client(compression=True)
+    body = gzip.compress(json.dumps({"size": 3}).encode())
+    r = c.post("/steps/compress-blob", headers={"Content-Encoding": "gzip"}, content=body)
+    assert r.status_code == 200
+    assert r.json() == {"data": "aaa"}
+
+    unsupported = c.post("/steps/compress-blob", headers={"Content-Encoding": "lzma"}, content=body)
+    assert unsupported.status_code == 415
+    broken = c.post("/steps/compress-blob", headers={"Content-Encoding": "gzip"}, content=b"not gzip")
+    assert broken.status_code == 400
+
+
+def test_decompressed_size_is_capped(step_client: Callable[..., TestClient]) -> None:
+    c = step_client(compression=Compression(max_decompressed_bytes=1000))
+    body = gzip.compress(json.dumps({"size": 3, "pad": "x" * 5000}).encode())
+    r = c.post("/steps/compress-blob", headers={"Content-Encoding": "gzip"}, content=body)
+    assert r.status_code == 413
+
+
+@pytest.mark.parametrize("encoding, module", [("br", "brotli"), ("zstd", "zstandard")])
+def test_decompression_bombs_stop_at_the_cap(encoding: str, module: str) -> None:
+    pytest.importorskip(module)
+    compression = Compression(max_decompressed_bytes=1024 * 1024)
+    # ~100 MiB of zeros packs into a few kilobytes
+    bomb = compression.compress(b"0" * (100 * 1024 * 1024), encoding)
+    tracemalloc.start()
+    try:
+        with pytest.raises(HTTPException, match="413: Decompressed body too large"):
+            compression.decompress(bomb, encoding)
+        # Stopped near the 1 MiB cap instead of inflating the whole body first
+        assert tracemalloc.get_traced_memory()[1] < 16 * 1024 * 1024
+    finally:
+        tracemalloc.stop()
+
+    body = json.dumps({"size": 3}).encode()
+    assert compression.decompress(compression.compress(body, encoding), encoding) == body
+    with pytest.raises(HTTPException, match=f"400: Malformed {encoding} body"):
+        compression.decompress(b"not compressed", encoding)
+
+
+def test_negotiation_prefers_server_order() -> None:
+    compression = Compression(encodings=("br", "gzip"))
+    assert compression.negotiate("gzip, br") == "br"
+    assert compression.negotiate("gzip") == "gzip"
+    assert compression.negotiate("*") == "br"
+    assert compression.negotiate("deflate") is None
+    assert compression.negotiate(None) is None
+
+
+def test_codegen_requests_gzip_when_enabled() -> None:
+    args = workflow_to_yaml_dict(ORDER_FLOW, compression=True)["main"]["steps"][1]["call_price-order"]["args"]
+    assert args["headers"]["Accept-Encoding"] == "gzip"
+    plain = workflow_to_yaml_dict(ORDER_FLOW)["main"]["steps"][1]["call_price-order"]["args"]
+    assert "Accept-Encoding" not in plain["headers"]
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+
+import httpx
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+from fastapi_cloudflow import ConcurrencyLimit, Context, step, workflow
+from fastapi_cloudflow.codegen.workflows import render_workflow_yaml, workflow_to_yaml_dict
+from fastapi_cloudflow.emulator import Emulator, Execution
+from fastapi_cloudflow.limits import ConcurrencyLimiter
+
+GATE: dict[str, asyncio.Event] = {}
+
+
+class SlowIn(BaseModel):
+    n: int
+
+
+class SlowOut(BaseModel):
+    n: int
+
+
+@step(name="limited-slow", concurrency=ConcurrencyLimit(max_in_flight=1, retry_after_s=2))
+async def limited_slow(ctx: Context, data: SlowIn) -> SlowOut:
+    await GATE["open"].wait()
+    return SlowOut(n=data.n)
+
+
+@step(name="unlimited-slow")
+async def unlimited_slow(ctx: Context, data: SlowIn) -> SlowOut:
+    await GATE["open"].wait()
+    return SlowOut(n=data.n)
+
+
+@step(name="limited-tail")
+async def limited_tail(ctx: Context, data: SlowOut) -> SlowOut:
+    return data
+
+
+LIMITED_FLOW = (workflow("limited-flow") >> limited_slow).build()
+LIMITED_FUSED = (workflow("limited-fused", fuse=True) >> limited_slow >> limited_tail).build()
+UNLIMITED_FLOW = (workflow("unlimited-flow") >> unlimited_slow).build()
+
+
+async def _burst(app: FastAPI, count: int, path: str = "/steps/limited-slow", *more: str) -> list[httpx.Response]:
+    GATE["open"] = asyncio.Event()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        paths = [path] * count + list(more)
+        calls = [asyncio.create_task(client.post(p, json={"n": i})) for i, p in enumerate(paths)]
+        await asyncio.sleep(0.05)
+        GATE["open"].set()
+        return list(await asyncio.gather(*calls))
+
+
+def test_step_limit_sheds_with_429_and_retry_after(step_app: Callable[..., FastAPI]) -> None:
+    app = step_app()
+    responses = asyncio.run(_burst(app, 2))
+    codes = sorted(r.status_code for r in responses)
+    assert codes == [200, 429]
+    shed = next(r for r in responses if r.status_code == 429)
+    assert shed.headers["Retry-After"] == "2"
+
+
+def test_fused_run_shares_its_members_limiters(step_app: Callable[..., FastAPI]) -> None:
+    app = step_app()
+    responses = asyncio.run(_burst(app, 1, "/steps/limited-slow", "/steps/limited-slow__limited-tail"))
+    assert sorted(r.status_code for r in responses) == [200, 429]
+
+
+def test_global_limit_sheds_with_503(step_app: Callable[..., FastAPI]) -> None:
+    app = step_app(concurrency=ConcurrencyLimit(max_in_flight=1, max_queued=1))
+    responses = asyncio.run(_burst(app, 3, "/steps/unlimited-slow"))
+    assert sorted(r.status_code for r in responses) == [200, 200, 503]
+
+
+def test_limiter_queue_hands_over_and_times_out() -> None:
+    async def scenario() -> None:
+        limiter = ConcurrencyLimiter(ConcurrencyLimit(max_in_flight=1, max_queued=1, max_wait_s=0.05))
+        assert await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.queued == 1
+        assert not await limiter.acquire()  # queue full
+        limiter.release()
+        assert await waiter
+        assert limiter.in_flight == 1
+        assert not await limiter.acquire()  # waits max_wait_s then gives up
+        assert limiter.queued == 0
+        limiter.release()
+        assert limiter.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_limited_step_codegen_retries_from_retry_after() -> None:
+    call = workflow_to_yaml_dict(LIMITED_FLOW)["main"]["steps"][1]["call_limited-slow"]
+    assert call["try"]["call"] == "http.post"
+    assert call["retry"]["predicate"] == "${http.default_retry_predicate}"
+    assert call["retry"]["backoff"]["initial_delay"] == 2
+
+
+def _emulate_pair(app: FastAPI, source: str) -> list[Execution]:
+    async def release(seconds: float) -> None:
+        # Backing off lets the call holding the only slot finish
+        GATE["open"].set()
+        await asyncio.sleep(0.01)
+
+    async def scenario() -> list[Execution]:
+        GATE["open"] = asyncio.Event()
+        async with Emulator(app, sleep=release) as emulator:
+            first = asyncio.create_task(emulator.execute(source, {"n": 1}))
+            await asyncio.sleep(0.05)
+            shed = await emulator.execute(source, {"n": 2})
+            GATE["open"].set()
+            return [await first, shed]
+
+    return asyncio.run(scenario())
+
+
+def test_globally_shed_call_is_retried_when_built_for_the_app_limit(step_app: Callable[..., FastAPI]) -> None:
+    limit = ConcurrencyLimit(max_in_flight=1, retry_after_s=3)
+    app = step_app(concurrency=limit)
+    call = workflow_to_yaml_dict(UNLIMITED_FLOW, shed_retry_after=limit.retry_after_s)["main"]["steps"][1]
+    assert call["call_unlimited-slow"]["retry"]["backoff"]["initial_delay"] == 3
+
+    plain = _emulate_pair(app, render_workflow_yaml(UNLIMITED_FLOW))
+    assert plain[0].succeeded and not plain[1].succeeded
+    first, shed = _emulate_pair(app, render_workflow_yaml(UNLIMITED_FLOW, shed_retry_after=limit.retry_after_s))
+    assert first.result == {"n": 1} and shed.result == {"n": 2}
+    assert len(shed.calls) > 1
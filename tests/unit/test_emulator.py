@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import asyncio
+import sys
+from collections.abc import Callable
+from typing import Any
+
+import pytest
+import typer
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+from fastapi_cloudflow import ConcurrencyLimit, Context, map_each, parallel, step, workflow
+from fastapi_cloudflow.cli import _import_emulator
+from fastapi_cloudflow.codegen.workflows import render_workflow_yaml
+from fastapi_cloudflow.emulator import Emulator, EmulatorError, Execution, LatencySummary, run_load
+from fastapi_cloudflow.emulator.engine import Frame, _Run
+from fastapi_cloudflow.emulator.expressions import compile_expression
+
+
+class Num(BaseModel):
+    n: int
+
+
+class Nums(BaseModel):
+    values: list[Num]
+
+
+class Pair(BaseModel):
+    double: Num
+    square: Num
+
+
+@step(name="emu-inc")
+async def emu_inc(ctx: Context, data: Num) -> Num:
+    return Num(n=data.n + 1)
+
+
+@step(name="emu-double")
+async def emu_double(ctx: Context, data: Num) -> Num:
+    return Num(n=data.n * 2)
+
+
+@step(name="emu-square")
+async def emu_square(ctx: Context, data: Num) -> Num:
+    return Num(n=data.n * data.n)
+
+
+@step(name="emu-fail-odd")
+async def emu_fail_odd(ctx: Context, data: Num) -> Num:
+    if data.n % 2:
+        raise ValueError("odd")
+    return data
+
+
+@step(name="emu-nums")
+async def emu_nums(ctx: Context, data: Nums) -> Nums:
+    return data
+
+
+@step(name="emu-shed", concurrency=ConcurrencyLimit(max_in_flight=1, retry_after_s=1))
+async def emu_shed(ctx: Context, data: Num) -> Num:
+    await asyncio.sleep(0.05)
+    return data
+
+
+SEQ_FLOW = (workflow("emu-seq") >> emu_inc >> emu_double).build()
+PAR_FLOW = (workflow("emu-par") >> emu_inc >> parallel(Pair, double=emu_double, square=emu_square)).build()
+MAP_FLOW = (workflow("emu-map") >> emu_nums >> map_each(Nums, "values", [emu_inc, emu_double], output=Nums)).build()
+BATCH_FLOW = (
+    workflow("emu-batch-map") >> emu_nums >> map_each(Nums, "values", emu_fail_odd, output=Nums, batch_route=True)
+).build()
+SHED_FLOW = (workflow("emu-shed") >> emu_shed).build()
+
+
+SLEEPS: list[float] = []
+
+
+async def _fast_sleep(seconds: float) -> None:
+    # Backoff at 1/50th of the real delay, so a shed call still waits for the slot to free up
+    SLEEPS.append(seconds)
+    await asyncio.sleep(seconds / 50)
+
+
+def _execute(app: FastAPI, flow: Any, argument: Any, **kwargs: Any) -> Execution:
+    async def scenario() -> Execution:
+        async with Emulator(app, sleep=_fast_sleep) as emulator:
+            return await emulator.execute(render_workflow_yaml(flow, **kwargs), argument, workflow_id=flow.name)
+
+    return asyncio.run(scenario())
+
+
+def _eval(expr: str, **variables: Any) -> Any:
+    frame = Frame(_Run(env={"NAME": "emu"}))
+    frame.vars.update(variables)
+    return compile_expression(expr)(frame)
+
+
+def test_expressions_cover_the_generated_subset() -> None:
+    assert _eval('sys.get_env("NAME") + "/steps/x"') == "emu/steps/x"
+    assert _eval("string(2 + 3 * 4)") == "14"
+    assert _eval('res.headers["X-Id"]', res={"headers": {"X-Id": "r1"}}) == "r1"
+    assert _eval("m[string(i)]", m={"0": "a", "1": "b"}, i=1) == "b"
+    assert _eval("list.concat(xs, 3)", xs=[1, 2]) == [1, 2, 3]
+    assert _eval("len(r.body.errors) > 0", r={"body": {"errors": []}}) is False
+    assert _eval('text.replace_all("a-b-c", "-", "")') == "abc"
+    assert _eval("[0, len(xs) - 1]", xs=[1, 2, 3]) == [0, 2]
+    assert _eval('not (1 == 2) and "k" in {"k": null}') is True
+
+
+def test_sequential_flow_runs_against_the_app(step_app: Callable[..., FastAPI]) -> None:
+    execution = _execute(step_app(), SEQ_FLOW, {"n": 4}, trace=True)
+    assert execution.succeeded
+    assert execution.result == {"n": 10}
+    assert [name for name, _ in execution.calls] == ["call_emu-inc", "call_emu-double"]
+
+
+def test_parallel_branches_fill_the_join(step_app: Callable[..., FastAPI]) -> None:
+    assert _execute(step_app(), PAR_FLOW, {"n": 2}).result == {"double": {"n": 6}, "square": {"n": 9}}
+
+
+def test_map_keeps_item_order(step_app: Callable[..., FastAPI]) -> None:
+    execution = _execute(step_app(), MAP_FLOW, {"values": [{"n": n} for n in range(5)]})
+    assert execution.result == {"values": [{"n": (n + 1) * 2} for n in range(5)]}
+    assert len([name for name, _ in execution.calls if name == "call_emu-double"]) == 5
+
+
+def test_batch_map_raises_item_errors(step_app: Callable[..., FastAPI]) -> None:
+    assert _execute(step_app(), BATCH_FLOW, {"values": [{"n": 2}, {"n": 4}]}).result == {"values": [{"n": 2}, {"n": 4}]}
+    failed = _execute(step_app(), BATCH_FLOW, {"values": [{"n": 2}, {"n": 3}]})
+    assert not failed.succeeded
+    assert [e["index"] for e in failed.error] == [1]
+
+
+def test_http_errors_fail_the_execution(step_app: Callable[..., FastAPI]) -> None:
+    execution = _execute(step_app(), SEQ_FLOW, {"wrong": 1})
+    assert execution.error["code"] == 422
+    assert execution.error["tags"] == ["HttpError"]
+
+
+def test_shed_calls_are_retried_with_backoff(step_app: Callable[..., FastAPI]) -> None:
+    async def scenario() -> list[Execution]:
+        async with Emulator(step_app(), sleep=_fast_sleep) as emulator:
+            source = render_workflow_yaml(SHED_FLOW)
+            return list(await asyncio.gather(*(emulator.execute(source, {"n": n}) for n in range(3))))
+
+    SLEEPS.clear()
+    executions = asyncio.run(scenario())
+    assert all(e.succeeded for e in executions)
+    # Retries start from the step's Retry-After
+    assert SLEEPS and SLEEPS[0] == 1
+
+
+def test_unsupported_syntax_is_reported() -> None:
+    async def scenario() -> None:
+        async with Emulator() as emulator:
+            await emulator.execute({"main": {"steps": [{"jump": {"next": "end"}}]}})
+
+    with pytest.raises(EmulatorError, match="`next` jumps are not supported"):
+        asyncio.run(scenario())
+
+
+def test_load_mode_reports_percentiles_and_throughput(step_app: Callable[..., FastAPI]) -> None:
+    async def scenario():
+        async with Emulator(step_app()) as emulator:
+            return await run_load(
+                emulator, render_workflow_yaml(SEQ_FLOW), lambda i: {"n": i}, executions=20, concurrency=5
+            )
+
+    report = asyncio.run(scenario())
+    assert report.executions == 20 and report.failures == 0
+    assert report.end_to_end.count == 20
+    assert set(report.steps) == {"call_emu-inc", "call_emu-double"}
+    assert report.throughput > 0
+    assert "end-to-end" in report.render()
+
+
+def test_latency_summary_uses_nearest_rank() -> None:
+    summary = LatencySummary.of([float(v) for v in range(1, 101)])
+    assert (summary.p50, summary.p95, summary.p99, summary.max) == (50.0, 95.0, 99.0, 100.0)
+
+
+def test_cli_explains_the_missing_extra(monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]) -> None:
+    monkeypatch.setitem(sys.modules, "httpx", None)
+    for name in [m for m in sys.modules if m.startswith("fastapi_cloudflow.emulator")]:
+        monkeypatch.delitem(sys.modules, name)
+    with pytest.raises(typer.Exit):
+        _import_emulator()
+    assert "fastapi-cloudflow[emulator]" in capsys.readouterr().err
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+from fastapi_cloudflow.cli import _load_flows, schema
+from fastapi_cloudflow.discovery import ModuleIndex, modules_for, scan_flows, scan_source
+
+FLOW_A = b"""
+from pydantic import BaseModel
+from fastapi_cloudflow import Context, step, workflow
+
+
+class DiscIn(BaseModel):
+    n: int
+
+
+@step(name="disc-double")
+async def disc_double(ctx: Context, data: DiscIn) -> DiscIn:
+    return DiscIn(n=data.n * 2)
+
+
+@step()
+def disc_plain_name(ctx: Context, data: DiscIn) -> DiscIn:
+    return data
+
+
+DISC_FLOW = (workflow("disc-a") >> disc_double >> disc_plain_name).build()
+"""
+
+# Steps without a workflow: still served, so the step schema needs them
+FLOW_STEPS = b"""
+from pydantic import BaseModel
+from fastapi_cloudflow import Context, step
+
+
+class LoneIn(BaseModel):
+    n: int
+
+
+@step(name="disc-lone")
+async def disc_lone(ctx: Context, data: LoneIn) -> LoneIn:
+    return data
+"""
+
+# Importing this module would fail; static discovery must leave it alone
+FLOW_B = b"""
+raise RuntimeError("disc-b must not be imported")
+from fastapi_cloudflow import workflow
+FLOW = workflow("disc-b")
+"""
+
+
+def test_scan_source_finds_steps_and_workflows_without_importing() -> None:
+    index = scan_source("pkg.a", FLOW_A)
+    assert index.steps == ["disc-double", "disc-plain-name"]
+    assert index.workflows == ["disc-a"]
+    assert not index.dynamic
+    assert scan_source("pkg.c", b"NAME = 'x'\nflow = workflow(NAME)\n").dynamic
+
+
+def test_modules_for_picks_defining_and_dynamic_modules() -> None:
+    indexes = [
+        ModuleIndex("m.a", "", workflows=["a"]),
+        ModuleIndex("m.b", "", workflows=["b"]),
+        ModuleIndex("m.steps_only", "", steps=["s"]),
+        ModuleIndex("m.dyn", "", dynamic=True),
+    ]
+    assert modules_for(indexes, ["b"]) == ["m.b", "m.dyn"]
+    assert modules_for(indexes) == ["m.a", "m.b", "m.dyn"]
+    assert modules_for(indexes, ["b"], steps=True) == ["m.b", "m.steps_only", "m.dyn"]
+
+
+def test_scan_cache_is_keyed_by_file_hash(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    flows = tmp_path / "cflows"
+    flows.mkdir()
+    (flows / "a.py").write_bytes(FLOW_A)
+    cache = tmp_path / "cache.json"
+    assert scan_flows(flows, cache)[0].workflows == ["disc-a"]
+
+    # An unchanged file is served from the cache, even if the entry says something else
+    data = json.loads(cache.read_text())
+    data["files"][str(flows / "a.py")]["workflows"] = ["from-cache"]
+    cache.write_text(json.dumps(data))
+    assert scan_flows(flows, cache)[0].workflows == ["from-cache"]
+
+    (flows / "a.py").write_bytes(FLOW_A + b"\nOTHER = workflow('disc-extra')\n")
+    assert scan_flows(flows, cache)[0].workflows == ["disc-a", "disc-extra"]
+
+
+def test_static_discovery_imports_only_requested_workflows(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    flows = tmp_path / "dflows"
+    flows.mkdir()
+    (flows / "__init__.py").write_bytes(b"")
+    (flows / "a.py").write_bytes(FLOW_A)
+    (flows / "b.py").write_bytes(FLOW_B)
+
+    workflows = _load_flows(None, None, Path("dflows"), static=True, workflow_names=["disc-a"], import_times=True)
+    assert [wf.name for wf in workflows] == ["disc-a"]
+    assert "dflows.a" in sys.modules and "dflows.b" not in sys.modules
+    err = capsys.readouterr().err
+    assert "import dflows.a:" in err
+    assert "imported 1 modules" in err
+
+
+def test_static_schema_imports_step_only_modules(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    flows = tmp_path / "sflows"
+    flows.mkdir()
+    (flows / "__init__.py").write_bytes(b"")
+    (flows / "lone.py").write_bytes(FLOW_STEPS)
+
+    schema(module=None, app_spec=None, flows_path=Path("sflows"), out=tmp_path / "steps.json", static=True)
+    assert "sflows.lone" in sys.modules
+    assert "/steps/disc-lone" in json.loads((tmp_path / "steps.json").read_text())["paths"]
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+import pytest
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+from fastapi_cloudflow import Context, step, workflow
+from fastapi_cloudflow.codegen.workflows import render_workflow_yaml
+from fastapi_cloudflow.emulator import Emulator, Execution, resume, resume_point
+from fastapi_cloudflow.journal import JournalEntry, SqliteJournal
+
+CALLS = {"fetch": 0, "enrich": 0, "publish": 0}
+BROKEN = {"publish": True}
+
+
+class Num(BaseModel):
+    n: int
+
+
+@step(name="jr-fetch")
+async def jr_fetch(ctx: Context, data: Num) -> Num:
+    CALLS["fetch"] += 1
+    return Num(n=data.n + 1)
+
+
+@step(name="jr-enrich")
+async def jr_enrich(ctx: Context, data: Num) -> Num:
+    CALLS["enrich"] += 1
+    return Num(n=data.n * 10)
+
+
+@step(name="jr-publish")
+async def jr_publish(ctx: Context, data: Num) -> Num:
+    CALLS["publish"] += 1
+    if BROKEN["publish"]:
+        raise ValueError("publisher down")
+    return Num(n=data.n + 5)
+
+
+FLOW = (workflow("jr-flow") >> jr_fetch >> jr_enrich >> jr_publish).build()
+FUSED = (workflow("jr-fused", fuse=True) >> jr_fetch >> jr_enrich >> jr_publish).build()
+
+
+def _run(app: FastAPI, scenario: Any) -> Any:
+    async def go() -> Any:
+        async with Emulator(app) as emulator:
+            return await scenario(emulator)
+
+    return asyncio.run(go())
+
+
+def _first_run(app: FastAPI, journal: SqliteJournal) -> tuple[Execution, str]:
+    async def scenario(emulator: Emulator) -> tuple[Execution, str]:
+        execution = await emulator.execute(render_workflow_yaml(FLOW), {"n": 1}, workflow_id=FLOW.name)
+        return execution, (await journal.runs(FLOW.name))[0]
+
+    for key in CALLS:
+        CALLS[key] = 0
+    BROKEN["publish"] = True
+    return _run(app, scenario)
+
+
+def test_step_calls_are_journaled_by_run(tmp_path: Path, step_app: Callable[..., FastAPI]) -> None:
+    journal = SqliteJournal(tmp_path / "journal.sqlite")
+    execution, run_id = _first_run(step_app(journal=journal), journal)
+    assert not execution.succeeded
+    entries = asyncio.run(journal.entries(run_id))
+    assert [(e.step, e.payload, e.result, e.error) for e in entries] == [
+        ("jr-fetch", {"n": 1}, {"n": 2}, None),
+        ("jr-enrich", {"n": 2}, {"n": 20}, None),
+        ("jr-publish", {"n": 20}, None, "ValueError"),
+    ]
+    assert {e.workflow for e in entries} == {"jr-flow"}
+
+
+def test_resume_skips_completed_steps(tmp_path: Path, step_app: Callable[..., FastAPI]) -> None:
+    journal = SqliteJournal(tmp_path / "journal.sqlite")
+    app = step_app(journal=journal)
+    _, run_id = _first_run(app, journal)
+    BROKEN["publish"] = False
+
+    async def scenario(emulator: Emulator) -> Execution:
+        return await resume(emulator, FLOW, journal, run_id)
+
+    execution = _run(app, scenario)
+    assert execution.result == {"n": 25}
+    # Only the failed step ran again
+    assert CALLS == {"fetch": 1, "enrich": 1, "publish": 2}
+
+
+def test_resume_from_a_named_step(tmp_path: Path, step_app: Callable[..., FastAPI]) -> None:
+    journal = SqliteJournal(tmp_path / "journal.sqlite")
+    app = step_app(journal=journal)
+    _, run_id = _first_run(app, journal)
+    BROKEN["publish"] = False
+
+    async def scenario(emulator: Emulator) -> Execution:
+        return await resume(emulator, FLOW, journal, run_id, from_step="jr-enrich")
+
+    assert _run(app, scenario).result == {"n": 25}
+    assert CALLS == {"fetch": 1, "enrich": 2, "publish": 2}
+
+
+def test_resume_point_reports_what_cannot_be_fed() -> None:
+    entries = [JournalEntry(run_id="r", step="jr-fetch", payload={"n": 1}, error="ValueError")]
+    nodes, payload = resume_point(FLOW, entries)
+    assert [n.name for n in nodes] == ["jr-fetch", "jr-enrich", "jr-publish"] and payload == {"n": 1}
+    with pytest.raises(LookupError, match="Nothing journaled feeds jr-publish"):
+        resume_point(FLOW, entries, from_step="jr-publish")
+    with pytest.raises(ValueError, match="no step jr-missing"):
+        resume_point(FLOW, entries, from_step="jr-missing")
+    with pytest.raises(ValueError, match="fused into jr-fetch__jr-enrich__jr-publish"):
+        resume_point(FUSED, entries, from_step="jr-enrich")
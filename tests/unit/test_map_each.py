@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+
+import pytest
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+from fastapi_cloudflow import Context, map_each, step, workflow
+from fastapi_cloudflow.cli import _mermaid_workflow
+from fastapi_cloudflow.codegen.workflows import render_workflow_yaml, workflow_to_yaml_dict
+from fastapi_cloudflow.emulator import Emulator
+
+
+class LineItem(BaseModel):
+    sku: str
+    qty: int
+
+
+class PricedItem(BaseModel):
+    sku: str
+    total: float
+
+
+class Basket(BaseModel):
+    items: list[LineItem]
+    note: str = ""
+
+
+class PricedBasket(BaseModel):
+    priced: list[PricedItem]
+
+
+class SkuList(BaseModel):
+    skus: list[str]
+
+
+class Baskets(BaseModel):
+    baskets: list[Basket]
+
+
+class PricedBaskets(BaseModel):
+    priced: list[PricedBasket]
+
+
+COUNTED: list[str] = []
+
+
+@step(name="map-load-basket")
+async def map_load_basket(ctx: Context, data: Basket) -> Basket:
+    return data
+
+
+@step(name="map-price-item")
+async def map_price_item(ctx: Context, data: LineItem) -> PricedItem:
+    return PricedItem(sku=data.sku, total=data.qty * 2.5)
+
+
+@step(name="map-round-item")
+async def map_round_item(ctx: Context, data: PricedItem) -> PricedItem:
+    return PricedItem(sku=data.sku, total=round(data.total))
+
+
+@step(name="map-count-item")
+async def map_count_item(ctx: Context, data: LineItem) -> PricedItem:
+    COUNTED.append(data.sku)
+    return PricedItem(sku=data.sku, total=data.qty)
+
+
+PRICE_ALL = map_each(Basket, "items", [map_price_item, map_round_item], output=PricedBasket, concurrency_limit=8)
+MAP_FLOW = (workflow("map-flow") >> map_load_basket >> PRICE_ALL).build()
+COUNT_FLOW = (
+    workflow("map-count-flow") >> map_load_basket >> map_each(Basket, "items", map_count_item, output=PricedBasket)
+).build()
+COUNT_BATCHES = map_each(Basket, "items", map_count_item, output=PricedBasket, batch_route=True)
+NESTED_FLOW = (workflow("map-nested-flow") >> map_each(Baskets, "baskets", COUNT_BATCHES, output=PricedBaskets)).build()
+
+
+def test_map_each_types_node_from_list_fields() -> None:
+    assert PRICE_ALL.name == "map-items"
+    assert PRICE_ALL.input_model is Basket
+    assert PRICE_ALL.output_model is PricedBasket
+    assert PRICE_ALL.into == "priced"
+    assert [s.name for s in PRICE_ALL.body] == ["map-price-item", "map-round-item"]
+
+
+def test_map_each_type_checks_item_and_result() -> None:
+    with pytest.raises(TypeError, match="Basket.note is not a list"):
+        map_each(Basket, "note", map_price_item, output=PricedBasket)
+    with pytest.raises(TypeError, match="Basket.items holds LineItem but map-round-item expects PricedItem"):
+        map_each(Basket, "items", map_round_item, output=PricedBasket)
+    with pytest.raises(TypeError, match="map-price-item outputs PricedItem but SkuList.skus holds str"):
+        map_each(Basket, "items", map_price_item, output=SkuList)
+    with pytest.raises(ValueError, match="pass into="):
+        map_each(Basket, "items", map_price_item, output=Basket)
+
+
+def test_map_codegen_emits_parallel_for_and_ordered_collect() -> None:
+    steps = workflow_to_yaml_dict(MAP_FLOW)["main"]["steps"]
+    names = [next(iter(s)) for s in steps]
+    assert names == [
+        "init_run",
+        "call_map-load-basket",
+        "set_payload_0",
+        "init_map_1",
+        "map_map-items",
+        "collect_1",
+        "set_payload_1",
+        "return_final",
+    ]
+    assert steps[3]["init_map_1"] == {"assign": [{"map_1": {}}, {"list_1": []}]}
+    block = steps[4]["map_map-items"]["parallel"]
+    assert block["shared"] == ["map_1"]
+    assert block["concurrency_limit"] == 8
+    loop = block["for"]
+    assert (loop["value"], loop["index"], loop["in"]) == ("item_1", "i_1", "${payload.items}")
+    body = loop["steps"]
+    assert body[0]["call_map-price-item"]["args"]["body"] == "${item_1}"
+    headers = body[0]["call_map-price-item"]["args"]["headers"]
+    assert (headers["X-Workflow-Call"], headers["X-Workflow-Iteration"]) == ("1_map_0", "${string(i_1)}")
+    assert body[1] == {"set_payload_1_map_0": {"assign": [{"map_1[string(i_1)]": "${res_1_map_0.body}"}]}}
+    assert body[2]["call_map-round-item"]["args"]["body"] == "${map_1[string(i_1)]}"
+    collect = steps[5]["collect_1"]["for"]
+    assert collect["range"] == "${[0, len(payload.items) - 1]}"
+    assert collect["steps"] == [
+        {"collect_item_1": {"assign": [{"list_1": "${list.concat(list_1, map_1[string(i_1)])}"}]}}
+    ]
+    assert steps[6]["set_payload_1"] == {"assign": [{"payload": {"priced": "${list_1}"}}]}
+
+
+def test_map_graph_links_body() -> None:
+    lines = _mermaid_workflow(MAP_FLOW)
+    assert "    map-items[[map-items]]" in lines
+    assert "    map-load-basket --> map-items" in lines
+    assert "    map-items --> map-price-item" in lines
+    assert "    map-price-item --> map-round-item" in lines
+
+
+def _emulate(app: FastAPI, flow, argument: dict) -> dict:
+    async def scenario() -> dict:
+        async with Emulator(app) as emulator:
+            execution = await emulator.execute(render_workflow_yaml(flow), argument)
+            assert execution.succeeded, execution.error
+            return execution.result
+
+    return asyncio.run(scenario())
+
+
+def test_duplicate_items_each_run_with_idempotency_on(step_app: Callable[..., FastAPI]) -> None:
+    COUNTED.clear()
+    result = _emulate(step_app(idempotency=True), COUNT_FLOW, {"items": [{"sku": "a", "qty": 1}] * 3})
+    assert result == {"priced": [{"sku": "a", "total": 1.0}] * 3}
+    assert COUNTED == ["a"] * 3
+
+
+def test_duplicate_batches_in_a_map_each_run(step_app: Callable[..., FastAPI]) -> None:
+    loop = workflow_to_yaml_dict(NESTED_FLOW)["main"]["steps"][2]["map_map-baskets"]["parallel"]["for"]
+    headers = loop["steps"][0]["call_map-count-item_batch"]["args"]["headers"]
+    assert headers["X-Workflow-Iteration"] == "${string(i_0)}"
+    COUNTED.clear()
+    basket = {"items": [{"sku": "b", "qty": 2}] * 2}
+    result = _emulate(step_app(idempotency=True), NESTED_FLOW, {"baskets": [basket, basket]})
+    assert result == {"priced": [{"priced": [{"sku": "b", "total": 2.0}] * 2}] * 2}
+    assert COUNTED == ["b"] * 4
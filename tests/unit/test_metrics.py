@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from collections.abc import Callable
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from fastapi_cloudflow import Context, step
+from fastapi_cloudflow.metrics import NULL_RECORDING, StepMetrics
+
+
+class MetricIn(BaseModel):
+    n: int
+
+
+class MetricOut(BaseModel):
+    n: int
+
+
+@step(name="metric-check")
+async def metric_check(ctx: Context, data: MetricIn) -> MetricOut:
+    if data.n < 0:
+        raise ValueError("negative")
+    return MetricOut(n=data.n)
+
+
+def test_metrics_endpoint_reports_step_series(step_app: Callable[..., FastAPI]) -> None:
+    metrics = StepMetrics()
+    app = step_app(metrics=metrics)
+    c = TestClient(app, raise_server_exceptions=False)
+    headers = {"X-Workflow-Name": "wf"}
+    assert c.post("/steps/metric-check", headers=headers, json={"n": 1}).status_code == 200
+    assert c.post("/steps/metric-check", headers=headers, json={}).status_code == 422
+    assert c.post("/steps/metric-check", headers=headers, json={"n": -1}).status_code == 500
+
+    r = c.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    text = r.text
+    assert 'cloudflow_step_requests_total{step="metric-check",workflow="wf"} 3' in text
+    assert 'cloudflow_step_errors_total{step="metric-check",workflow="wf",error="http_422"} 1' in text
+    assert 'cloudflow_step_errors_total{step="metric-check",workflow="wf",error="ValueError"} 1' in text
+    assert 'cloudflow_step_in_flight{step="metric-check"} 0' in text
+    for phase in ("parse", "validate", "execute", "serialize", "total"):
+        assert f'cloudflow_step_duration_seconds_count{{step="metric-check",workflow="wf",phase="{phase}"}}' in text
+    # Only completed phases are timed; failures still land in the "total" series
+    assert 'cloudflow_step_duration_seconds_count{step="metric-check",workflow="wf",phase="execute"} 1' in text
+    assert 'cloudflow_step_request_bytes_bucket{step="metric-check",workflow="wf",le="256"} 3' in text
+    assert 'cloudflow_step_response_bytes_count{step="metric-check",workflow="wf"} 1' in text
+
+
+def test_metrics_disabled_by_default(step_app: Callable[..., FastAPI]) -> None:
+    app = step_app()
+    c = TestClient(app)
+    assert c.get("/metrics").status_code == 404
+    # Every request shares the null recording; none of them may leave state on it
+    c.post("/steps/metric-check", headers={"X-Workflow-Name": "wf"}, json={"n": 1})
+    assert (NULL_RECORDING.workflow, NULL_RECORDING.request_size, NULL_RECORDING.response_size) == (None,) * 3
+
+
+def test_bucket_bounds_and_sums_keep_full_precision() -> None:
+    metrics = StepMetrics(latency_buckets=(0.1, 2.5), size_buckets=(16777216, 1073741824))
+    recording = metrics.start("metric-check")
+    recording.workflow = "wf"
+    recording.request_size = 123456789
+    recording.finish()
+    text = metrics.render()
+    assert 'cloudflow_step_request_bytes_bucket{step="metric-check",workflow="wf",le="16777216"} 0' in text
+    assert 'cloudflow_step_request_bytes_bucket{step="metric-check",workflow="wf",le="1073741824"} 1' in text
+    assert 'cloudflow_step_request_bytes_sum{step="metric-check",workflow="wf"} 123456789' in text
+    assert 'cloudflow_step_duration_seconds_bucket{step="metric-check",workflow="wf",phase="total",le="0.1"}' in text
+    assert 'cloudflow_step_duration_seconds_bucket{step="metric-check",workflow="wf",phase="total",le="2.5"}' in text
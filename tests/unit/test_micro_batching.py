@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+
+from fastapi_cloudflow import Context, MicroBatch, step
+from fastapi_cloudflow.core import WorkflowMeta
+
+CALLS: dict[str, list[int]] = {"lookup": [], "score": []}
+
+
+class Key(BaseModel):
+    k: int
+
+
+class Row(BaseModel):
+    k: int
+    value: str
+
+
+@step(name="mb-lookup", batch=MicroBatch(max_size=3, max_wait_s=0.02))
+async def mb_lookup(ctx: Context, data: list[Key]) -> list[Row]:
+    CALLS["lookup"].append(len(data))
+    if any(key.k < 0 for key in data):
+        raise HTTPException(status_code=409, detail="negative key")
+    return [Row(k=key.k, value=f"v{key.k}") for key in data]
+
+
+# Plain functions run their batches on the thread pool like any other sync step
+@step(name="mb-score", batch=MicroBatch(max_size=100, max_wait_s=0.02))
+def mb_score(ctx: Context, data: list[Key]) -> list[Row]:
+    CALLS["score"].append(len(data))
+    assert ctx.request is None and ctx.workflow.step == "mb-score"
+    return [Row(k=key.k, value=str(key.k * 2)) for key in data]
+
+
+@step(name="mb-short", batch=MicroBatch(max_size=10, max_wait_s=0.01))
+async def mb_short(ctx: Context, data: list[Key]) -> list[Row]:
+    return [Row(k=0, value="only one")]
+
+
+async def _burst(app: FastAPI, path: str, keys: list[int]) -> list[httpx.Response]:
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return list(await asyncio.gather(*(client.post(path, json={"k": k}) for k in keys)))
+
+
+def test_concurrent_requests_share_batched_calls(step_app: Callable[..., FastAPI]) -> None:
+    CALLS["lookup"].clear()
+    responses = asyncio.run(_burst(step_app(), "/steps/mb-lookup", list(range(7))))
+    assert [r.json() for r in responses] == [{"k": k, "value": f"v{k}"} for k in range(7)]
+    # max_size flushes two full batches; the window flushes the remainder
+    assert CALLS["lookup"] == [3, 3, 1]
+
+
+def test_thread_batch_function_gets_batch_context(step_app: Callable[..., FastAPI]) -> None:
+    CALLS["score"].clear()
+    responses = asyncio.run(_burst(step_app(), "/steps/mb-score", [1, 2, 3, 4]))
+    assert [r.json()["value"] for r in responses] == ["2", "4", "6", "8"]
+    assert CALLS["score"] == [4]
+
+
+def test_batch_failure_reaches_every_caller_in_the_batch(step_app: Callable[..., FastAPI]) -> None:
+    responses = asyncio.run(_burst(step_app(), "/steps/mb-lookup", [1, -1, 2]))
+    assert [r.status_code for r in responses] == [409, 409, 409]
+
+
+def test_batch_output_count_must_match_inputs() -> None:
+    async def scenario() -> None:
+        ctx = Context(request=None, workflow=WorkflowMeta(step="mb-short"))
+        with pytest.raises(RuntimeError, match="returned 1 outputs for 2 inputs"):
+            await asyncio.gather(mb_short(ctx, Key(k=1)), mb_short(ctx, Key(k=2)))
+
+    asyncio.run(scenario())
+
+
+def test_batch_step_requires_list_annotations() -> None:
+    with pytest.raises(TypeError, match="must take and return lists"):
+
+        @step(name="mb-bad", batch=MicroBatch())
+        async def mb_bad(ctx: Context, data: Key) -> Row:
+            return Row(k=data.k, value="")
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import pytest
+from pydantic import BaseModel
+
+from fastapi_cloudflow import Context, HttpStep, parallel, step, workflow
+from fastapi_cloudflow.cli import _mermaid_workflow
+from fastapi_cloudflow.codegen.workflows import workflow_to_yaml_dict
+
+
+class Applicant(BaseModel):
+    email: str
+
+
+class IdentityOk(BaseModel):
+    verified: bool
+
+
+class FraudScore(BaseModel):
+    score: float
+
+
+class FraudVerdict(BaseModel):
+    blocked: bool
+
+
+class Checks(BaseModel):
+    identity: IdentityOk
+    fraud: FraudVerdict
+
+
+class AuditedChecks(Checks):
+    audit: IdentityOk
+
+
+class Decision(BaseModel):
+    approved: bool
+
+
+@step(name="par-prepare")
+async def par_prepare(ctx: Context, data: Applicant) -> Applicant:
+    return data
+
+
+@step(name="par-identity")
+async def par_identity(ctx: Context, data: Applicant) -> IdentityOk:
+    return IdentityOk(verified=True)
+
+
+par_score = HttpStep(
+    name="par-score",
+    input_model=Applicant,
+    output_model=FraudScore,
+    method="POST",
+    url="https://example.com/score",
+)
+
+
+@step(name="par-verdict")
+async def par_verdict(ctx: Context, data: FraudScore) -> FraudVerdict:
+    return FraudVerdict(blocked=data.score > 0.9)
+
+
+@step(name="par-decide")
+async def par_decide(ctx: Context, data: Checks) -> Decision:
+    return Decision(approved=data.identity.verified and not data.fraud.blocked)
+
+
+CHECKS = parallel(Checks, name="par-checks", identity=par_identity, fraud=[par_score, par_verdict])
+PARALLEL_FLOW = (workflow("parallel-flow") >> par_prepare >> CHECKS >> par_decide).build()
+LEADING_FLOW = (workflow("parallel-leading-flow") >> CHECKS >> par_decide).build()
+
+
+def test_parallel_joins_branch_outputs_into_join_model() -> None:
+    assert CHECKS.input_model is Applicant
+    assert CHECKS.output_model is Checks
+    assert [s.name for s in CHECKS.branches["fraud"]] == ["par-score", "par-verdict"]
+
+
+def test_parallel_type_checks_branches() -> None:
+    with pytest.raises(TypeError, match="branch fraud outputs FraudScore but Checks.fraud expects FraudVerdict"):
+        parallel(Checks, identity=par_identity, fraud=par_score)
+    with pytest.raises(TypeError, match="Checks has no field for branch extra"):
+        parallel(Checks, identity=par_identity, fraud=[par_score, par_verdict], extra=par_identity)
+    with pytest.raises(TypeError, match="no branch produces AuditedChecks.audit"):
+        parallel(AuditedChecks, identity=par_identity, fraud=[par_score, par_verdict])
+    with pytest.raises(TypeError, match="branch fraud expects FraudScore but branch identity expects Applicant"):
+        parallel(Checks, identity=par_identity, fraud=par_verdict)
+    with pytest.raises(TypeError, match="par-identity outputs IdentityOk but par-verdict expects FraudScore"):
+        parallel(Checks, identity=par_identity, fraud=[par_identity, par_verdict])
+    with pytest.raises(
+        TypeError, match="Type mismatch: par-identity outputs IdentityOk but par-checks expects Applicant"
+    ):
+        workflow("parallel-bad") >> par_prepare >> par_identity >> CHECKS
+
+
+def test_parallel_codegen_emits_parallel_block_with_shared_join() -> None:
+    steps = workflow_to_yaml_dict(PARALLEL_FLOW)["main"]["steps"]
+    names = [next(iter(s)) for s in steps]
+    assert names == [
+        "init_run",
+        "call_par-prepare",
+        "set_payload_0",
+        "init_join_1",
+        "parallel_par-checks",
+        "set_payload_1",
+        "call_par-decide",
+        "set_payload_2",
+        "return_final",
+    ]
+    assert steps[3]["init_join_1"] == {"assign": [{"join_1": {}}]}
+    block = steps[4]["parallel_par-checks"]["parallel"]
+    assert block["shared"] == ["join_1"]
+    identity, fraud = block["branches"]
+    identity_steps = identity["branch_identity_1"]["steps"]
+    call = identity_steps[0]["call_par-identity"]["args"]
+    assert call["body"] == "${payload}"
+    assert call["headers"]["X-Workflow-Run-Id"] == "${run_id}"
+    assert identity_steps[1] == {
+        "set_payload_1_identity_0": {"assign": [{"join_1.identity": "${res_1_identity_0.body}"}]}
+    }
+    fraud_steps = fraud["branch_fraud_1"]["steps"]
+    assert fraud_steps[0]["call_par-score"]["args"]["body"] == "${payload}"
+    # Later nodes of a branch read the branch's own slot in the join
+    assert fraud_steps[2]["call_par-verdict"]["args"]["body"] == "${join_1.fraud}"
+    assert steps[5]["set_payload_1"] == {"assign": [{"payload": "${join_1}"}]}
+
+
+def test_parallel_first_branches_share_the_run_id() -> None:
+    steps = workflow_to_yaml_dict(LEADING_FLOW)["main"]["steps"]
+    assert steps[0] == {"init_run": {"assign": [{"run_id": '${sys.get_env("GOOGLE_CLOUD_WORKFLOW_EXECUTION_ID")}'}]}}
+    assert steps[1]["init_join_0"] == {"assign": [{"join_0": {}}]}
+    identity = steps[2]["parallel_par-checks"]["parallel"]["branches"][0]["branch_identity_0"]["steps"]
+    assert identity[0]["call_par-identity"]["args"]["headers"]["X-Workflow-Run-Id"] == "${run_id}"
+
+
+def test_parallel_graph_fans_out_and_in() -> None:
+    lines = _mermaid_workflow(PARALLEL_FLOW)
+    assert "    par-checks{{par-checks}}" in lines
+    assert "    par-checks --> par-identity" in lines
+    assert "    par-checks --> par-score" in lines
+    assert "    par-score --> par-verdict" in lines
+    assert "    par-identity --> par-decide" in lines
+    assert "    par-verdict --> par-decide" in lines
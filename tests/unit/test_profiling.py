@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import json
+import pstats
+from collections.abc import Callable
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from fastapi_cloudflow import Context, step
+from fastapi_cloudflow.profiling import StepProfiler, sign_profile_request
+
+
+class ProfIn(BaseModel):
+    n: int
+
+
+class ProfOut(BaseModel):
+    total: int
+
+
+@step(name="prof-sum")
+async def prof_sum(ctx: Context, data: ProfIn) -> ProfOut:
+    return ProfOut(total=sum(list(range(data.n))))
+
+
+def test_signed_header_triggers_cpu_and_memory_profile(tmp_path: Path, step_client: Callable[..., TestClient]) -> None:
+    c = step_client(profiler=StepProfiler(tmp_path, secret="s3cret", memory=True))
+    headers = {"X-Workflow-Run-Id": "run-1", "X-Workflow-Name": "wf"}
+
+    plain = c.post("/steps/prof-sum", headers=headers, json={"n": 10})
+    assert "X-Workflow-Profile-Id" not in plain.headers
+    forged = c.post("/steps/prof-sum", headers={**headers, "X-Workflow-Profile": "9999999999.bad"}, json={"n": 10})
+    assert "X-Workflow-Profile-Id" not in forged.headers
+    expired = sign_profile_request("s3cret", ttl_s=-10)
+    assert (
+        "X-Workflow-Profile-Id"
+        not in c.post("/steps/prof-sum", headers={**headers, "X-Workflow-Profile": expired}, json={"n": 10}).headers
+    )
+    assert list(tmp_path.iterdir()) == []
+
+    token = sign_profile_request("s3cret")
+    r = c.post("/steps/prof-sum", headers={**headers, "X-Workflow-Profile": token}, json={"n": 1000})
+    assert r.status_code == 200
+    profile_id = r.headers["X-Workflow-Profile-Id"]
+    assert profile_id.startswith("prof-sum-run-1-")
+    sidecar = json.loads((tmp_path / f"{profile_id}.json").read_text())
+    assert sidecar["run_id"] == "run-1" and sidecar["workflow"] == "wf" and sidecar["step"] == "prof-sum"
+    assert sidecar["files"] == [f"{profile_id}.prof", f"{profile_id}.mem.txt"]
+    assert pstats.Stats(str(tmp_path / f"{profile_id}.prof")).get_stats_profile().func_profiles
+
+
+def test_sampling_triggers_without_header(tmp_path: Path, step_client: Callable[..., TestClient]) -> None:
+    c = step_client(profiler=StepProfiler(tmp_path, sample_rate=1.0))
+    r = c.post("/steps/prof-sum", json={"n": 10})
+    assert (tmp_path / f"{r.headers['X-Workflow-Profile-Id']}.prof").exists()
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+
+import httpx
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from fastapi_cloudflow import Context, step
+from fastapi_cloudflow.cache import memo_key
+
+RUNS = {"normalize": 0, "stamp": 0}
+GATE: dict[str, asyncio.Event] = {}
+
+
+class Address(BaseModel):
+    street: str
+    city: str
+    country: str = "BR"
+
+
+class Normalized(BaseModel):
+    line: str
+
+
+@step(name="pure-normalize", tags=["pure"])
+async def pure_normalize(ctx: Context, data: Address) -> Normalized:
+    RUNS["normalize"] += 1
+    if "open" in GATE:
+        await GATE["open"].wait()
+    return Normalized(line=f"{data.street}, {data.city} ({data.country})".upper())
+
+
+@step(name="impure-stamp")
+async def impure_stamp(ctx: Context, data: Address) -> Normalized:
+    RUNS["stamp"] += 1
+    return Normalized(line=str(RUNS["stamp"]))
+
+
+class DictCache:
+    def __init__(self) -> None:
+        self.data: dict[str, bytes] = {}
+
+    async def get(self, key: str) -> bytes | None:
+        return self.data.get(key)
+
+    async def set(self, key: str, value: bytes) -> None:
+        self.data[key] = value
+
+
+def test_pure_step_is_memoized_across_runs(step_client: Callable[..., TestClient]) -> None:
+    GATE.clear()
+    RUNS["normalize"] = 0
+    c = step_client()
+    first = c.post("/steps/pure-normalize", headers={"X-Workflow-Run-Id": "run-a"}, json={"street": "a", "city": "b"})
+    assert first.json() == {"line": "A, B (BR)"}
+    assert "X-Workflow-Cache" not in first.headers
+    # Another run, keys reordered and the default spelled out: same validated input
+    body = b'{"country": "BR",  "city": "b", "street": "a"}'
+    second = c.post("/steps/pure-normalize", headers={"X-Workflow-Run-Id": "run-b"}, content=body)
+    assert second.json() == first.json()
+    assert second.headers["X-Workflow-Cache"] == "memo"
+    assert RUNS["normalize"] == 1
+
+
+def test_steps_without_pure_tag_always_run(step_client: Callable[..., TestClient]) -> None:
+    RUNS["stamp"] = 0
+    c = step_client()
+    payload = {"street": "a", "city": "b"}
+    assert [c.post("/steps/impure-stamp", json=payload).json()["line"] for _ in range(2)] == ["1", "2"]
+
+
+def test_concurrent_identical_inputs_share_one_execution(step_app: Callable[..., FastAPI]) -> None:
+    async def scenario() -> list[httpx.Response]:
+        GATE["open"] = asyncio.Event()
+        app = step_app()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            calls = [
+                asyncio.create_task(client.post("/steps/pure-normalize", json={"street": "x", "city": "y"}))
+                for _ in range(4)
+            ]
+            await asyncio.sleep(0.05)
+            GATE["open"].set()
+            return list(await asyncio.gather(*calls))
+
+    RUNS["normalize"] = 0
+    try:
+        responses = asyncio.run(scenario())
+    finally:
+        GATE.clear()
+    assert RUNS["normalize"] == 1
+    assert {r.json()["line"] for r in responses} == {"X, Y (BR)"}
+    assert sorted(r.headers.get("X-Workflow-Cache", "") for r in responses) == [
+        "",
+        "coalesced",
+        "coalesced",
+        "coalesced",
+    ]
+
+
+def test_memo_cache_backend_is_pluggable(step_client: Callable[..., TestClient]) -> None:
+    GATE.clear()
+    cache = DictCache()
+    c = step_client(memo_cache=cache)
+    c.post("/steps/pure-normalize", json={"street": "p", "city": "q"})
+    key = memo_key("pure-normalize", Address(street="p", city="q"))
+    assert cache.data == {key: b'{"line":"P, Q (BR)"}'}
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncIterator, Callable
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from fastapi_cloudflow import Context, get_resources, resource, step
+
+EVENTS: list[str] = []
+
+
+class Pool:
+    def __init__(self) -> None:
+        self.queries = 0
+
+    def query(self) -> int:
+        self.queries += 1
+        return self.queries
+
+
+class Client:
+    def __init__(self) -> None:
+        self.closed = False
+
+    async def aclose(self) -> None:
+        self.closed = True
+        EVENTS.append("client closed")
+
+
+@resource()
+async def res_pool() -> AsyncIterator[Pool]:
+    EVENTS.append("pool opened")
+    yield Pool()
+    EVENTS.append("pool closed")
+
+
+@resource(name="res_client")
+async def make_client() -> Client:
+    return Client()
+
+
+class Query(BaseModel):
+    sql: str
+
+
+class Rows(BaseModel):
+    count: int
+
+
+@step(name="res-query")
+async def res_query(ctx: Context, data: Query, pool: Pool) -> Rows:
+    return Rows(count=pool.query())
+
+
+@step(name="res-query-sync")
+def res_query_sync(ctx: Context, data: Query, pool: Pool) -> Rows:
+    # Thread steps get their resources the same way
+    return Rows(count=pool.query())
+
+
+@step(name="res-by-name")
+async def res_by_name(ctx: Context, data: Query, res_client) -> Rows:
+    assert res_client is ctx.resource("res_client") is ctx.resource(Client)
+    return Rows(count=int(res_client.closed))
+
+
+@step(name="res-missing")
+async def res_missing(ctx: Context, data: Query, nothing: dict) -> Rows:
+    return Rows(count=0)
+
+
+def test_resources_open_once_and_close_on_shutdown(step_app: Callable[..., FastAPI]) -> None:
+    EVENTS.clear()
+    with TestClient(step_app()) as c:
+        assert EVENTS == ["pool opened"]
+        counts = [c.post(path, json={"sql": "select 1"}).json()["count"] for path in ["/steps/res-query"] * 2]
+        counts.append(c.post("/steps/res-query-sync", json={"sql": "select 1"}).json()["count"])
+        # One pool served every call
+        assert counts == [1, 2, 3]
+        client = get_resources().get("res_client")
+    # Closed in reverse order of opening
+    assert EVENTS == ["pool opened", "client closed", "pool closed"]
+    assert client.closed
+    assert get_resources().instances == {}
+
+
+def test_resources_resolve_by_name_and_through_context(step_app: Callable[..., FastAPI]) -> None:
+    with TestClient(step_app()) as c:
+        assert c.post("/steps/res-by-name", json={"sql": "x"}).json() == {"count": 0}
+
+
+def test_unknown_resource_parameter_fails_the_call(step_app: Callable[..., FastAPI]) -> None:
+    with TestClient(step_app(), raise_server_exceptions=False) as c:
+        assert c.post("/steps/res-missing", json={"sql": "x"}).status_code == 500
+    with pytest.raises(TypeError, match="res-missing: No resource for parameter nothing"):
+        asyncio.run(res_missing(Context(request=None, workflow=None), Query(sql="x")))  # type: ignore[arg-type]
+
+
+def test_resource_declarations_are_checked() -> None:
+    with pytest.raises(ValueError, match="Resource name collision: res_pool"):
+        resource(name="res_pool")(lambda: None)
+    with pytest.raises(TypeError, match="cannot take resources"):
+
+        @step(name="res-in-process", run_in="process")
+        def res_in_process(ctx: Context, data: Query, pool: Pool) -> Rows:
+            return Rows(count=0)
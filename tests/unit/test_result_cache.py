@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+from pathlib import Path
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from fastapi_cloudflow import Context, step, workflow
+from fastapi_cloudflow.cache import MemoryResultCache, SQLiteResultCache
+from fastapi_cloudflow.codegen.workflows import render_workflow_yaml
+from fastapi_cloudflow.emulator import Emulator
+
+CALLS: list[int] = []
+RUNS: list[str | None] = []
+
+
+class CacheIn(BaseModel):
+    n: int
+
+
+class CacheOut(BaseModel):
+    n: int
+    call: int
+
+
+@step(name="cache-count")
+async def cache_count(ctx: Context, data: CacheIn) -> CacheOut:
+    CALLS.append(data.n)
+    return CacheOut(n=data.n, call=len(CALLS))
+
+
+@step(name="cache-run")
+async def cache_run(ctx: Context, data: CacheIn) -> CacheIn:
+    RUNS.append(ctx.workflow.run_id)
+    return data
+
+
+@step(name="cache-echo")
+async def cache_echo(ctx: Context, data: CacheIn) -> CacheIn:
+    CALLS.append(data.n)
+    return data
+
+
+TWICE_FLOW = (workflow("cache-twice") >> cache_echo >> cache_echo).build()
+RUN_FLOW = (workflow("cache-run") >> cache_run >> cache_run).build()
+
+
+def _call(run_id: str, site: str = "0") -> dict[str, str]:
+    return {"X-Workflow-Run-Id": run_id, "X-Workflow-Call": site}
+
+
+def test_retry_in_same_run_returns_stored_output(step_client: Callable[..., TestClient]) -> None:
+    c = step_client(idempotency=True)
+    CALLS.clear()
+    first = c.post("/steps/cache-count", headers=_call("run-a"), json={"n": 1})
+    retry = c.post("/steps/cache-count", headers=_call("run-a"), json={"n": 1})
+    assert retry.json() == first.json()
+    assert retry.headers["X-Workflow-Cache"] == "hit"
+    assert len(CALLS) == 1
+
+    # Another run, call site or input, or no run id or call site at all, all execute the step
+    c.post("/steps/cache-count", headers=_call("run-b"), json={"n": 1})
+    c.post("/steps/cache-count", headers=_call("run-a", "1"), json={"n": 1})
+    c.post("/steps/cache-count", headers=_call("run-a"), json={"n": 2})
+    c.post("/steps/cache-count", headers={"X-Workflow-Run-Id": "run-a"}, json={"n": 1})
+    c.post("/steps/cache-count", json={"n": 1})
+    assert len(CALLS) == 6
+
+
+def test_idempotency_is_opt_in(step_client: Callable[..., TestClient]) -> None:
+    c = step_client()
+    CALLS.clear()
+    for _ in range(2):
+        r = c.post("/steps/cache-count", headers=_call("run-c"), json={"n": 1})
+        assert "X-Workflow-Cache" not in r.headers
+    assert len(CALLS) == 2
+
+
+def test_same_body_at_two_call_sites_runs_twice(step_app: Callable[..., FastAPI]) -> None:
+    async def scenario():
+        app = step_app(idempotency=True)
+        async with Emulator(app) as emulator:
+            return await emulator.execute(render_workflow_yaml(TWICE_FLOW), {"n": 7})
+
+    CALLS.clear()
+    assert asyncio.run(scenario()).result == {"n": 7}
+    assert CALLS == [7, 7]
+
+
+def test_every_call_of_an_execution_sends_its_run_id(step_app: Callable[..., FastAPI]) -> None:
+    async def scenario():
+        app = step_app()
+        async with Emulator(app, env={"GOOGLE_CLOUD_WORKFLOW_EXECUTION_ID": "exec-1"}) as emulator:
+            return await emulator.execute(render_workflow_yaml(RUN_FLOW), {"n": 1})
+
+    RUNS.clear()
+    assert asyncio.run(scenario()).succeeded
+    # The first call too: a retry of it must find the run its stored output belongs to
+    assert RUNS == ["exec-1", "exec-1"]
+
+
+def test_memory_cache_evicts_lru_and_expired() -> None:
+    async def scenario() -> None:
+        cache = MemoryResultCache(max_entries=2)
+        await cache.set("a", b"1")
+        await cache.set("b", b"2")
+        assert await cache.get("a") == b"1"
+        await cache.set("c", b"3")
+        assert await cache.get("b") is None
+        assert await cache.get("a") == b"1"
+
+        expired = MemoryResultCache(ttl_s=-1)
+        await expired.set("a", b"1")
+        assert await expired.get("a") is None
+
+    asyncio.run(scenario())
+
+
+def test_sqlite_backend(tmp_path: Path, step_client: Callable[..., TestClient]) -> None:
+    c = step_client(idempotency=True, result_cache=SQLiteResultCache(tmp_path / "results.db"))
+    CALLS.clear()
+    for _ in range(2):
+        c.post("/steps/cache-count", headers=_call("run-d"), json={"n": 3})
+    assert len(CALLS) == 1
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections.abc import Callable
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from fastapi_cloudflow import (
+    Context,
+    HttpStep,
+    RetryPolicy,
+    TransientRetry,
+    step,
+    workflow,
+)
+from fastapi_cloudflow.codegen.workflows import render_workflow_yaml, workflow_to_yaml_dict
+from fastapi_cloudflow.core import types
+from fastapi_cloudflow.emulator import Emulator
+
+CALLS = {"flaky": 0, "slow": 0, "broken": 0, "upstream": 0}
+
+POLICY = RetryPolicy(max_retries=3, initial_delay_s=0.5, max_delay_s=4.0, multiplier=3.0)
+
+
+class Ping(BaseModel):
+    n: int
+
+
+@step(name="retry-flaky", transient=TransientRetry(on=(ConnectionError,), initial_delay_s=0.001))
+async def retry_flaky(ctx: Context, data: Ping) -> Ping:
+    CALLS["flaky"] += 1
+    if CALLS["flaky"] < 3:
+        raise ConnectionError("reset by peer")
+    return data
+
+
+@step(name="retry-slow", transient=TransientRetry(on=(ConnectionError,), initial_delay_s=60, max_delay_s=60))
+async def retry_slow(ctx: Context, data: Ping) -> Ping:
+    CALLS["slow"] += 1
+    raise ConnectionError("still down")
+
+
+@step(name="retry-broken", transient=TransientRetry(on=(ConnectionError,), initial_delay_s=0.001))
+async def retry_broken(ctx: Context, data: Ping) -> Ping:
+    CALLS["broken"] += 1
+    raise ValueError("not transient")
+
+
+@step(name="retry-upstream", retry=POLICY)
+async def retry_upstream(ctx: Context, data: Ping) -> Ping:
+    CALLS["upstream"] += 1
+    if CALLS["upstream"] == 1:
+        raise HTTPException(status_code=503, detail="warming up")
+    return Ping(n=data.n + 1)
+
+
+@step(name="retry-plain")
+async def retry_plain(ctx: Context, data: Ping) -> Ping:
+    return data
+
+
+ECHO = HttpStep(
+    name="retry-echo", input_model=Ping, output_model=Ping, method="POST", url="https://echo.test", retry=POLICY
+)
+
+RETRY_FLOW = (workflow("retry-flow") >> retry_upstream >> ECHO).build()
+FUSED_FLOW = (workflow("retry-fused", fuse=True) >> retry_upstream >> retry_plain).build()
+
+
+def test_retry_policy_is_emitted_as_try_retry() -> None:
+    steps = workflow_to_yaml_dict(RETRY_FLOW)["main"]["steps"]
+    expected_retry = {
+        "predicate": "${http.default_retry_predicate}",
+        "max_retries": 3,
+        "backoff": {"initial_delay": 0.5, "max_delay": 4.0, "multiplier": 3.0},
+    }
+    python_call = steps[1]["call_retry-upstream"]
+    assert python_call["try"]["call"] == "http.post"
+    assert python_call["retry"] == expected_retry
+    http_call = next(s["call_retry-echo"] for s in steps if "call_retry-echo" in s)
+    assert http_call["try"]["args"]["url"] == "https://echo.test"
+    assert http_call["retry"] == expected_retry
+
+
+def test_fused_call_retries_only_when_every_member_does() -> None:
+    steps = workflow_to_yaml_dict(FUSED_FLOW)["main"]["steps"]
+    assert "try" not in steps[1]["call_retry-upstream__retry-plain"]
+
+
+def test_emitted_retry_recovers_from_a_transient_503(step_app: Callable[..., FastAPI]) -> None:
+    async def no_wait(seconds: float) -> None:
+        pass
+
+    async def scenario():
+        app = step_app()
+        async with Emulator(app, sleep=no_wait) as emulator:
+            return await emulator.execute(
+                render_workflow_yaml((workflow("retry-solo") >> retry_upstream).build()), {"n": 1}
+            )
+
+    CALLS["upstream"] = 0
+    execution = asyncio.run(scenario())
+    assert execution.result == {"n": 2}
+    assert CALLS["upstream"] == 2
+
+
+def test_transient_errors_are_retried_in_process(step_client: Callable[..., TestClient]) -> None:
+    CALLS["flaky"] = 0
+    res = step_client(raise_server_exceptions=False).post("/steps/retry-flaky", json={"n": 1})
+    assert res.status_code == 200
+    assert CALLS["flaky"] == 3
+
+
+def test_other_errors_are_not_retried(step_client: Callable[..., TestClient]) -> None:
+    CALLS["broken"] = 0
+    assert step_client(raise_server_exceptions=False).post("/steps/retry-broken", json={"n": 1}).status_code == 500
+    assert CALLS["broken"] == 1
+
+
+def test_no_retry_is_started_past_the_deadline(
+    monkeypatch: pytest.MonkeyPatch, step_client: Callable[..., TestClient]
+) -> None:
+    # Always draw the longest delay: 60s, far past the 5s the workflow is still waiting
+    monkeypatch.setattr(types.random, "uniform", lambda low, high: high)
+    CALLS["slow"] = 0
+    deadline = str(time.time() + 5)
+    res = step_client(raise_server_exceptions=False).post(
+        "/steps/retry-slow", json={"n": 1}, headers={"X-Workflow-Deadline": deadline}
+    )
+    assert res.status_code == 500
+    assert CALLS["slow"] == 1
+
+
+def test_jitter_stays_within_the_capped_backoff() -> None:
+    policy = TransientRetry(on=(OSError,), initial_delay_s=0.1, max_delay_s=0.3, multiplier=2.0)
+    assert all(0 <= policy.delay(0) <= 0.1 for _ in range(50))
+    assert all(0 <= policy.delay(5) <= 0.3 for _ in range(50))
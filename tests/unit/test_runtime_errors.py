@@ -34,3 +34,17 @@ def test_validation_error_returns_422() -> None:
     # Missing required fields
     r = c.post("/steps/price-order", headers={"X-Workflow-Name": "unit"}, json={})
     assert r.status_code == 422
+
+
+def test_null_body_returns_422() -> None:
+    c = TestClient(app)
+    r = c.post("/steps/price-order", headers={"Content-Type": "application/json"}, content=b"null")
+    assert r.status_code == 422
+    assert "Request body required" in r.text
+
+
+def test_payload_wrapper_with_extra_keys_is_not_unwrapped() -> None:
+    c = TestClient(app)
+    wrapped = {"payload": {"account_id": 1, "sku": "abc", "qty": 1}, "other": 1}
+    r = c.post("/steps/price-order", headers={"X-Workflow-Name": "unit"}, json=wrapped)
+    assert r.status_code == 422
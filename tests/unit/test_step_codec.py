@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from fastapi.testclient import TestClient
+from pydantic import BaseModel, Field
+
+from fastapi_cloudflow import Context, build_app, step
+
+
+class CodecIn(BaseModel):
+    payload: dict[str, int]
+
+
+class CodecOut(BaseModel):
+    model_config = {"populate_by_name": True}
+    total: int = Field(alias="Total")
+
+
+@step(name="codec-sum")
+async def codec_sum(ctx: Context, data: CodecIn) -> CodecOut:
+    return CodecOut(total=sum(data.payload.values()))
+
+
+def test_response_is_serialized_by_alias_with_run_id() -> None:
+    c = TestClient(build_app())
+    r = c.post("/steps/codec-sum", headers={"X-Workflow-Run-Id": "run-1"}, json={"payload": {"a": 1, "b": 2}})
+    assert r.status_code == 200
+    assert r.json() == {"Total": 3}
+    assert r.headers["X-Workflow-Run-Id"] == "run-1"
+    assert r.headers["content-type"] == "application/json"
+
+
+def test_envelope_falls_back_to_model_with_payload_field() -> None:
+    c = TestClient(build_app())
+    # {"payload": {...}} is not a valid envelope for CodecIn, so the body validates as CodecIn itself
+    r = c.post("/steps/codec-sum", content=b' { "payload" : {"a": 5} } ')
+    assert r.status_code == 200
+    assert r.json() == {"Total": 5}
+
+
+class CodecAccount(BaseModel):
+    account_id: int
+    sku: str
+
+
+@step(name="codec-account")
+async def codec_account(ctx: Context, data: CodecAccount) -> CodecAccount:
+    return data
+
+
+def test_invalid_envelope_reports_errors_inside_the_payload() -> None:
+    c = TestClient(build_app())
+    r = c.post("/steps/codec-account", json={"payload": {"account_id": "x", "sku": "a"}})
+    assert r.status_code == 422
+    assert [(e["type"], e["loc"]) for e in r.json()["detail"]] == [("int_parsing", ["account_id"])]
+
+    # Anything but a lone payload object is validated as the model itself
+    r = c.post("/steps/codec-account", json={"payload": {"account_id": 1, "sku": "a"}, "extra": 1})
+    assert {e["loc"][0] for e in r.json()["detail"]} == {"account_id", "sku"}
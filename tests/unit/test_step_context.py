@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from fastapi_cloudflow import Context, attach_to_fastapi, step
+
+
+class CtxIn(BaseModel):
+    pass
+
+
+class CtxOut(BaseModel):
+    name: str | None
+    step: str | None
+    run_id: str | None
+    same_as_state: bool
+
+
+@step(name="ctx-echo")
+async def ctx_echo(ctx: Context, data: CtxIn) -> CtxOut:
+    assert ctx.request is not None
+    return CtxOut(
+        name=ctx.workflow.name,
+        step=ctx.workflow.step,
+        run_id=ctx.workflow.run_id,
+        same_as_state=ctx.request.state.context is ctx,
+    )
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/plain")
+    def plain(request: Request) -> dict[str, bool]:
+        return {"has_context": hasattr(request.state, "context")}
+
+    attach_to_fastapi(app)
+    return app
+
+
+def test_no_http_middleware_wraps_host_routes() -> None:
+    app = _app()
+    assert app.user_middleware == []
+    r = TestClient(app).get("/plain")
+    assert r.json() == {"has_context": False}
+
+
+def test_step_context_built_from_workflow_headers() -> None:
+    c = TestClient(_app())
+    r = c.post("/steps/ctx-echo", headers={"X-Workflow-Name": "wf", "X-Workflow-Run-Id": "run-1"}, json={})
+    assert r.json() == {"name": "wf", "step": "ctx-echo", "run_id": "run-1", "same_as_state": True}
+
+    generated = c.post("/steps/ctx-echo", json={})
+    assert generated.json()["run_id"]
+    assert generated.headers["X-Workflow-Run-Id"] == generated.json()["run_id"]
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections.abc import Callable
+from datetime import timedelta
+
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from fastapi_cloudflow import Context, step, workflow
+from fastapi_cloudflow.codegen.workflows import workflow_to_yaml_dict
+
+FINISHED: list[str] = []
+
+
+class NapIn(BaseModel):
+    seconds: float
+
+
+class NapOut(BaseModel):
+    remaining: float | None
+
+
+@step(name="deadline-nap")
+async def deadline_nap(ctx: Context, data: NapIn) -> NapOut:
+    remaining = ctx.time_remaining()
+    await asyncio.sleep(data.seconds)
+    FINISHED.append(ctx.workflow.run_id or "")
+    return NapOut(remaining=remaining)
+
+
+@step(name="deadline-bounded", timeout=timedelta(milliseconds=50))
+async def deadline_bounded(ctx: Context, data: NapIn) -> NapOut:
+    await asyncio.sleep(data.seconds)
+    return NapOut(remaining=ctx.time_remaining())
+
+
+DEADLINE_FLOW = (workflow("deadline-flow") >> deadline_bounded).build()
+
+
+def test_header_deadline_is_exposed_and_enforced(step_client: Callable[..., TestClient]) -> None:
+    c = step_client()
+    deadline = str(time.time() + 30)
+    ok = c.post("/steps/deadline-nap", headers={"X-Workflow-Deadline": deadline}, json={"seconds": 0})
+    assert ok.status_code == 200
+    assert 0 < ok.json()["remaining"] <= 30
+
+    FINISHED.clear()
+    late = str(time.time() + 0.05)
+    r = c.post(
+        "/steps/deadline-nap",
+        headers={"X-Workflow-Deadline": late, "X-Workflow-Run-Id": "late"},
+        json={"seconds": 1},
+    )
+    assert r.status_code == 504
+    assert "late" not in FINISHED
+
+
+def test_no_deadline_without_header_or_timeout(step_client: Callable[..., TestClient]) -> None:
+    r = step_client().post("/steps/deadline-nap", json={"seconds": 0})
+    assert r.json() == {"remaining": None}
+
+
+def test_step_timeout_is_enforced_in_process(step_client: Callable[..., TestClient]) -> None:
+    c = step_client()
+    assert c.post("/steps/deadline-bounded", json={"seconds": 0}).status_code == 200
+    assert c.post("/steps/deadline-bounded", json={"seconds": 1}).status_code == 504
+
+
+def test_codegen_passes_deadline_and_timeout() -> None:
+    args = workflow_to_yaml_dict(DEADLINE_FLOW)["main"]["steps"][1]["call_deadline-bounded"]["args"]
+    # Sub-second timeouts round up rather than emitting a zero timeout
+    assert args["timeout"] == 1
+    assert args["headers"]["X-Workflow-Deadline"] == "${string(sys.now() + 1)}"
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from collections.abc import Callable
+from pathlib import Path
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from fastapi_cloudflow import Context, get_registry, step
+from fastapi_cloudflow.codegen.openapi import emit_steps_openapi, steps_openapi
+from fastapi_cloudflow.runtime import _build_step_router
+
+
+class Greeting(BaseModel):
+    name: str
+
+
+class Greeted(BaseModel):
+    text: str
+
+
+@step(name="dispatch-greet")
+async def dispatch_greet(ctx: Context, data: Greeting) -> Greeted:
+    return Greeted(text=f"hi {data.name}")
+
+
+def test_dispatch_mounts_a_single_step_route(step_app: Callable[..., FastAPI]) -> None:
+    router = _build_step_router(dispatch=True)
+    assert [r.path for r in router.routes] == ["/steps/{name}"]
+    assert "/steps/dispatch-greet" in [r.path for r in _build_step_router().routes]
+
+    c = TestClient(step_app(dispatch=True))
+    assert c.post("/steps/dispatch-greet", json={"name": "ana"}).json() == {"text": "hi ana"}
+    assert c.post("/steps/dispatch-greet", json={}).status_code == 422
+    missing = c.post("/steps/no-such-step", json={})
+    assert missing.status_code == 404
+    assert missing.json() == {"detail": "Unknown step"}
+
+
+def test_dispatch_route_is_kept_out_of_openapi(step_app: Callable[..., FastAPI]) -> None:
+    paths = TestClient(step_app(dispatch=True)).get("/openapi.json").json().get("paths", {})
+    assert not [p for p in paths if p.startswith("/steps")]
+
+
+def test_step_schema_snapshot_is_merged_into_openapi(tmp_path: Path, step_app: Callable[..., FastAPI]) -> None:
+    snapshot = emit_steps_openapi(get_registry().served_steps(), tmp_path / "steps.openapi.json")
+    schema = TestClient(step_app(step_schema=snapshot, dispatch=True)).get("/openapi.json").json()
+    op = schema["paths"]["/steps/dispatch-greet"]["post"]
+    assert op["requestBody"]["content"]["application/json"]["schema"] == {"$ref": "#/components/schemas/Greeting"}
+    assert schema["components"]["schemas"]["Greeted"]["required"] == ["text"]
+
+
+def test_steps_openapi_matches_route_per_step_schema(step_app: Callable[..., FastAPI]) -> None:
+    generated = steps_openapi([dispatch_greet])
+    app = step_app()
+    live = TestClient(app).get("/openapi.json").json()
+    assert generated["components"]["schemas"]["Greeted"] == live["components"]["schemas"]["Greeted"]
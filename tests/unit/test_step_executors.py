@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import os
+import threading
+from collections.abc import Callable
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from fastapi_cloudflow import Context, step
+
+# Set by the tests after import; a worker that was forked rather than started fresh would see it
+PARENT_STATE: dict[str, int] = {}
+
+
+class WhereIn(BaseModel):
+    n: int
+
+
+class WhereOut(BaseModel):
+    n: int
+    thread: str
+    pid: int
+
+
+@step(name="where-sync")
+def where_sync(ctx: Context, data: WhereIn) -> WhereOut:
+    return WhereOut(n=data.n + 1, thread=threading.current_thread().name, pid=os.getpid())
+
+
+@step(name="where-inline", run_in="loop")
+def where_inline(ctx: Context, data: WhereIn) -> WhereOut:
+    return WhereOut(n=data.n, thread=threading.current_thread().name, pid=os.getpid())
+
+
+@step(name="where-process", run_in="process")
+def where_process(ctx: Context, data: WhereIn) -> WhereOut:
+    assert ctx.request is None
+    return WhereOut(n=data.n * 3, thread=ctx.workflow.run_id or "", pid=os.getpid())
+
+
+@step(name="where-fresh", run_in="process")
+def where_fresh(ctx: Context, data: WhereIn) -> WhereIn:
+    return WhereIn(n=len(PARENT_STATE))
+
+
+def test_plain_def_runs_in_thread_pool(step_client: Callable[..., TestClient]) -> None:
+    with step_client(max_threads=2, max_processes=1) as c:
+        r = c.post("/steps/where-sync", json={"n": 1})
+    assert r.status_code == 200
+    assert r.json()["n"] == 2
+    assert r.json()["thread"].startswith("cloudflow-step")
+
+
+def test_plain_def_can_run_inline_on_loop(step_client: Callable[..., TestClient]) -> None:
+    with step_client(max_threads=2, max_processes=1) as c:
+        r = c.post("/steps/where-inline", json={"n": 1})
+    assert r.status_code == 200
+    assert not r.json()["thread"].startswith("cloudflow-step")
+
+
+def test_process_step_runs_in_worker_process(step_client: Callable[..., TestClient]) -> None:
+    with step_client(max_threads=2, max_processes=1) as c:
+        r = c.post("/steps/where-process", headers={"X-Workflow-Run-Id": "run-p"}, json={"n": 2})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["n"] == 6
+    assert body["thread"] == "run-p"
+    assert body["pid"] != os.getpid()
+
+
+def test_process_workers_are_not_forked_from_the_server(step_client: Callable[..., TestClient]) -> None:
+    PARENT_STATE["set"] = 1
+    with step_client(max_threads=2, max_processes=1) as c:
+        r = c.post("/steps/where-fresh", json={"n": 0})
+    assert r.json() == {"n": 0}
+
+
+def test_async_step_cannot_target_a_pool() -> None:
+    with pytest.raises(TypeError, match="only plain def"):
+
+        @step(name="bad-async-thread", run_in="thread")
+        async def bad(ctx: Context, data: WhereIn) -> WhereOut:
+            raise NotImplementedError
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from fastapi_cloudflow import Context, HttpStep, build_app, step, workflow
+from fastapi_cloudflow.codegen.workflows import workflow_to_yaml_dict
+from fastapi_cloudflow.core import FusedStep
+
+
+class FuseIn(BaseModel):
+    n: int
+
+
+class FuseMid(BaseModel):
+    doubled: int
+
+
+class FuseOut(BaseModel):
+    label: str
+
+
+@step(name="fuse-double")
+async def fuse_double(ctx: Context, data: FuseIn) -> FuseMid:
+    return FuseMid(doubled=data.n * 2)
+
+
+@step(name="fuse-label")
+async def fuse_label(ctx: Context, data: FuseMid) -> FuseOut:
+    return FuseOut(label=f"{ctx.workflow.step}:{data.doubled}")
+
+
+fuse_echo = HttpStep(
+    name="fuse-echo",
+    input_model=FuseOut,
+    output_model=FuseOut,
+    method="POST",
+    url="https://example.com/echo",
+)
+
+
+FUSED_FLOW = (workflow("fused-flow", fuse=True) >> fuse_double >> fuse_label >> fuse_echo).build()
+UNFUSED_FLOW = (workflow("unfused-flow") >> fuse_double >> fuse_label).build()
+
+
+def test_fused_nodes_collapse_adjacent_python_steps() -> None:
+    nodes = FUSED_FLOW.fused_nodes()
+    assert [type(n) for n in nodes] == [FusedStep, HttpStep]
+    assert nodes[0].name == "fuse-double__fuse-label"
+    assert nodes[0].input_model is FuseIn
+    assert nodes[0].output_model is FuseOut
+    assert UNFUSED_FLOW.fused_nodes() == UNFUSED_FLOW.nodes
+
+
+def test_fused_codegen_emits_single_call() -> None:
+    steps = workflow_to_yaml_dict(FUSED_FLOW)["main"]["steps"]
+    names = [next(iter(s)) for s in steps]
+    assert names == [
+        "init_run",
+        "call_fuse-double__fuse-label",
+        "set_payload_0",
+        "call_fuse-echo",
+        "set_payload_1",
+        "return_final",
+    ]
+    url = steps[1]["call_fuse-double__fuse-label"]["args"]["url"]
+    assert url.endswith('"/steps/fuse-double__fuse-label"}')
+
+
+def test_fused_endpoint_chains_steps_in_process() -> None:
+    c = TestClient(build_app())
+    r = c.post("/steps/fuse-double__fuse-label", headers={"X-Workflow-Name": "unit"}, json={"n": 21})
+    assert r.status_code == 200
+    assert r.json() == {"label": "fuse-label:42"}
+    # The individual steps stay reachable
+    assert c.post("/steps/fuse-double", json={"n": 1}).json() == {"doubled": 2}
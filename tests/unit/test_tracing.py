@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import json
+from collections.abc import Callable
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from flows.echo_name import ECHO_NAME_FLOW
+from pydantic import BaseModel
+
+from fastapi_cloudflow import Context, step
+from fastapi_cloudflow.codegen.workflows import workflow_to_yaml_dict
+from fastapi_cloudflow.tracing import InMemorySpanExporter, JsonlSpanExporter, Tracer, parse_traceparent
+
+
+class TraceIn(BaseModel):
+    n: int
+
+
+class TraceOut(BaseModel):
+    traceparent: str | None
+
+
+@step(name="trace-echo")
+async def trace_echo(ctx: Context, data: TraceIn) -> TraceOut:
+    if data.n < 0:
+        raise ValueError("negative")
+    return TraceOut(traceparent=ctx.traceparent)
+
+
+def test_steps_of_one_run_share_a_trace(step_client: Callable[..., TestClient]) -> None:
+    exporter = InMemorySpanExporter()
+    c = step_client(tracer=Tracer(exporter), raise_server_exceptions=False)
+    first = c.post("/steps/trace-echo", headers={"X-Workflow-Name": "wf"}, json={"n": 1})
+    run_id = first.headers["X-Workflow-Run-Id"]
+    second = c.post("/steps/trace-echo", headers={"X-Workflow-Run-Id": run_id}, json={"n": -1})
+    assert second.status_code == 500
+
+    a, b = exporter.spans
+    assert a.trace_id == b.trace_id
+    assert a.attributes == {"workflow.run_id": run_id, "workflow.name": "wf", "workflow.step": "trace-echo"}
+    assert a.error is None and b.error == "ValueError"
+    assert a.end_ns >= a.start_ns
+    # The span context is exposed to step code and echoed back to the caller
+    assert first.json()["traceparent"] == a.traceparent == first.headers["traceparent"]
+
+
+def test_incoming_traceparent_is_continued(tmp_path: Path, step_client: Callable[..., TestClient]) -> None:
+    path = tmp_path / "spans.jsonl"
+    c = step_client(tracer=Tracer(JsonlSpanExporter(path)), raise_server_exceptions=False)
+    parent = "00-" + "a" * 32 + "-" + "b" * 16 + "-01"
+    c.post("/steps/trace-echo", headers={"traceparent": parent}, json={"n": 1})
+    span = json.loads(path.read_text().splitlines()[0])
+    assert span["trace_id"] == "a" * 32
+    assert span["parent_id"] == "b" * 16
+
+
+def test_parse_traceparent_rejects_garbage() -> None:
+    assert parse_traceparent("nope") is None
+    assert parse_traceparent(None) is None
+
+
+def test_codegen_emits_traceparent_on_every_call() -> None:
+    steps = workflow_to_yaml_dict(ECHO_NAME_FLOW, trace=True)["main"]["steps"]
+    assert "init_trace" in steps[1]
+    calls = [next(iter(s.values())) for s in steps if next(iter(s)).startswith("call_")]
+    assert len(calls) == 3
+    parents = [c["args"]["headers"]["traceparent"] for c in calls]
+    assert all(p.startswith('${"00-" + trace_id + "-') for p in parents)
+    assert len(set(parents)) == 3
+    assert next(iter(workflow_to_yaml_dict(ECHO_NAME_FLOW)["main"]["steps"][1])) != "init_trace"
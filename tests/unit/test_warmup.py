@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import subprocess
+import sys
+from collections.abc import Callable
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel, ConfigDict
+
+from fastapi_cloudflow import Context, step
+
+
+class Lazy(BaseModel):
+    # Deferred models finish building on first use unless warmup does it
+    model_config = ConfigDict(defer_build=True)
+    value: int
+
+
+class LazyOut(BaseModel):
+    model_config = ConfigDict(defer_build=True)
+    doubled: int
+
+
+@step(name="warm-double")
+async def warm_double(ctx: Context, data: Lazy) -> LazyOut:
+    return LazyOut(doubled=data.value * 2)
+
+
+def test_serving_imports_leave_cli_and_codegen_out() -> None:
+    code = (
+        "import sys, fastapi_cloudflow; "
+        "print(' '.join(m for m in sys.modules if m.split('.')[0] in ('yaml', 'typer', 'click') "
+        "or m.startswith(('fastapi_cloudflow.cli', 'fastapi_cloudflow.codegen', 'fastapi_cloudflow.discovery'))))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == ""
+
+
+def test_lifespan_warms_models_and_openapi_before_first_request(step_app: Callable[..., FastAPI]) -> None:
+    app = step_app(warmup=True)
+    with TestClient(app) as c:
+        assert Lazy.__pydantic_complete__ and LazyOut.__pydantic_complete__
+        assert app.openapi_schema is not None
+        report = c.get("/warmup").json()
+        assert report["warm"] is True
+        assert set(report["phases"]) == {"models", "openapi", "executors"}
+        assert report["startup_seconds"] >= 0
+        assert isinstance(report["import_seconds"], float)
+        assert c.post("/steps/warm-double", json={"value": 4}).json() == {"doubled": 8}
+
+
+def test_warmup_endpoint_runs_warmup_without_lifespan(step_app: Callable[..., FastAPI]) -> None:
+    app = step_app(warmup_path="/startup", warmup=True)
+    # Not used as a context manager, so lifespan never runs
+    c = TestClient(app)
+    assert app.openapi_schema is None
+    assert c.get("/startup").json()["warm"] is True
+    assert app.openapi_schema is not None
+
+
+def test_startup_times_are_exported_as_metrics(step_app: Callable[..., FastAPI]) -> None:
+    with TestClient(step_app(metrics=True, warmup=True)) as c:
+        text = c.get("/metrics").text
+    assert 'cloudflow_startup_seconds{phase="import"}' in text
+    assert 'cloudflow_startup_seconds{phase="models"}' in text